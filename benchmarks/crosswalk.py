@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark hpcbench.logger.crosswalk on an archive of hpcbench output files,
+or on synthetic totals blocks like the ones the log parsers produce if no
+archive is given. Accounting info isn't used, so sacct is never run.
+
+Usage: python benchmarks/crosswalk.py [-d results/] [-t run:Totals] [-n 10000]
+"""
+
+import argparse
+import json
+import time
+from hpcbench.logger.crosswalk import dget, standardise_batch
+from hpcbench.plot.util import get_paths
+
+parser = argparse.ArgumentParser(
+    description="Time standardising the totals of many hpcbench outputs.")
+parser.add_argument("-d", "--dir", type=str,
+                    help="Folder of hpcbench json files to standardise again. "
+                    "By default, synthetic totals are used.")
+parser.add_argument("-t", "--totals", type=str, default="run:Totals",
+                    help="Location of the totals in each file. Defaults to "
+                    "run:Totals.")
+parser.add_argument("-n", "--number", type=int, default=10000,
+                    help="Number of synthetic totals blocks. Defaults to "
+                    "10000.")
+
+# Totals from the GROMACS, NAMD and AMBER log parsers, before they're
+# standardised
+TOTALS = [
+    {"Timestep (ns)": "2e-06", "Number of steps": "10000", "Atoms": "20000",
+     "Mflops": "11313713.298", "Wall time (s)": "35.378",
+     "Giga-Cycles": "679.266", "ns/day": "48.845", "hour/ns": "0.491",
+     "Simulation time (ns)": "0.02", "step/s": 282.6615410707219},
+    {"ns/day": "13.579226298434932", "s/step": "0.01272532",
+     "steps/s": "78.58348552335029", "CPU Time (s)": "128.1",
+     "Wall Clock Time including setup (s)": "130.5",
+     "Wall Clock Time (s)": "127.2532", "Setup time": "3.2468",
+     "Atoms": "92224", "Number of steps": "10000",
+     "Timestep (ns)": "2e-06", "Simulation time (ns)": "0.02"},
+    {"Atoms": "23558", "Elapsed(s)": "47.69", "Per Step(ms)": "2.38",
+     "ns/day": "144.93", "seconds/ns": "596.14", "Number of steps": "20000",
+     "Simulation time (ns)": "0.08", "Timestep (ns)": "4e-06"},
+]
+
+
+def load_archive(directory, location):
+    """
+    Load the totals from every hpcbench json file in a folder.
+
+    Args:
+        directory: the folder, a string.
+        location: where the totals are in each file, e.g. 'run:Totals'.
+
+    Returns:
+        a list of totals blocks.
+    """
+    blocks = []
+    for path in get_paths(directory):
+        try:
+            with open(path, "r") as file:
+                blocks.append(dget(json.load(file), location.split(":")))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return blocks
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if args.dir:
+        blocks = load_archive(args.dir, args.totals)
+    else:
+        blocks = [TOTALS[i % len(TOTALS)] for i in range(args.number)]
+    start = time.perf_counter()
+    standardise_batch(blocks, get_accounting=None)
+    elapsed = time.perf_counter() - start
+    print(str(len(blocks))+" blocks: "+str(round(elapsed, 3))+" s ("
+          + str(round(len(blocks)/max(elapsed, 1e-9)))+" blocks/s)")
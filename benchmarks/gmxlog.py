@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark hpcbench.logger.gmxlog on synthetic GROMACS log files. The log
+files are generated from the header, energies and footer below, with as many
+energy blocks as it takes to reach each size, so nothing big needs to be kept
+in the repo.
+
+Usage: python benchmarks/gmxlog.py [-s 10 100 1000] [-d /tmp]
+"""
+
+import argparse
+import os
+import time
+from hpcbench.logger.gmxlog import parse_gmx_log
+
+parser = argparse.ArgumentParser(
+    description="Time parsing synthetic GROMACS logs of different sizes.")
+parser.add_argument("-s", "--sizes", type=int, nargs="+",
+                    default=[10, 100, 1000], help="Log sizes in MB. Defaults "
+                    "to 10 100 1000.")
+parser.add_argument("-d", "--dir", type=str, default=".",
+                    help="Folder to write the logs to. Defaults to the "
+                    "current folder.")
+parser.add_argument("-k", "--keep", action="store_true",
+                    help="Keep the log files afterwards")
+
+HEADER = """                      :-) GROMACS - gmx mdrun, 2023.3 (-:
+
+Executable:   /opt/gromacs/2023.3/bin/gmx
+Data prefix:  /opt/gromacs/2023.3
+Working dir:  /scratch/benchmark
+Command line:
+  gmx mdrun -s benchmark.tpr -resethway -noconfout
+
+GROMACS version:    2023.3
+Precision:          mixed
+Memory model:       64 bit
+MPI library:        thread_mpi
+OpenMP support:     enabled (GMX_OPENMP_MAX_THREADS = 128)
+GPU support:        CUDA
+SIMD instructions:  AVX2_256
+CPU FFT library:    fftw-3.3.10-sse2-avx-avx2-avx2_128
+GPU FFT library:    cuFFT
+C compiler:         /usr/bin/gcc GNU 11.4.0
+C++ compiler:       /usr/bin/g++ GNU 11.4.0
+CUDA driver:        12.20
+CUDA runtime:       12.20
+
+Input Parameters:
+   integrator                     = md
+   tinit                          = 0
+   dt                             = 0.002
+   nsteps                         = 500000
+   init-step                      = 0
+   comm-mode                      = Linear
+   nstcomm                        = 100
+   nstlog                         = 100
+   nstcalcenergy                  = 100
+   nstenergy                      = 100
+   cutoff-scheme                  = Verlet
+   nstlist                        = 10
+   coulombtype                    = PME
+   rcoulomb                       = 1.2
+   vdw-type                       = Cut-off
+   rvdw                           = 1.2
+   tcoupl                         = V-rescale
+   pcoupl                         = Parrinello-Rahman
+   tau-p                          = 2
+   compressibility (3x3):
+      compressibility[    0]={ 4.50000e-05,  0.00000e+00,  0.00000e+00}
+grpopts:
+   nrdf:     2.8e+06
+   ref-t:         300
+
+Changing nstlist from 10 to 100, rlist from 1.2 to 1.326
+
+There are: 1403180 Atoms
+
+Started mdrun on rank 0 Wed Jun  5 10:00:00 2024
+
+"""
+
+ENERGIES = """           Step           Time
+{step:>15d}{time:>15.5f}
+
+   Energies (kJ/mol)
+          Angle    Proper Dih.  Improper Dih.          LJ-14     Coulomb-14
+    9.74139e+03    4.34956e+02    2.90383e+03   -1.43202e+02    6.12458e+04
+        LJ (SR)  Disper. corr.   Coulomb (SR)   Coul. recip.      Potential
+    2.19455e+05   -1.71032e+04   -3.07584e+06    1.28741e+04   -2.78537e+06
+    Kinetic En.   Total Energy  Conserved En.    Temperature Pres. DC (bar)
+    5.23547e+05   -2.26182e+06   -2.26144e+06    3.00012e+02   -2.19023e+02
+ Pressure (bar)   Constr. rmsd
+    1.07853e+00    2.94115e-06
+
+"""
+
+FOOTER = """	<======  ###############  ==>
+	<====  A V E R A G E S  ====>
+	<==  ###############  ======>
+
+	M E G A - F L O P S   A C C O U N T I N G
+
+ NB=Group-cutoff nonbonded kernels    NxN=N-by-N cluster Verlet kernels
+
+ Computing:                               M-Number         M-Flops  % Flops
+-----------------------------------------------------------------------------
+ Pair Search distance check             297.071000        2673.639     0.0
+ NxN Ewald Elec. + LJ [F]            165587.718080    10929189.393    96.6
+ 1,4 nonbonded interactions            7402.700196      666243.018     0.2
+ Rest                                                         0.000     0.0
+-----------------------------------------------------------------------------
+ Total                                                 11313713.298   100.0
+-----------------------------------------------------------------------------
+
+     R E A L   C Y C L E   A N D   T I M E   A C C O U N T I N G
+
+On 1 MPI rank, each using 8 OpenMP threads
+
+ Computing:          Num   Num      Call    Wall time         Giga-Cycles
+                     Ranks Threads  Count      (s)         total sum    %
+-----------------------------------------------------------------------------
+ Neighbor search        1    8       2501      18.353        406.770   6.1
+ Force                  1    8     250001     230.142       5078.722  75.2
+ Write traj.            1    8          3       0.213          4.703   0.1
+ Rest                                          54.000       1191.520  18.6
+-----------------------------------------------------------------------------
+ Total                                        303.719       6681.715 100.0
+-----------------------------------------------------------------------------
+
+               Core t (s)   Wall t (s)        (%)
+       Time:     2429.752      303.719      800.0
+                 (ns/day)    (hour/ns)
+Performance:      142.236        0.169
+Finished mdrun on rank 0 Wed Jun  5 10:05:04 2024
+
+"""
+
+
+def write_log(path, size):
+    """
+    Write a synthetic GROMACS log file.
+
+    Args:
+        path: where to write the log file, a string.
+        size: the approximate size of the file in bytes, an int.
+    """
+    block = len(ENERGIES.format(step=0, time=0))
+    with open(path, "w") as file:
+        file.write(HEADER)
+        for i in range(max(1, (size - len(HEADER) - len(FOOTER)) // block)):
+            file.write(ENERGIES.format(step=i*100, time=i*0.2))
+        file.write(FOOTER)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    for size in args.sizes:
+        path = os.path.join(args.dir, "gmxlog-"+str(size)+"MB.log")
+        write_log(path, size*1024*1024)
+        start = time.perf_counter()
+        parse_gmx_log(path, standardise=False)
+        elapsed = time.perf_counter() - start
+        print(str(size)+" MB: "+str(round(elapsed, 3))+" s")
+        if not args.keep:
+            os.remove(path)
@@ -1,7 +1,21 @@
-from . import deps
-from . import logger
-from . import plot
-from . import util
-from . import schedulers
-from . import systemprep
-__version__ = "0.9"
\ No newline at end of file
+# Submodules are imported on first access, so that running one tool (or
+# importing one module) doesn't pull in matplotlib, numpy etc. for all the
+# others.
+import importlib
+
+__version__ = "0.9"
+
+_submodules = [
+    "deps",
+    "logger",
+    "plot",
+    "util",
+    "schedulers",
+    "systemprep",
+]
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module("."+name, __name__)
+    raise AttributeError("module "+__name__+" has no attribute "+name)
@@ -1,4 +1,14 @@
-from . import numericalunits
-from . import tabulate
-from . import pyedr
-from . import xdrlib
\ No newline at end of file
+import importlib
+
+_submodules = [
+    "numericalunits",
+    "tabulate",
+    "pyedr",
+    "xdrlib",
+]
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module("."+name, __name__)
+    raise AttributeError("module "+__name__+" has no attribute "+name)
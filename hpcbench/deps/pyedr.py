@@ -36,16 +36,27 @@ The library exposes the following functions:
 - the :func:`read_edr` function parses an EDR file and returns the energy terms
   in a nested list
 
-- the :func:`edr_to_dict` function that turns the nested list created by
-  :func:`read_edr` into a dictionary that maps term names to numpy arrays
+- the :func:`read_edr_array` function reads an EDR file straight into a 2-D
+  numpy array, using a memory map and strided views of each run of frames
+  with the same layout
+
+- the :func:`edr_to_dict` function that turns the array created by
+  :func:`read_edr_array` into a dictionary that maps term names to numpy
+  arrays
+
+- the :func:`follow_edr` generator reads the new frames of an EDR file that
+  is still being written, every few seconds
 
 .. autofunction:: edr_to_dict
 """
 from hpcbench.deps import xdrlib
 import collections
+import mmap
+import os
+import struct
+import time
 import warnings
-from pathlib import Path
-from typing import List, Tuple, Dict
+from typing import Iterator, List, Tuple, Dict, Optional
 
 import numpy as np
 
@@ -77,12 +88,31 @@ import numpy as np
 Enxnm = collections.namedtuple('Enxnm', 'name unit')
 ENX_VERSION = 5
 
-__all__ = ['ENX_VERSION', 'edr_to_dict', 'read_edr', 'get_unit_dictionary']
+__all__ = ['ENX_VERSION', 'edr_to_dict', 'read_edr', 'read_edr_array',
+           'follow_edr', 'get_unit_dictionary']
+
+FRAME_MAGIC = -7777777
+
+# Sizes in bytes of each xdr_datatype, except strings, which vary.
+XDR_SIZES = {xdr_datatype_int: 4, xdr_datatype_float: 4,
+             xdr_datatype_double: 8, xdr_datatype_int64: 8,
+             xdr_datatype_char: 4}
+
+
+def map_file(path: str):
+    """Memory-map a file for reading
+
+    Empty files can't be memory-mapped, so ``b''`` is returned for them.
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
 
 
 class EDRFile(object):
     def __init__(self, path):
-        content = Path(path).read_bytes()
+        content = map_file(path)
         self.data = GMX_Unpacker(content)
         self.do_enxnms()
 
@@ -551,8 +581,10 @@ def get_unit_dictionary(path: str) -> Dict[str, str]:
     return unit_dict
 
 
-def edr_to_dict(path: str, verbose: bool = False) -> Dict[str, np.ndarray]:
-    """Calls :func:`read_edr` and packs its return values into a dictionary
+def edr_to_dict(path: str, verbose: bool = False,
+                terms: Optional[List[str]] = None, stride: int = 1,
+                every: Optional[float] = None) -> Dict[str, np.ndarray]:
+    """Calls :func:`read_edr_array` and packs its columns into a dictionary
 
     The returned dictionary's keys are the names of the energy terms present in
     the EDR file, the values are the time-series energy data for those terms.
@@ -563,15 +595,434 @@ def edr_to_dict(path: str, verbose: bool = False) -> Dict[str, np.ndarray]:
         path to EDR file to be read
     verbose : bool
         Optionally show verbose output while reading the file
+    terms : list[str]
+        the names of the energy terms to read. By default, all of them.
+    stride : int
+        only read every ``stride``-th frame
+    every : float
+        only read the first frame in each interval of ``every`` ps
 
     Returns
     -------
     enery_dict: dict[str, np.ndarray]
         dictionary that holds all energy terms found in the EDR file.
     """
-    all_energies, all_names, times = read_edr(path, verbose=verbose)
+    energies, all_names = read_edr_array(path, terms, stride, every)
     energy_dict = {}
     for idx, name in enumerate(all_names):
-        energy_dict[name] = np.array(
-            [all_energies[frame][idx] for frame in range(len(times))])
-    return energy_dict
\ No newline at end of file
+        energy_dict[name] = energies[:, idx]
+    return energy_dict
+
+
+FrameLayout = collections.namedtuple(
+    'FrameLayout', 'size nre nsum energies signature fixed')
+
+
+def frame_layout(buf, pos: int, double: bool) -> Optional[FrameLayout]:
+    """Work out where everything is in the frame starting at ``pos``
+
+    This reads the same header as :meth:`EDRFile.do_eheader`, but with
+    :func:`struct.unpack_from` and without decoding any of the energies or
+    blocks, just to get their positions. Only frames from files with a
+    version of 2 or more (i.e. with a frame magic number) are supported.
+
+    Returns
+    -------
+    layout: FrameLayout or None
+        ``size`` is the size of the frame in bytes, ``nre`` and ``nsum`` are
+        from the header, ``energies`` is the offset of the energies from
+        the start of the frame, and ``signature`` is the (start, end) of
+        the part of the header that decides the layout of the frame. If
+        ``fixed`` is True, any frame with the same signature has the same
+        size. None is returned if the frame is incomplete.
+    """
+    real = 8 if double else 4
+    try:
+        p = pos + real
+        magic, version = struct.unpack_from('>ii', buf, p)
+        if magic != FRAME_MAGIC:
+            raise ValueError("Energy header magic number mismatch, "
+                             "this is not a GROMACS edr file")
+        if version > ENX_VERSION:
+            raise ValueError(f'Reading file version {version} '
+                             f'with version {ENX_VERSION} implementation')
+        p += 8 + 8 + 8  # magic, version, time, step
+        nsum, = struct.unpack_from('>i', buf, p)
+        p += 4
+        if version >= 3:
+            p += 8
+        if version >= 5:
+            p += 8
+        start = p
+        nre, ndisre, nblock = struct.unpack_from('>iii', buf, p)
+        p += 12
+        if version < 4 and ndisre != 0:
+            raise ValueError("Old style distance restraint blocks are not "
+                             "supported")
+        subs = []
+        for b in range(nblock):
+            if version < 4:
+                nr, = struct.unpack_from('>i', buf, p)
+                p += 4
+                subs.append((xdr_datatype_double if double
+                             else xdr_datatype_float, nr))
+            else:
+                nsub, = struct.unpack_from('>i', buf, p + 4)
+                p += 8
+                for _ in range(nsub):
+                    subs.append(struct.unpack_from('>ii', buf, p))
+                    p += 8
+        p += 12  # e_size and two reserved ints
+        end = p
+        energies = p - pos
+        p += nre * (3 if nsum > 0 else 1) * real
+        fixed = True
+        for typenr, nr in subs:
+            if typenr == xdr_datatype_string:
+                fixed = False
+                for _ in range(nr):
+                    length, = struct.unpack_from('>I', buf, p)
+                    p += 4 + (length + 3) // 4 * 4
+            elif typenr in XDR_SIZES:
+                p += XDR_SIZES[typenr] * nr
+            else:
+                raise ValueError("Reading unknown block data type: "
+                                 "this file is corrupted "
+                                 "or from the future")
+    except struct.error:
+        return None
+    if p > len(buf):
+        return None
+    return FrameLayout(p - pos, nre, nsum, energies, (start - pos, end - pos),
+                       fixed)
+
+
+def count_same_frames(raw: np.ndarray, pos: int, layout: FrameLayout,
+                      real: int) -> int:
+    """Count how many frames in a row from ``pos`` have the same layout
+
+    Frames are compared in a few vectorised passes, in windows that double
+    in size, rather than one at a time. Frames have the same layout if they
+    start with the frame magic number and have the same header signature
+    and the same ``nsum > 0``.
+
+    Returns
+    -------
+    count: int
+        The number of frames (at least one).
+    """
+    if not layout.fixed:
+        return 1
+    size = layout.size
+    available = (len(raw) - pos) // size
+    sig_start, sig_end = layout.signature
+    first = raw[pos + sig_start:pos + sig_end]
+    nsum_offset = real + 24
+    count = 1
+    window = 16
+    while count < available:
+        n = min(window, available - count)
+        start = pos + count * size
+        frames = np.lib.stride_tricks.as_strided(
+            raw[start:], shape=(n, size), strides=(size, 1))
+        same = (frames[:, sig_start:sig_end] == first).all(axis=1)
+        magic = frames[:, real:real + 4].copy().view('>i4')[:, 0]
+        same &= magic == FRAME_MAGIC
+        nsum = frames[:, nsum_offset:nsum_offset + 4].copy().view('>i4')[:, 0]
+        same &= (nsum > 0) == (layout.nsum > 0)
+        if not same.all():
+            return count + int(np.argmin(same))
+        count += n
+        window *= 2
+    return count
+
+
+def select_frames(times: np.ndarray, stride: int = 1,
+                  every: Optional[float] = None,
+                  state: Optional[dict] = None) -> np.ndarray:
+    """Choose which frames to keep
+
+    Parameters
+    ----------
+    times : np.ndarray
+        the time of each frame
+    stride : int
+        keep every ``stride``-th frame
+    every : float
+        keep the first frame in each interval of ``every`` ps (before
+        applying ``stride``)
+    state : dict
+        when a file is read a few frames at a time (see
+        :func:`follow_edr`), pass the same dictionary for each lot of
+        frames, so the intervals and the stride carry on from the last lot.
+
+    Returns
+    -------
+    frames: np.ndarray
+        The indices of the frames to keep.
+    """
+    if state is None:
+        state = {}
+    frames = np.arange(len(times))
+    if not len(times):
+        return frames
+    if every:
+        start = state.setdefault('start', times[0])
+        bins = np.floor((times - start) / every)
+        previous = state.get('bin', bins[0] - 1)
+        frames = frames[np.diff(bins, prepend=previous) != 0]
+        state['bin'] = bins[-1]
+    seen = state.get('seen', 0)
+    state['seen'] = seen + len(frames)
+    return frames[-seen % stride::stride]
+
+
+def select_terms(all_names: List[str],
+                 terms: Optional[List[str]] = None) -> List[int]:
+    """Get the column index of each energy term (the time is column 0)
+
+    Raises
+    ------
+    KeyError
+        if one of the terms isn't in the file.
+    """
+    if terms is None:
+        return list(range(1, len(all_names)))
+    columns = []
+    for term in terms:
+        if term not in all_names:
+            raise KeyError(f'No energy term called {term}, the terms are: '
+                           + ', '.join(all_names[1:]))
+        if term != 'Time':
+            columns.append(all_names.index(term))
+    return columns
+
+
+def read_edr_array(path: str, terms: Optional[List[str]] = None,
+                   stride: int = 1, every: Optional[float] = None
+                   ) -> Tuple[np.ndarray, List[str]]:
+    """Read an EDR file into a 2-D NumPy array
+
+    The file is memory-mapped, and the offset and layout of each frame is
+    found in one pass (see :func:`frame_layout`). The frames and terms that
+    are asked for are then copied into a preallocated array from strided
+    big-endian views of each run of frames with the same layout, so the
+    energies are never unpacked one at a time, and energies that aren't
+    needed aren't read at all. Old (version 1) files are read with
+    :func:`read_edr` instead.
+
+    Parameters
+    ----------
+    path : str
+        path to EDR file to be read
+    terms : list[str]
+        the names of the energy terms to read. By default, all of them.
+    stride : int
+        only read every ``stride``-th frame
+    every : float
+        only read the first frame in each interval of ``every`` ps
+
+    Returns
+    -------
+    energies: np.ndarray
+        A 2-D array with a row for each frame that contains energies, and a
+        column for each term, starting with the time.
+    names: list[str]
+        The names of the columns.
+    """
+    edr_file = EDRFile(path)
+    all_names = [u'Time'] + [nm.name for nm in edr_file.nms]
+    columns = select_terms(all_names, terms)
+    names = [u'Time'] + [all_names[column] for column in columns]
+    buf = edr_file.data.get_buffer()
+    pos = edr_file.data.get_position()
+    if edr_file.file_version == 1 or pos >= len(buf):
+        all_energies, all_names, times = read_edr(path)
+        energies = np.array(all_energies, dtype=float).reshape(
+            -1, len(all_names))
+        frames = select_frames(energies[:, 0], stride, every)
+        return energies[np.ix_(frames, [0] + columns)], names
+
+    # Single or double precision, as in do_eheader
+    magic, = struct.unpack_from('>i', buf, pos + 4)
+    double = magic != FRAME_MAGIC
+    runs, nframes, pos = find_runs(buf, pos, double, edr_file.nre)
+    times = read_times(buf, runs, nframes, double)
+    frames = select_frames(times, stride, every)
+    return read_frames(buf, runs, times, frames, columns, double), names
+
+
+def find_runs(buf, pos: int, double: bool, nre: int
+              ) -> Tuple[List[Tuple[int, int, FrameLayout]], int, int]:
+    """Find the runs of frames with the same layout, starting at ``pos``
+
+    Frames without any energies are skipped, and so is an incomplete frame
+    at the end of the file.
+
+    Returns
+    -------
+    runs: list[tuple[int, int, FrameLayout]]
+        The offset of the first frame, the number of frames and the layout
+        of each run.
+    nframes: int
+        The total number of frames in the runs.
+    end: int
+        The offset of the end of the last complete frame.
+    """
+    real = 8 if double else 4
+    raw = np.frombuffer(buf, dtype=np.uint8)
+    runs = []
+    nframes = 0
+    while pos < len(buf):
+        layout = frame_layout(buf, pos, double)
+        if layout is None:
+            break
+        count = count_same_frames(raw, pos, layout, real)
+        if layout.nre > 0:
+            if layout.nre != nre:
+                raise ValueError("Frame has a different number of energy "
+                                 "terms to the file")
+            runs.append((pos, count, layout))
+            nframes += count
+        pos += count * layout.size
+    return runs, nframes, pos
+
+
+def read_times(buf, runs: List[Tuple[int, int, FrameLayout]], nframes: int,
+               double: bool) -> np.ndarray:
+    """Read the time of each frame in the runs from :func:`find_runs`
+
+    The times are needed to choose the frames, and they're cheap to read.
+    """
+    real = 8 if double else 4
+    times = np.empty(nframes)
+    row = 0
+    for pos, count, layout in runs:
+        times[row:row + count] = np.ndarray(
+            (count,), dtype='>f8', buffer=buf, offset=pos + real + 8,
+            strides=(layout.size,))
+        row += count
+    return times
+
+
+def read_frames(buf, runs: List[Tuple[int, int, FrameLayout]],
+                times: np.ndarray, frames: np.ndarray, columns: List[int],
+                double: bool) -> np.ndarray:
+    """Copy the energies of some frames in the runs from :func:`find_runs`
+
+    Parameters
+    ----------
+    times : np.ndarray
+        the time of every frame in the runs, from :func:`read_times`
+    frames : np.ndarray
+        the indices of the frames to copy, in order
+    columns : list[int]
+        the columns of the terms to copy, from :func:`select_terms`
+
+    Returns
+    -------
+    energies: np.ndarray
+        A 2-D array with a row for each frame, and a column for the time and
+        each term.
+    """
+    real = 8 if double else 4
+    realtype = np.dtype('>f8' if double else '>f4')
+    energies = np.empty((len(frames), len(columns) + 1))
+    energies[:, 0] = times[frames]
+    row = 0
+    done = 0
+    energy_columns = [column - 1 for column in columns]
+    for pos, count, layout in runs:
+        end = np.searchsorted(frames, row + count)
+        if end > done:
+            step = (3 if layout.nsum > 0 else 1) * real
+            view = np.ndarray(
+                (count, layout.nre), dtype=realtype, buffer=buf,
+                offset=pos + layout.energies, strides=(layout.size, step))
+            energies[done:end, 1:] = view[
+                np.ix_(frames[done:end] - row, energy_columns)]
+            done = end
+        row += count
+    return energies
+
+
+def follow_edr(path: str, terms: Optional[List[str]] = None,
+               interval: float = 5, stride: int = 1,
+               every: Optional[float] = None
+               ) -> Iterator[Tuple[np.ndarray, List[str]]]:
+    """Follow an EDR file while it's being written, like ``tail -f``
+
+    The offset of the end of the last complete frame is kept, and every
+    ``interval`` seconds, if the file has grown, it's memory-mapped again
+    and only the frames after that offset are read (with
+    :func:`find_runs` and :func:`read_frames`). A frame that's only been
+    partly written is read on a later poll. If the file gets shorter (e.g.
+    the simulation was started again), it's read again from the start. Old
+    (version 1) files aren't supported.
+
+    The generator never stops by itself, so stop iterating when the
+    simulation has finished.
+
+    Parameters
+    ----------
+    path : str
+        path to EDR file to be read
+    terms : list[str]
+        the names of the energy terms to read. By default, all of them.
+    interval : float
+        how often to check for new frames, in seconds
+    stride : int
+        only read every ``stride``-th frame
+    every : float
+        only read the first frame in each interval of ``every`` ps
+
+    Yields
+    ------
+    energies: np.ndarray
+        The new frames since the last poll, like :func:`read_edr_array`. It
+        has no rows if there aren't any new frames, or no columns either if
+        the header of the file hasn't been written yet.
+    names: list[str]
+        The names of the columns.
+    """
+    edr_file = None
+    while True:
+        if edr_file is None:
+            try:
+                edr_file = EDRFile(path)
+            except (OSError, EOFError):
+                yield np.empty((0, 0)), []
+                time.sleep(interval)
+                continue
+            if edr_file.file_version == 1:
+                raise ValueError("Can't follow version 1 EDR files")
+            all_names = [u'Time'] + [nm.name for nm in edr_file.nms]
+            columns = select_terms(all_names, terms)
+            names = [u'Time'] + [all_names[column] for column in columns]
+            pos = edr_file.data.get_position()
+            double = None
+            state = {}
+            buf = edr_file.data.get_buffer()
+        else:
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                size = pos
+            if size < pos:
+                edr_file = None
+                continue
+            buf = map_file(path) if size > pos else b''
+        if len(buf) >= pos + 8 and double is None:
+            # Single or double precision, as in do_eheader
+            magic, = struct.unpack_from('>i', buf, pos + 4)
+            double = magic != FRAME_MAGIC
+        if len(buf) > pos and double is not None:
+            runs, nframes, pos = find_runs(buf, pos, double, edr_file.nre)
+            times = read_times(buf, runs, nframes, double)
+            frames = select_frames(times, stride, every, state)
+            energies = read_frames(buf, runs, times, frames, columns, double)
+        else:
+            energies = np.empty((0, len(names)))
+        del buf
+        yield energies, names
+        time.sleep(interval)
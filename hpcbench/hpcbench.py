@@ -8,6 +8,8 @@ __version__ = '0.9'
 
 import sys
 import os
+import importlib
+import subprocess
 
 has_color = hasattr(sys.stdout, 'isatty') and sys.stdout.isatty(
     ) and sys.platform != 'Pocket PC' and (
@@ -131,52 +133,57 @@ tools = []
 
 tools.append({"Names": ["collate"],
               "Tags": ["util"],
-              "Location": os.path.join(cwd, "logger", "collate.py"),
+              "Module": "hpcbench.logger.collate",
               "Help": "Combine multiple json files together"})
 
+tools.append({"Names": ["finalize"],
+              "Tags": ["util"],
+              "Module": "hpcbench.logger.finalize",
+              "Help": "Parse and collate everything at the end of a job"})
+
 tools.append({"Names": ["cpulog"],
               "Tags": ["logger"],
-              "Location": os.path.join(cwd, "logger", "cpulog.py"),
+              "Module": "hpcbench.logger.cpulog",
               "Help": "Log CPU usage to a json file"})
 
 tools.append({"Names": ["extra"],
               "Tags": ["util"],
-              "Location": os.path.join(cwd, "logger", "extra.py"),
+              "Module": "hpcbench.logger.extra",
               "Help": "Write arbitrary info into a json file"})
 
 tools.append({"Names": ["gmxlog"],
               "Tags": ["parser"],
-              "Location": os.path.join(cwd, "logger", "gmxlog.py"),
+              "Module": "hpcbench.logger.gmxlog",
               "Help": "Convert a gromacs md log to a json file"})
 
 tools.append({"Names": ["nvlog", "gpulog"],
               "Tags": ["logger"],
-              "Location": os.path.join(cwd, "logger", "gpulog.py"),
+              "Module": "hpcbench.logger.gpulog",
               "Help": "Log info from nvidia-smi to a json file"})
 
 tools.append({"Names": ["slurmlog"],
               "Tags": ["parser"],
-              "Location": os.path.join(cwd, "logger", "slurm.py"),
+              "Module": "hpcbench.logger.slurm",
               "Help": "Convert SLURM parameters to a json file"})
 
 tools.append({"Names": ["infolog", "sysinfo"],
               "Tags": ["logger"],
-              "Location": os.path.join(cwd, "logger", "sysinfo.py"),
+              "Module": "hpcbench.logger.sysinfo",
               "Help": "Write generic system info to a json file"})
 
 tools.append({"Names": ["syslog"],
               "Tags": ["logger"],
-              "Location": os.path.join(cwd, "logger", "syslog.py"),
+              "Module": "hpcbench.logger.syslog",
               "Help": "Log values from /sys/ to a json file"})
 
 tools.append({"Names": ["scaling"],
               "Tags": ["plot"],
-              "Location": os.path.join(cwd, "plot", "scaling.py"),
+              "Module": "hpcbench.plot.scaling",
               "Help": "Plot scaling to a PDF (incl. stack plots)"})
 
 tools.append({"Names": ["log"],
               "Tags": ["plot"],
-              "Location": os.path.join(cwd, "plot", "logs.py"),
+              "Module": "hpcbench.plot.logs",
               "Help": "Plot logs to a pdf (e.g. temperature, utilisation)"})
 
 tools.append({"Names": ["findjob"],
@@ -186,72 +193,72 @@ tools.append({"Names": ["findjob"],
 
 tools.append({"Names": ["recrun"],
               "Tags": ["util"],
-              "Location": os.path.join(cwd, "util", "recrun.py"),
+              "Module": "hpcbench.util.recrun",
               "Help": "Run a script on every file with some filename"})
 
 tools.append({"Names": ["insert"],
               "Tags": ["util"],
-              "Location": os.path.join(cwd, "util", "updatejson.py"),
+              "Module": "hpcbench.util.updatejson",
               "Help": "Insert object(s) from one json file into another"})
 
 tools.append({"Names": ["amberlog", "amblog"],
               "Tags": ["parser"],
-              "Location": os.path.join(cwd, "logger", "amberlog.py"),
+              "Module": "hpcbench.logger.amberlog",
               "Help": "Convert an amber md log to a json file"})
 
 tools.append({"Names": ["namdlog"],
               "Tags": ["parser"],
-              "Location": os.path.join(cwd, "logger", "namdlog.py"),
+              "Module": "hpcbench.logger.namdlog",
               "Help": "Convert namd stdout output to a json file"})
 
 tools.append({"Names": ["gmxedr", "gromacsedr"],
               "Tags": ["parser"],
-              "Location": os.path.join(cwd, "logger", "gmxenergy.py"),
+              "Module": "hpcbench.logger.gmxenergy",
               "Help": "Convert a gmx edr file to a json file"})
 
 tools.append({"Names": ["ambenergy", "amberenergy"],
               "Tags": ["parser"],
-              "Location": os.path.join(cwd, "logger", "amberenergy.py"),
+              "Module": "hpcbench.logger.amberenergy",
               "Help": "Extract thermo info from an amber log file"})
 
 tools.append({"Names": ["namdenergy", "namdthermo"],
               "Tags": ["parser"],
-              "Location": os.path.join(cwd, "logger", "namdthermo.py"),
+              "Module": "hpcbench.logger.namdthermo",
               "Help": "Extract thermo info from an namd log file"})
 
 tools.append({"Names": ["lmplog", "lammpslog"],
               "Tags": ["parser"],
-              "Location": os.path.join(cwd, "logger", "lmplog.py"),
+              "Module": "hpcbench.logger.lmplog",
               "Help": "Convert a lammps log to a json file"})
 
 tools.append({"Names": ["ommlog", "openmmlog"],
               "Tags": ["parser"],
-              "Location": os.path.join(cwd, "logger", "ommlog.py"),
+              "Module": "hpcbench.logger.ommlog",
               "Help": "Tidy up openmm benchmark output"})
 
 tools.append({"Names": ["slurm"],
               "Tags": ["prep", "scheduler"],
-              "Location": os.path.join(cwd, "schedulers", "slurm.py"),
+              "Module": "hpcbench.schedulers.slurm",
               "Help": "Manage submission of large numbers of SLURM jobs"})
 
 tools.append({"Names": ["makejob", "job"],
               "Tags": ["prep"],
-              "Location": os.path.join(cwd, "systemprep", "make_job.py"),
+              "Module": "hpcbench.systemprep.make_job",
               "Help": "Create a job submission script from a template"})
 
 tools.append({"Names": ["makejobs", "jobs"],
               "Tags": ["prep"],
-              "Location": os.path.join(cwd, "systemprep", "make_jobs.py"),
+              "Module": "hpcbench.systemprep.make_jobs",
               "Help": "Make many job submission scripts at once"})
 
 tools.append({"Names": ["sacct"],
               "Tags": ["parser"],
-              "Location": os.path.join(cwd, "logger", "sacct.py"),
+              "Module": "hpcbench.logger.sacct",
               "Help": "Write sacct info into a json file"})
 
 tools.append({"Names": ["crosswalk"],
               "Tags": ["util"],
-              "Location": os.path.join(cwd, "logger", "crosswalk.py"),
+              "Module": "hpcbench.logger.crosswalk",
               "Help": "Convert benchmark output files to a standard format"})
 
 tools.append({"Names": ["stall"],
@@ -261,34 +268,117 @@ tools.append({"Names": ["stall"],
 
 tools.append({"Names": ["table"],
               "Tags": ["plot"],
-              "Location": os.path.join(cwd, "plot", "table.py"),
+              "Module": "hpcbench.plot.table",
               "Help": "Make a table from hpcbench data files"})
 
 tools.append({"Names": ["status"],
               "Tags": ["util"],
-              "Location": os.path.join(cwd, "util", "status.py"),
+              "Module": "hpcbench.util.status",
               "Help": "Check status of a completed benchmark run"})
 
 tools.append({"Names": ["best"],
               "Tags": ["plot"],
-              "Location": os.path.join(cwd, "postprocess", "best.py"),
+              "Module": "hpcbench.postprocess.best",
               "Help": "Mark hpcbench output files according to a pattern"})
 
 tools.append({"Names": ["bars"],
               "Tags": ["plot"],
-              "Location": os.path.join(cwd, "plot", "bars.py"),
+              "Module": "hpcbench.plot.bars",
               "Help": "Plot a bar chart"})
 
 tools.append({"Names": ["addsacct"],
               "Tags": ["util"],
-              "Location": os.path.join(cwd, "util", "add_sacct.py"),
-              "Help": "Add slurm accounting info to a hpcench output file"})
+              "Module": "hpcbench.util.add_sacct",
+              "Help": "Add slurm accounting info to hpcbench output files, or "
+              "every one in a folder"})
 
 tools.append({"Names": ["fits"],
               "Tags": ["plot"],
-              "Location": os.path.join(cwd, "postprocess", "fits.py"),
+              "Module": "hpcbench.postprocess.fits",
               "Help": "Fit curves to benchmark output data"})
 
+def unquote(arg):
+    """
+    Remove one layer of single quotes from an argument. The launcher used to
+    pass its arguments through the shell, so job scripts quote arguments with
+    spaces twice, e.g. "'gmx mdrun -s benchmark.tpr'". Tools now run
+    in-process, so the extra quotes are stripped here instead.
+
+    Args:
+        arg: a command-line argument, a string
+
+    Returns:
+        the argument without surrounding single quotes, a string.
+    """
+    if len(arg) > 1 and arg[0] == "'" and arg[-1] == "'":
+        return arg[1:-1]
+    return arg
+
+
+def run_tool(tool, name, argv):
+    """
+    Run a tool from the 'tools' data structure. Python tools are imported
+    (only when they're needed) and run in the same interpreter, shell scripts
+    are run with bash.
+
+    Args:
+        tool: an entry from 'tools', a dictionary
+        name: the name the tool was invoked with, a string
+        argv: the arguments to pass to the tool, a list of strings
+
+    Returns:
+        the exit code, an int (or whatever the tool passed to sys.exit)
+    """
+    if "Location" in tool:
+        return subprocess.run(["bash", tool["Location"]] + argv).returncode
+    module = importlib.import_module(tool["Module"])
+    module.parser.prog = "hpcbench "+name
+    module.cli(argv)
+    return 0
+
+
+def check_tools(tools):
+    """
+    Import every python tool in the 'tools' data structure, to check they
+    can all be run in-process. A tool that needs a package which isn't
+    installed (e.g. matplotlib for the plots) is only warned about, but one
+    that imports a module from hpcbench that doesn't exist (e.g. 'from util
+    import ...', which only works when the file is run as a script) fails.
+
+    Args:
+        tools: the 'tools' data structure, a list of dictionaries
+
+    Returns:
+        a list of the tools that failed, as (module, error) tuples.
+    """
+    local = set()
+    for path, directories, filenames in os.walk(cwd):
+        local.update(os.path.splitext(filename)[0] for filename in filenames
+                     if filename.endswith(".py"))
+        local.update(directories)
+    failed = []
+    for tool in tools:
+        if "Module" not in tool:
+            continue
+        try:
+            module = importlib.import_module(tool["Module"])
+        except ModuleNotFoundError as e:
+            missing = (e.name or "").split(".")[0]
+            if missing == "hpcbench" or missing in local:
+                failed.append((tool["Module"], str(e)))
+            else:
+                print("Warning: "+tool["Module"]+" needs "+missing
+                      + ", which isn't installed.")
+            continue
+        except Exception as e:
+            failed.append((tool["Module"], repr(e)))
+            continue
+        for attribute in ["parser", "cli"]:
+            if not hasattr(module, attribute):
+                failed.append((tool["Module"], "no "+attribute))
+    return failed
+
+
 def entry_point():
     """
     This is the hpcbench entry point, it's the code that runs when you type
@@ -333,23 +423,27 @@ def entry_point():
         plot = filter_tag(tools, ["util"], ignore_tags=ignore)
         print_table(plot, col_widths, header=col("Utilities", header_col),
                     colours=[_c.YELLOW, "", ""])
+    elif sys.argv[1] == "--check":
+        failed = check_tools(tools)
+        for module, error in failed:
+            print(module+": "+error)
+        if not failed:
+            print("All tools can be imported.")
+        sys.exit(1 if failed else 0)
     elif len(sys.argv) > 1:
+        curr_tool = None
         for tool in tools:
             names = [name.replace('-', '_') for name in tool["Names"]] + \
                 [name.replace('-', '') for name in tool["Names"]]+tool["Names"]
             if sys.argv[1] in names:
                 curr_tool = tool
 
-        try:
-            if ".py" in curr_tool["Location"]:
-                runwith = "python"
-            if ".sh" in curr_tool["Location"]:
-                runwith = "bash"
-            args = runwith+" "+curr_tool["Location"]+" "+" ".join(sys.argv[2:])
-            os.system(args)
-        except UnboundLocalError:
+        if curr_tool is None:
             print("No tool found with name '" +
                   sys.argv[1]+"'. Run hpcbench with no arguments for a list.")
+            sys.exit(1)
+        sys.exit(run_tool(curr_tool, sys.argv[1],
+                          [unquote(arg) for arg in sys.argv[2:]]))
 
 
 if __name__ == "__main__":
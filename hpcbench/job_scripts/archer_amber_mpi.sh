@@ -26,9 +26,4 @@ srun --unbuffered --cpu-bind=cores --distribution=block:block --hint=nomultithre
 
 ###POSTFIX
 kill £cpuid
-hpcbench sacct £SLURM_JOB_ID accounting.json
-hpcbench amberlog benchmark.mdout run.json
-hpcbench slurmlog £0 slurm.json
-hpcbench extra -e "'Comment:$comment'" -e "'Machine:$machine'" meta.json
-hpcbench amberenergy benchmark.mdout thermo.json
-hpcbench collate -l sysinfo.json thermo.json run.json accounting.json slurm.json meta.json -o $benchout
+hpcbench finalize £0 $benchout -j £SLURM_JOB_ID -e "'Comment:$comment'" -e "'Machine:$machine'" -i sysinfo.json
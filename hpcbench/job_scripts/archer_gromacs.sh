@@ -24,10 +24,5 @@ srun --cpu-freq=2250000 --unbuffered --cpu-bind=cores --distribution=block:block
 
 ###POSTFIX
 kill £cpuid
-hpcbench sacct £SLURM_JOB_ID accounting.json
-hpcbench gmxlog md.log run.json
-hpcbench slurmlog £0 slurm.json
-hpcbench extra -e "'Comment:$comment'" -e "'Machine:$machine'" meta.json
-hpcbench gmxedr ener.edr thermo.json
-hpcbench collate -l sysinfo.json thermo.json run.json accounting.json slurm.json meta.json -o $benchout
+hpcbench finalize £0 $benchout -j £SLURM_JOB_ID -e "'Comment:$comment'" -e "'Machine:$machine'" -i sysinfo.json
 rm benchmark.tpr traj.trr
@@ -25,10 +25,5 @@ srun --distribution=block:block --hint=nomultithread --unbuffered --cpu-bind=cor
 
 ###POSTFIX
 kill £cpuid
-hpcbench sacct £SLURM_JOB_ID accounting.json
-hpcbench namdlog benchmark.log run.json
-hpcbench slurmlog £0 slurm.json
-hpcbench extra -e "'Comment:$comment'" -e "'Machine:$machine'" meta.json
-hpcbench namdenergy benchmark.log thermo.json
-hpcbench collate -l sysinfo.json thermo.json run.json accounting.json slurm.json meta.json -o $benchout
+hpcbench finalize £0 $benchout -j £SLURM_JOB_ID -e "'Comment:$comment'" -e "'Machine:$machine'" -i sysinfo.json
 rm benchmark.coor* benchmark.dcd benchmark.pdb benchmark.psf benchmark.vel.*
@@ -23,9 +23,4 @@ pmemd.cuda -O -i $benchmarkinfile -p $benchmarktopfile -c $benchmarkrstfile -ref
 ###POSTFIX
 kill £gpuid
 kill £cpuid
-hpcbench sacct £SLURM_JOB_ID accounting.json
-hpcbench amberlog benchmark.mdout run.json
-hpcbench slurmlog £0 slurm.json
-hpcbench extra -e "'Comment:$comment'" -e "'Machine:$machine'" meta.json
-hpcbench amberenergy benchmark.mdout thermo.json
-hpcbench collate -l sysinfo.json gpulog.json cpulog.json thermo.json accounting.json run.json slurm.json meta.json -o $benchout
+hpcbench finalize £0 $benchout -j £SLURM_JOB_ID -e "'Comment:$comment'" -e "'Machine:$machine'" -i sysinfo.json gpulog.json cpulog.json
@@ -24,10 +24,5 @@ gmx mdrun -s $benchmarkfile -ntomp 10 -nb gpu -pme gpu -bonded gpu -dlb no -nstl
 ###POSTFIX
 kill £gpuid
 kill £cpuid
-hpcbench sacct £SLURM_JOB_ID accounting.json
-hpcbench gmxlog md.log run.json
-hpcbench slurmlog £0 slurm.json
-hpcbench extra -e "'Comment:$comment'" -e "'Machine:$machine'" meta.json
-hpcbench gmxedr ener.edr thermo.json
-hpcbench collate -l sysinfo.json gpulog.json cpulog.json thermo.json accounting.json run.json slurm.json meta.json -o $benchout
+hpcbench finalize £0 $benchout -j £SLURM_JOB_ID -e "'Comment:$comment'" -e "'Machine:$machine'" -i sysinfo.json gpulog.json cpulog.json
 rm benchmark.tpr traj.trr
@@ -21,10 +21,5 @@ namd3 +idlepoll +p 4 +devices £gpus $benchmarkinfile | tee namdlog.txt
 ###POSTFIX
 kill £gpuid
 kill £cpuid
-hpcbench sacct £SLURM_JOB_ID accounting.json
-hpcbench namdlog namdlog.txt run.json
-hpcbench slurmlog £0 slurm.json
-hpcbench extra -e "'Comment:$comment'" -e "'Machine:$machine'" meta.json
-hpcbench namdenergy benchmark.log thermo.json
-hpcbench collate -l sysinfo.json gpulog.json cpulog.json thermo.json accounting.json run.json slurm.json meta.json -o $benchout
+hpcbench finalize £0 $benchout -j £SLURM_JOB_ID -n benchmark.log -e "'Comment:$comment'" -e "'Machine:$machine'" -i sysinfo.json gpulog.json cpulog.json
 rm benchmark.coor* benchmark.dcd benchmark.pdb benchmark.psf benchmark.vel.*
@@ -25,11 +25,6 @@ pmemd.hip -O -i $benchmarkinfile -p $benchmarktopfile -c $benchmarkrstfile -ref
 ###POSTFIX
 kill £(< gpu.pid)
 kill £(< cpu.pid)
-hpcbench sacct £SLURM_JOB_ID accounting.json
-hpcbench amberlog benchmark.mdout run.json
-hpcbench slurmlog £0 slurm.json
-hpcbench extra -e "'Comment:none'" -e "'Machine:LUMI-G'" -e "'MD:AMBER'" -e "'Atoms:$atoms'" meta.json
-hpcbench amberenergy benchmark.mdout thermo.json
 sleep 5
-hpcbench collate -l sysinfo.json gpulog.json cpulog.json thermo.json accounting.json run.json slurm.json meta.json -o amber_lumi_${atoms}atoms.json
+hpcbench finalize £0 amber_lumi_${atoms}atoms.json -j £SLURM_JOB_ID -e "'Comment:none'" -e "'Machine:LUMI-G'" -e "'MD:AMBER'" -e "'Atoms:$atoms'" -i sysinfo.json gpulog.json cpulog.json
 
@@ -35,11 +35,6 @@ gmx_mpi mdrun -s $benchfilename -ntomp 16 -nb gpu -pme gpu -bonded gpu -dlb no -
 ###POSTFIX
 kill £(< gpu.pid)
 kill £(< cpu.pid)
-hpcbench sacct £SLURM_JOB_ID accounting.json
-hpcbench gmxlog md.log run.json
-hpcbench slurmlog £0 slurm.json
-hpcbench extra -e "'Comment:none'" -e "'Machine:LUMI-G'" -e "'MD:Gromacs'" -e "'Atoms:$atoms'" meta.json
-hpcbench gmxedr ener.edr thermo.json
 sleep 5
-hpcbench collate -l sysinfo.json gpulog.json cpulog.json thermo.json accounting.json run.json slurm.json meta.json -o gromacs_lumi_${atoms}atoms.json
+hpcbench finalize £0 gromacs_lumi_${atoms}atoms.json -j £SLURM_JOB_ID -e "'Comment:none'" -e "'Machine:LUMI-G'" -e "'MD:Gromacs'" -e "'Atoms:$atoms'" -i sysinfo.json gpulog.json cpulog.json
 rm benchmark.tpr traj.trr
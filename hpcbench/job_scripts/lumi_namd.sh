@@ -26,11 +26,6 @@ namd3 +idlepoll +p 16 +devices £gpus $benchmarkinfile | tee namdlog.txt
 ###POSTFIX
 kill £(< gpu.pid)
 kill £(< cpu.pid)
-hpcbench sacct £SLURM_JOB_ID accounting.json
-hpcbench namdlog namdlog.txt run.json
-hpcbench slurmlog £0 slurm.json
-hpcbench extra -e "'Comment:none'" -e "'Machine:LUMI-G'" -e "'MD:NAMD'" -e "'Atoms:$atoms'" meta.json
-hpcbench namdenergy namdlog.txt thermo.json
 sleep 5
-hpcbench collate -l sysinfo.json gpulog.json cpulog.json thermo.json accounting.json run.json slurm.json meta.json -o namd_lumi_${atoms}atoms.json
+hpcbench finalize £0 namd_lumi_${atoms}atoms.json -j £SLURM_JOB_ID -l namdlog.txt -n namdlog.txt -e "'Comment:none'" -e "'Machine:LUMI-G'" -e "'MD:NAMD'" -e "'Atoms:$atoms'" -i sysinfo.json gpulog.json cpulog.json
 
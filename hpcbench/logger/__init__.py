@@ -1,12 +1,24 @@
-from . import collate
-from . import cpulog
-from . import extra
-from . import gmxlog
-from . import gpulog
-from . import slurm
-from . import sysinfo
-from . import syslog
-from . import util
-from . import amberlog
-from . import crosswalk
-from . import sacct
+import importlib
+
+_submodules = [
+    "collate",
+    "cpulog",
+    "extra",
+    "gmxlog",
+    "gpulog",
+    "slurm",
+    "sysinfo",
+    "syslog",
+    "util",
+    "amberlog",
+    "crosswalk",
+    "sacct",
+    "finalize",
+    "energy",
+]
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module("."+name, __name__)
+    raise AttributeError("module "+__name__+" has no attribute "+name)
@@ -6,43 +6,231 @@ Get the energies from the log in an amber mdout file as a dictionary
 
 import json
 import argparse
-import copy
+import os
+import re
+import numpy as np
+from hpcbench.logger.energy import (EnergySeries, parse_floats, read_chunks,
+                                    to_floats)
+from hpcbench.logger.util import positive_count
 
 parser = argparse.ArgumentParser("Dump get energy info from AMBER log file.")
 parser.add_argument("log", type=str, help="AMBER log file")
 parser.add_argument("json", type=str, help="json output file.")
+parser.add_argument("-z", "--npz", type=str, nargs="?", const="",
+                    help="Save the energies to a compressed .npz file instead,"
+                    " and only write a summary (mean, std and drift of each "
+                    "term) and the location of the .npz file to the json "
+                    "file. By default, the .npz file has the same name as "
+                    "the json file.")
+parser.add_argument("-s", "--stride", type=positive_count, default=1,
+                    help="Only extract every nth frame.")
 
+# 'name = value', e.g. 'EPtot      =    -71862.2801'. For '1-4 NB = ...', the
+# name is just NB. The lookbehind stops the regex trying every character of
+# long words (like the lines of dashes) as the start of a name.
+PAIR = re.compile(r"(?<!\S)([^\s=]+)\s*=\s*([^\s=]+)")
 
-def parse_amber_energies_log(mdout):
+# Every record starts with the step. There can be other 'name = value' lines
+# before the first record (e.g. '| CHECK switch(x): max rel err = ...' from
+# pmemd), so the records are found by this rather than by the first pair.
+MARKER = re.compile(r"(?<!\S)NSTEP\s*=")
+
+# The energies are between these
+RESULTS = "4.  RESULTS"
+RESULTS_END = ["A V E R A G E S", "5.  TIMINGS"]
+
+# Names that are changed, so the series look the same as the other engines
+RENAME = {"TIME(PS)": "Time"}
+
+
+def record_marker(text):
+    """
+    Find the step at the start of the first record, with the spaces and the
+    '=' after it exactly as they are in the file.
+
+    Args:
+        text: the start of the results section, a string.
+
+    Returns:
+        the marker, e.g. 'NSTEP =', or None if there isn't a record yet.
+    """
+    match = MARKER.search(text)
+    if not match:
+        return None
+    return match.group()
+
+
+def parse_fast(records, names):
+    """
+    Parse records which all have exactly the same layout (the usual case) in
+    one go, without looking at each one in python.
+
+    Args:
+        records: the text of each record, after the marker.
+        names: the names of the terms, starting with the marker's.
+
+    Returns:
+        a 2-D NumPy array with a row for each record, or None if the records
+        don't all have the same layout.
+    """
+    first = records[0].split()
+    equals = [i for i, word in enumerate(first) if word == "="]
+    if [names[0]] + [first[i-1] for i in equals] != names or \
+            equals[-1:] == [len(first)-1]:
+        return None
+    width = len(first)
+    count = len(records)
+    words = " ".join(records).split()
+    if len(words) != count * width:
+        return None
+    for i in equals:
+        if words[i::width].count("=") != count or \
+                words[i-1::width].count(first[i-1]) != count:
+            return None
+    # the marker's value comes first, then the word after each '='
+    columns = [words[i::width] for i in [0] + [i+1 for i in equals]]
+    energies = parse_floats(" ".join(map(" ".join, columns)), count)
+    return None if energies is None else energies.T
+
+
+def parse_slow(records, names, marker):
+    """
+    Parse records one at a time, for when they don't all have the same
+    layout. Missing terms (e.g. in the last record if AMBER was killed) are
+    NaN and terms that weren't in the first record are ignored.
+
+    Args:
+        records: the text of each record, after the marker.
+        names: the names of the terms, starting with the marker's.
+        marker: the marker, from record_marker.
+
+    Returns:
+        a 2-D NumPy array with a row for each record.
+    """
+    rows = []
+    for record in records:
+        values = dict(PAIR.findall(marker + record))
+        rows.append([values.get(name, "nan") for name in names])
+    return to_floats(rows)
+
+
+def parse_records(records, names, marker):
+    """
+    Parse records with parse_fast if possible, otherwise parse_slow. The
+    last record is often followed by something else (e.g. the start of the
+    timings), so if that's the only one that's different, the rest are
+    still parsed quickly.
+
+    Args:
+        records: the text of each record, after the marker.
+        names: the names of the terms, starting with the marker's.
+        marker: the marker, from record_marker.
+
+    Returns:
+        a 2-D NumPy array with a row for each record.
+    """
+    energies = parse_fast(records, names)
+    if energies is not None:
+        return energies
+    energies = parse_fast(records[:-1], names) if len(records) > 1 else None
+    if energies is not None:
+        return np.concatenate(
+            [energies, parse_slow(records[-1:], names, marker)])
+    return parse_slow(records, names, marker)
+
+
+def read_records(mdout):
+    """
+    Read the records from the results section of an amber mdout file a chunk
+    at a time.
+
+    Args:
+        mdout - path to amber mdout file
+    Yields:
+        the marker from record_marker, and a list of the text of each record
+        in the chunk, after the marker. The last record in the file might be
+        incomplete, if AMBER was killed.
+    """
+    marker = None
+    pending = None
+    for chunk in read_chunks(mdout):
+        start = 0
+        if pending is None:
+            start = chunk.find(RESULTS)
+            if start < 0:
+                continue
+            pending = ""
+        ends = [chunk.find(end, start) for end in RESULTS_END]
+        ends = [end for end in ends if end >= 0]
+        text = pending + chunk[start:min(ends, default=len(chunk))]
+        pending = ""
+        marker = marker or record_marker(text)
+        if marker is None:
+            pending = text
+        else:
+            records = text.split(marker)[1:]
+            if records and not ends:
+                # the last record carries on in the next chunk
+                pending = marker + records.pop()
+            if records:
+                yield marker, records
+        if ends:
+            return
+    if pending and marker:
+        yield marker, pending.split(marker)[1:]
+
+
+def parse_amber_energies_log(mdout, npz=None, directory=".", stride=1):
     """
-    Get the energies from the log in an amber mdout file as a dictionary.
+    Get the energies from the log in an amber mdout file. The results section
+    is split into records (one for each step that was printed) a chunk at a
+    time. The records normally all have the same layout, so each chunk of
+    records is converted to NumPy in one go and added to an EnergySeries,
+    with a column for each 'name = value' term. Records skipped by the
+    stride aren't converted at all. The averages and RMS fluctuations at the
+    end aren't included. The time is called 'Time' rather than 'TIME(PS)',
+    like the other engines.
 
     Args:
         mdout - path to amber mdout file
+        npz - if this is set, save the energies to this .npz file instead.
+        directory - the folder the output will be saved to. The location of
+        the .npz file is stored relative to this.
+        stride - only extract every nth frame.
     Returns:
-        results - a dictionary of results
-    """
-    results = {}
-    with open(mdout, "r") as infile:
-        for line in infile:
-            if (line.count("=") == 3) or ("Density" in line and "=" in line):
-                line = line.split()
-                for i in range(len(line)):
-                    if line[i] == "=":
-                        key = line[i-1]
-                        value = line[i+1]
-                        try:
-                            results[key].append(value)
-                        except KeyError:
-                            results[key] = [value]
-    for key, value in copy.copy(results).items():
-        if len(value) == 1:
-            del results[key]
-    return results
+        results - a dictionary with a list of values for each term, or the
+        .npz file and a summary if npz is set (see EnergySeries.output).
+    """
+    series = EnergySeries([])
+    for marker, records in read_records(mdout):
+        if not series.names:
+            names = [name for name, value in PAIR.findall(
+                marker + records[0])]
+            series = EnergySeries([RENAME.get(name, name) for name in names],
+                                  stride)
+        records = records[series.keep(len(records))]
+        if records:
+            series.append(parse_records(records, names, marker))
+    return series.output(npz, directory)
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
-    results = parse_amber_energies_log(args.log)
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
+    npz = args.npz
+    if npz == "":
+        npz = os.path.splitext(args.json)[0]+".npz"
+    results = parse_amber_energies_log(
+        args.log, npz, os.path.dirname(os.path.abspath(args.json)),
+        args.stride)
     with open(args.json, "w") as outfile:
         json.dump(results, outfile, indent=4)
+
+
+if __name__ == "__main__":
+    cli()
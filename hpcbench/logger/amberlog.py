@@ -5,6 +5,7 @@ Parse AMBER log files and convert them to json files.
 """
 
 import argparse
+import itertools
 import json
 from hpcbench.logger.crosswalk import standardise_totals
 
@@ -20,9 +21,131 @@ parser.add_argument("-a", "--accounting", type=str, default="accounting.json",
                     "hpcbench syslog.")
 
 
+def skip_to(lines, *markers):
+    """
+    Skip lines until one contains one of the markers.
+
+    Args:
+        lines: an iterator over the lines of a file.
+        markers: strings to look for.
+
+    Returns:
+        The first line containing one of the markers, or None if the end of
+        the file is reached first.
+    """
+    for line in lines:
+        for marker in markers:
+            if marker in line:
+                return line
+    return None
+
+
+def parse_statements(line, infile):
+    """
+    Parse comma-separated 'name=value' statements from the input file (or
+    the control data) into a dictionary.
+
+    Args:
+        line: a line from the log file, a string.
+        infile: the dictionary to add the values to.
+    """
+    if "," in line:
+        for statement in line.split(","):
+            statement = statement.strip()
+            if "=" in statement:
+                before, after = statement.split("=")
+                infile[before.strip()] = after.strip()
+
+
+def parse_header(lines, output):
+    """
+    Parse the start of the log file, up to the results, for the input
+    parameters and number of atoms.
+
+    Args:
+        lines: an iterator over the lines of the log file.
+        output: the output dictionary.
+
+    Returns:
+        The line the header ended on (the start of the results or the
+        timings), or None if the end of the file was reached.
+    """
+    reading_inparams = False
+    for line in lines:
+        if "Here is the input file" in line:
+            reading_inparams = True
+        if reading_inparams:
+            parse_statements(line, output["Infile"])
+        if "INFORMATION" in line:
+            reading_inparams = False
+        if "NATOM" in line:
+            output["Totals"]["Atoms"] = line.strip().split()[2]
+        if "RESULTS" in line or "TIMINGS" in line:
+            return line
+    return None
+
+
+def parse_timings(lines, output):
+    """
+    Parse the tables in the TIMINGS section, up to the final performance.
+
+    Args:
+        lines: an iterator over the lines of the log file, starting with the
+        TIMINGS line.
+        output: the output dictionary.
+    """
+    timing_shortname = "NONE"
+    for line in lines:
+        if "NonSetup CPU Time in Major Routines" in line:
+            timing_shortname = "Major Routines"
+        elif "PME Nonbond Pairlist CPU Time" in line:
+            timing_shortname = "PME Nonbond Pairlist"
+        elif "PME Direct Force CPU Time" in line:
+            timing_shortname = "PME Direct Force"
+        elif "PME Reciprocal Force" in line:
+            timing_shortname = "PME Reciprocal Force"
+        elif "Final Performance" in line:
+            return
+        else:
+            line_fmt = line.split()
+            if len(line_fmt) > 3:
+                line_fmt = line_fmt[1:]
+                merge_max = len(line_fmt) - 2
+                line_fmt[0:merge_max] = [' '.join(line_fmt[0:merge_max])]
+                linedict = {"Sec": line_fmt[1], "%": line_fmt[2]}
+                output.setdefault(timing_shortname, {})[line_fmt[0]] = \
+                    linedict
+
+
+def parse_totals(lines, output):
+    """
+    Parse the average timings for all steps (and anything else after them
+    in the format 'label = value').
+
+    Args:
+        lines: an iterator over the lines of the log file.
+        output: the output dictionary.
+    """
+    for line in lines:
+        if "=" not in line:
+            continue
+        # why format it like this, what is wrong with you
+        line_fmt = line.split()[1:]
+        prev = 0
+        for i in range(len(line_fmt)):
+            if line_fmt[i] == "=":
+                value = line_fmt[i+1]
+                label = " ".join(line_fmt[prev:i])
+                prev = i+2
+                output["Totals"][label] = value
+
+
 def parse_amber_log(logfile, standardise=True, accounting="accounting.json"):
     """
     Parse the contents of an AMBER log file and extract the performance info.
+    The file is read one line at a time, and the results (the energies at
+    each step) are skipped until the TIMINGS section, so long logs don't
+    need to fit in memory.
 
     Args:
         logfile - path to the amber log file (normally mdout), a string
@@ -36,75 +159,37 @@ def parse_amber_log(logfile, standardise=True, accounting="accounting.json"):
     """
     output = {"AMBER info": {}, "Infile": {}, "Totals": {}}
     with open(logfile, "r") as file:
-        loglines = file.readlines()
-    reading_inparams = False
-    reading_timings = False
-    reading_totals = False
-    for line in loglines:
-        if "Here is the input file" in line:
-            reading_inparams = True
-        if reading_inparams:
-            if "," in line:
-                for statement in line.split(","):
-                    statement = statement.strip()
-                    if "=" in statement:
-                        before, after = statement.split("=")
-                        output["Infile"][before.strip()] = after.strip()
-        if "INFORMATION" in line:
-            reading_inparams = False
-        if "TIMINGS" in line:
-            reading_timings = True
-            timing_shortname = "NONE"
-        if reading_timings:
-            if "NonSetup CPU Time in Major Routines" in line:
-                timing_shortname = "Major Routines"
-            elif "PME Nonbond Pairlist CPU Time" in line:
-                timing_shortname = "PME Nonbond Pairlist"
-            elif "PME Direct Force CPU Time" in line:
-                timing_shortname = "PME Direct Force"
-            elif "PME Reciprocal Force" in line:
-                timing_shortname = "PME Reciprocal Force"
-            elif "Final Performance" in line:
-                reading_timings = False
-            else:
-                line_fmt = ' '.join(line.split()).strip().split(" ")
-                if len(line_fmt) > 3:
-                    line_fmt = line_fmt[1:]
-                    merge_max = len(line_fmt) - 2
-                    line_fmt[0:merge_max] = [' '.join(line_fmt[0:merge_max])]
-                    linedict = {"Sec": line_fmt[1], "%": line_fmt[2]}
-                    try:
-                        output[timing_shortname][line_fmt[0]] = linedict
-                    except KeyError:
-                        output[timing_shortname] = {}
-                        output[timing_shortname][line_fmt[0]] = linedict
-        if "Average timings for all steps" in line:
-            reading_totals = True
-        if reading_totals:
-            # why format it like this, what is wrong with you
-            line_fmt = ' '.join(line.split()).strip().split(" ")[1:]
-            prev = 0
-            for i in range(len(line_fmt)):
-                if line_fmt[i] == "=":
-                    value = line_fmt[i+1]
-                    label = " ".join(line_fmt[prev:i])
-                    prev = i+2
-                    output["Totals"][label] = value
-        if "NATOM" in line:
-            output["Totals"]["Atoms"] = line.strip().split()[2]
-        if 'nstlim' in output['Infile']:
-            output['Totals']['Number of steps'] = output['Infile']['nstlim']
-            output['Totals']['Simulation time (ns)'] = str(0.001 * int(
-                output['Infile']['nstlim'])*float(output['Infile']['dt']))
-            output['Totals']['Timestep (ns)'] = str(
-                float(output['Infile']['dt']) / 1000)
+        lines = iter(file)
+        line = parse_header(lines, output)
+        if line is not None and "TIMINGS" not in line:
+            line = skip_to(lines, "TIMINGS")
+        if line is not None:
+            parse_timings(itertools.chain([line], lines), output)
+            skip_to(lines, "Average timings for all steps")
+            parse_totals(lines, output)
+    if 'nstlim' in output['Infile']:
+        output['Totals']['Number of steps'] = output['Infile']['nstlim']
+        output['Totals']['Simulation time (ns)'] = str(0.001 * int(
+            output['Infile']['nstlim'])*float(output['Infile']['dt']))
+        output['Totals']['Timestep (ns)'] = str(
+            float(output['Infile']['dt']) / 1000)
     if standardise:
         output["Totals"] = standardise_totals(output["Totals"], accounting)
     return output
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     log = parse_amber_log(args.log, args.keep, args.accounting)
     with open(args.output, "w") as outfile:
         json.dump(log, outfile, indent=4)
+
+
+if __name__ == "__main__":
+    cli()
@@ -8,23 +8,35 @@ import json
 import argparse
 import os
 import hpcbench
+from hpcbench.logger.util import load_log, log_name
 
 parser = argparse.ArgumentParser(description="Combine json files.")
 parser.add_argument('-l', '--list', nargs='+',
-                    help='List of json files to collate', required=True)
+                    help='List of json files to collate. Files ending in '
+                    '.jsonl (from loggers writing one sample per line) are '
+                    'converted to the normal layout.', required=True)
 parser.add_argument('-o', '--output', help='output json file', required=True)
 parser.add_argument('-s', '--save', action="store_true",
                     help='Save original output files (normally deleted)')
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     output = {}
     for jsonfile in args.list:
-        with open(jsonfile, "r") as file:
-            output[jsonfile.replace(".json", "")] = json.load(file)
+        output[log_name(jsonfile)] = load_log(jsonfile)
         if not args.save:
             os.remove(jsonfile)
         output['version'] = hpcbench.__version__
     with open(args.output, "w") as outfile:
         json.dump(output, outfile, indent=4)
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,13 +1,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-Read info from ps for a given process to a json file.
+Read the CPU usage of a given process (from /proc, or ps) to a json file.
 """
 
 import argparse
 import subprocess
 import time
-from hpcbench.logger.util import GracefulKiller
+from hpcbench.logger.util import (GracefulKiller, RecordWriter, is_records,
+                                  fold_record, Ticker, positive_interval)
 import json
 import os
 
@@ -15,54 +16,210 @@ parser = argparse.ArgumentParser(
     description="Log the CPU usage of a particular process to a json file.")
 parser.add_argument("process", type=str,
                     help="Name of the process to check the CPU usage for.")
-parser.add_argument("output", type=str, help="Output json file")
-parser.add_argument("-i", "--interval", type=int, default=5,
+parser.add_argument("output", type=str, help="Output json file. If the name "
+                    "ends in .jsonl, each sample is appended to the file "
+                    "instead of rewriting the whole file every interval.")
+parser.add_argument("-i", "--interval", type=positive_interval,
+                    default=5,
                     help="How often to log. Defaults to 1.")
 parser.add_argument("-p", "--pid", type=str, help="Write PID to a file")
+parser.add_argument("-m", "--method", type=str, default="proc",
+                    choices=["proc", "ps"],
+                    help="How to get CPU usage. 'proc' reads the process's "
+                    "threads from /proc, which is much cheaper than 'ps' on "
+                    "large nodes. Defaults to proc.")
 
 
-def log_cpu(progname, killer, output, for_time=1e30, interval=5):
+def sample_ps(progname):
+    """
+    Get the CPU usage of every thread of some process from ps.
+
+    Args:
+        progname: name of the process executable, a string.
+
+    Returns:
+        A dictionary of lists, containing the %cpu of each thread, indexed by
+        the core the thread is running on.
+    """
+    cpu = subprocess.run(['ps', '-Leo', 'pid,ppid,tid,psr,%cpu,%mem,cmd'],
+                         capture_output=True, text=True).stdout
+    sample = {}
+    for line in cpu.split("\n"):
+        if progname in line and "python" not in line:
+            line = ' '.join(line.strip().split()).split(" ")
+            try:
+                sample[line[3]].append(line[4])
+            except KeyError:
+                sample[line[3]] = []
+                sample[line[3]].append(line[4])
+    return sample
+
+
+class ProcSampler:
+    """
+    Get the CPU usage of every thread of some process (and its children) by
+    reading /proc/<pid>/task/<tid>/stat. The processes are looked up when the
+    sampler starts (or when there aren't any yet) and every 'rescan' samples
+    after that, not on every sample. Usage is worked out from the change in
+    utime + stime since the previous sample, so it's the usage over the last
+    interval, rather than the average over the lifetime of the thread like ps.
+    """
+
+    def __init__(self, progname, rescan=30):
+        """
+        Args:
+            progname: name of the process executable, a string.
+            rescan: look for new processes every this many samples.
+        """
+        self.progname = progname
+        self.rescan = rescan
+        self.samples = 0
+        self.pids = []
+        self.last = {}
+        self.last_time = None
+        self.ticks = os.sysconf("SC_CLK_TCK")
+
+    def find_pids(self):
+        """
+        Find the processes matching progname (ignoring python processes, as
+        ps mode does) and all of their children.
+
+        Returns:
+            a list of pids (ints).
+        """
+        parents = {}
+        matched = set()
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            pid = int(entry)
+            try:
+                with open("/proc/"+entry+"/cmdline", "rb") as file:
+                    cmd = file.read().replace(b"\0", b" ").decode(
+                        errors="replace")
+                with open("/proc/"+entry+"/stat", "r") as file:
+                    stat = file.read()
+            except OSError:
+                continue
+            parents[pid] = int(stat[stat.rindex(")")+2:].split(" ")[1])
+            if pid != os.getpid() and self.progname in cmd and \
+                    "python" not in cmd:
+                matched.add(pid)
+        # add children, grandchildren etc.
+        found = True
+        while found:
+            found = False
+            for pid, ppid in parents.items():
+                if ppid in matched and pid not in matched:
+                    matched.add(pid)
+                    found = True
+        return sorted(matched)
+
+    def sample(self):
+        """
+        Get the CPU usage of each thread since the last sample.
+
+        Returns:
+            A dictionary of lists, containing the %cpu of each thread, indexed
+            by the core the thread last ran on. Empty on the first sample.
+        """
+        if not self.pids or self.samples % self.rescan == 0:
+            self.pids = self.find_pids()
+        self.samples += 1
+        now = time.monotonic()
+        current = {}
+        sample = {}
+        for pid in self.pids:
+            taskdir = "/proc/"+str(pid)+"/task/"
+            try:
+                tids = os.listdir(taskdir)
+            except OSError:
+                continue
+            for tid in tids:
+                try:
+                    with open(taskdir+tid+"/stat", "r") as file:
+                        stat = file.read()
+                except OSError:
+                    continue
+                # fields after the command name, which can contain spaces
+                fields = stat[stat.rindex(")")+2:].split(" ")
+                cputime = int(fields[11]) + int(fields[12])
+                core = fields[36]
+                current[tid] = cputime
+                if self.last_time is None or tid not in self.last:
+                    continue
+                usage = 100 * (cputime - self.last[tid]) / self.ticks / (
+                    now - self.last_time)
+                try:
+                    sample[core].append(str(round(usage, 1)))
+                except KeyError:
+                    sample[core] = [str(round(usage, 1))]
+        self.last = current
+        self.last_time = now
+        return sample
+
+
+def log_cpu(progname, killer, output, for_time=1e30, interval=5,
+            method="proc"):
     """
     Log the CPU usage of some process.
 
     Args:
         progname: name of the process executable, a string.
         killer: object, handler for sigterm etc.
+        output: output file. If it ends in .jsonl, samples are appended to it
+        with RecordWriter.
         for_time: return after x seconds.
         interval: take measurements every x seconds.
+        method: 'proc' to use ProcSampler, or 'ps' to use sample_ps.
 
     Returns:
         A dictionary containing lists of CPU usage for each core.
     """
-    elapsed_time = 0
     cores = {}
-    while elapsed_time < for_time and not killer.kill_now:
-        cpu = subprocess.run(['ps', '-Leo', 'pid,ppid,tid,psr,%cpu,%mem,cmd'],
-                             capture_output=True, text=True).stdout
-        for line in cpu.split("\n"):
-            if progname in line and "python" not in line:
-                line = ' '.join(line.strip().split()).split(" ")
-                try:
-                    cores[line[3]].append(line[4])
-                except KeyError:
-                    cores[line[3]] = []
-                    cores[line[3]].append(line[4])
-        time.sleep(interval)
-        elapsed_time += interval
-        with open(output, "w") as outfile:
-            json.dump(cores, outfile, indent=4)
+    writer = RecordWriter(output) if is_records(output) else None
+    if method == "proc":
+        sampler = ProcSampler(progname)
+    ticker = Ticker(interval, killer, for_time)
+    for elapsed_time in ticker:
+        if method == "proc":
+            sample = sampler.sample()
+        else:
+            sample = sample_ps(progname)
+        fold_record(cores, sample)
+        if writer:
+            writer.write(sample)
+        else:
+            with open(output, "w") as outfile:
+                json.dump(cores, outfile, indent=4)
+    if writer:
+        writer.close()
+    if ticker.missed:
+        print("Missed "+str(ticker.missed)+" samples of CPU usage")
     if killer.kill_now:
-        print("Killed logging of CPU usage early at "+str(elapsed_time)+"s")
+        print("Killed logging of CPU usage early at "+str(
+            ticker.elapsed)+"s")
     return cores
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     if args.pid:
         with open(args.pid, "w") as file:
             file.write(str(os.getpid()))
     killer = GracefulKiller()
-    with open(args.output, "w") as outfile:
-        cpulog = log_cpu(args.process, killer, args.output,
-                         interval=args.interval)
-        json.dump(cpulog, outfile, indent=4)
+    cpulog = log_cpu(args.process, killer, args.output,
+                     interval=args.interval, method=args.method)
+    if not is_records(args.output):
+        with open(args.output, "w") as outfile:
+            json.dump(cpulog, outfile, indent=4)
+
+
+if __name__ == "__main__":
+    cli()
@@ -5,8 +5,8 @@ Standardise information from different benchmark outputs.
 """
 
 from hpcbench.deps.numericalunits import s, ns, ms, hour, day, J
-from hpcbench.plot.util import bodge_numeric_dict_wrapper
-import copy
+from hpcbench.plot.util import bodge_numeric
+import collections
 import json
 import argparse
 from hpcbench.logger import sacct
@@ -18,7 +18,9 @@ parser = argparse.ArgumentParser(
                 " standard format. Note: this is usually run automatically"
                 " when simulation log files are parsed. You should only run"
                 " this if something is missing from your output file.")
-parser.add_argument("input", type=str, help="hpcbench json file")
+parser.add_argument("input", type=str, nargs="+", help="hpcbench json file. "
+                    "If there's more than one, they're all standardised in "
+                    "one batch, and overwritten.")
 parser.add_argument("-o", "--output", type=str, help="Output json file. If "
                     "none is provided, the input file will be overwritten")
 parser.add_argument("-a", "--accounting", type=str, default="accounting.json",
@@ -122,27 +124,101 @@ standard_original = {
 }
 
 
-def standardise_totals(totals, get_accounting="accounting.json", infile=None):
+def add_accounting_energy(totals, accounting):
     """
-    Rename quantities from a hpcbench output file to have standard names and
-    units.
+    Copy the consumed energy from accounting info into a totals block.
 
     Params:
         totals: the 'Totals' block from a hpcbench output file, a dictionary.
-        accounting: a string, either the location of the 'accounting' file
-        produced by hpcbench sacct, or the job id, to get a new accounting file
-        infile: location of the input file. Useful to try and obtain
-        accounting info if it can't be found in accounting.json.'
+        accounting: accounting info, from hpcbench sacct (or the 'Totals' of
+        hpcbench syslog), a dictionary.
     Returns:
-        The same block, with standardised names and units.
+        Nothing, but sets 'Consumed Energy (J)' in totals if it's available.
     """
-    standard = copy.copy(standard_original)
-    totals = bodge_numeric_dict_wrapper(totals)
+    if "ConsumedEnergyRaw" in accounting:
+        totals["Consumed Energy (J)"] = float(accounting["ConsumedEnergyRaw"])
+    if "Totals" in accounting:
+        powertotals = accounting["Totals"]
+        if "Total Energy (J)" in powertotals:
+            totals["Consumed Energy (J)"] = float(
+                powertotals["Total Energy (J)"])
+        if "Consumed Energy (J)" in powertotals:
+            totals["Consumed Energy (J)"] = float(
+                powertotals["Consumed Energy (J)"])
 
-    # Get accounting info - this is messy because it needs a lot of fallbacks
-    # for different scenarios, e.g. when the accounting data in the json file
-    # doesn't exist or is incomplete
-    if get_accounting:
+
+def compile_crosswalk(units=unitlookup, names=crosswalk,
+                      standard=standard_original):
+    """
+    Work out, once, what happens to each quantity that can be in a totals
+    block: which standard quantity it becomes, and the numbers to multiply
+    and divide it by to get the standard units. The factors are rounded to
+    12 significant figures, so they come out exact (e.g. divide by 1000 for
+    ms to s) rather than carrying rounding errors from numericalunits.
+
+    Params:
+        units: the units of each quantity, like unitlookup.
+        names: renames, like crosswalk.
+        standard: the standard quantities, like standard_original.
+    Returns:
+        A dictionary of (standard name, multiplier, divisor) for each known
+        quantity. The value is None for quantities which are known but aren't
+        used.
+    """
+    compiled = {}
+    for name in list(units) + list(names):
+        standard_name = names.get(name, name)
+        if standard_name not in standard:
+            compiled[name] = None
+            continue
+        unit = units.get(name, units[standard_name])
+        factor = unit / units[standard_name]
+        if factor >= 1:
+            compiled[name] = (standard_name, float("%.12g" % factor), 1)
+        else:
+            compiled[name] = (standard_name, 1, float("%.12g" % (1/factor)))
+    return compiled
+
+
+compiled_crosswalk = compile_crosswalk()
+
+
+def to_number(value):
+    """
+    Convert a value from a totals block to a float. Most are plain numbers,
+    so float() is tried first, and only if that fails is it bodged (e.g. to
+    remove units or commas).
+
+    Params:
+        value: a number, or a string with a number in.
+    Returns:
+        The value, a float.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return float(bodge_numeric(value, False))
+
+
+def load_accounting(totals, get_accounting, infile=None):
+    """
+    Add the consumed energy from the accounting info to a totals block. This
+    is messy because it needs a lot of fallbacks for different scenarios, e.g.
+    when the accounting data in the json file doesn't exist or is incomplete.
+
+    Params:
+        totals: the 'Totals' block, a dictionary. Changed in place.
+        get_accounting: see standardise_totals.
+        infile: see standardise_totals.
+    """
+    if type(get_accounting) is dict:  # accounting info is already loaded
+        accounting = get_accounting
+        if "ConsumedEnergyRaw" in accounting and "JobID" in accounting:
+            if accounting["ConsumedEnergyRaw"] == "0" or accounting[
+                    "ConsumedEnergyRaw"] == 0:
+                accounting.update(sacct.get_sacct(accounting["JobID"]))
+        add_accounting_energy(totals, accounting)
+    elif get_accounting:
         try:
             with open(get_accounting, "r") as file:  # accounting file is given
                 accounting = json.load(file)
@@ -152,16 +228,7 @@ def standardise_totals(totals, get_accounting="accounting.json", infile=None):
                     accounting = sacct.get_sacct(accounting["JobID"])
                     with open(get_accounting, "w") as file:
                         json.dump(accounting, file, indent=4)
-                totals["Consumed Energy (J)"] = float(
-                    accounting["ConsumedEnergyRaw"])
-            if "Totals" in accounting:
-                powertotals = accounting["Totals"]
-                if "Total Energy (J)" in powertotals:
-                    totals["Consumed Energy (J)"] = float(
-                        powertotals["Total Energy (J)"])
-                if "Consumed Energy (J)" in powertotals:
-                    totals["Consumed Energy (J)"] = float(
-                        powertotals["Total Energy (J)"])
+            add_accounting_energy(totals, accounting)
         except FileNotFoundError:
             if "." not in get_accounting:  # job id is provided directly
                 accounting = sacct.get_sacct(get_accounting)
@@ -181,77 +248,165 @@ def standardise_totals(totals, get_accounting="accounting.json", infile=None):
                 totals["Consumed Energy (J)"] = float(
                     accounting["ConsumedEnergyRaw"])
 
-    # Identify names and units of quantities
+
+def convert_totals(totals, compiled=compiled_crosswalk, unknown=None):
+    """
+    Convert a totals block to the standard quantities and units in one pass,
+    with the compiled crosswalk, then work out any standard quantities that
+    are missing from the ones that are there (e.g. reciprocals).
+
+    Params:
+        totals: the 'Totals' block, a dictionary.
+        compiled: the compiled crosswalk, from compile_crosswalk.
+        unknown: a collections.Counter. The names of any quantities which
+        aren't in the crosswalk are counted in it. If None, they're printed.
+    Returns:
+        A dictionary of the standard quantities, as floats (or None if they're
+        missing).
+    """
+    standard = dict.fromkeys(standard_original)
+    missing = []
     for name, value in totals.items():
-        units = unitlookup[name]
-        if name in crosswalk:
-            name = crosswalk[name]
-        if name in standard:
-            standard[name] = value * units
+        try:
+            conversion = compiled[name]
+        except KeyError:
+            missing.append(name)
+            continue
+        if conversion is not None:
+            standard[conversion[0]] = to_number(value) * conversion[1] / \
+                conversion[2]
+    if unknown is not None:
+        unknown.update(missing)
+    elif missing:
+        print("Unknown quantities, not standardised: "+", ".join(missing))
 
-    # If ns/s is missing, convert ns/day to units of ns/s
+    # If ns/s is missing, convert ns/day to ns/s
     if standard["ns/s"] is None and standard["ns/day"] is not None:
-        unitless = standard["ns/day"] / (ns/day)
-        converted = unitless / (day/s)
-        standard["ns/s"] = converted * ns/s
+        standard["ns/s"] = standard["ns/day"] / 86400
 
     if standard["step/s"] is None and standard["Wall Clock Time (s)"]:
         if 'Steps' in totals:
-            standard["step/s"] = totals['Steps'] / \
+            standard["step/s"] = to_number(totals['Steps']) / \
                 standard["Wall Clock Time (s)"]
 
     # If 'consumed energy' is populated, add energy/ns and energy/step
-    def isset(n): return n != 0 and n is not None
-    if not isset(standard["J/ns"]) and standard[
-            "Simulation time (ns)"] is not None and get_accounting:
-        standard["J/ns"] = standard["Consumed Energy (J)"] / \
-            standard["Simulation time (ns)"]
-    if not isset(standard["J/step"]) and standard[
-            "Number of steps"] is not None and get_accounting:
-        standard["J/step"] = standard["Consumed Energy (J)"] / \
-            standard["Number of steps"]
+    energy = standard["Consumed Energy (J)"]
+    if not standard["J/ns"] and energy is not None and standard[
+            "Simulation time (ns)"] is not None:
+        standard["J/ns"] = energy / standard["Simulation time (ns)"]
+    if not standard["J/step"] and energy is not None and standard[
+            "Number of steps"] is not None:
+        standard["J/step"] = energy / standard["Number of steps"]
 
     # Set missing values of reciprocals
     for name, value in standard.items():
-        if value is None:
-            if "/" in name:
-                backwards = "/".join(list(reversed(name.split("/"))))
-                if backwards in standard and standard[backwards] is not None:
-                    standard[name] = 1/standard[backwards]
-
-    # Give quantities back in real units
-    for key, value in standard.items():
-        try:
-            standard[key] = (value / unitlookup[key])
-        except TypeError as e:
-            print("No unit for "+str(key))
-            raise e
+        if value is None and "/" in name:
+            backwards = "/".join(reversed(name.split("/")))
+            if standard.get(backwards) is not None:
+                standard[name] = 1/standard[backwards]
+    return standard
 
-    for key, value in standard.items():
-        standard[key] = str(standard[key])
 
-    return standard
+def standardise_totals(totals, get_accounting="accounting.json", infile=None,
+                       unknown=None):
+    """
+    Rename quantities from a hpcbench output file to have standard names and
+    units. Quantities that aren't in the crosswalk are left out, and
+    reported.
+
+    Params:
+        totals: the 'Totals' block from a hpcbench output file, a dictionary.
+        accounting: a string, either the location of the 'accounting' file
+        produced by hpcbench sacct, or the job id, to get a new accounting file.
+        Can also be the accounting info itself, as a dictionary.
+        infile: location of the input file. Useful to try and obtain
+        accounting info if it can't be found in accounting.json.'
+        unknown: a collections.Counter to count the names of unknown
+        quantities in, instead of printing them.
+    Returns:
+        The same block, with standardised names and units.
+    """
+    totals = dict(totals)
+    if get_accounting:
+        load_accounting(totals, get_accounting, infile)
+    standard = convert_totals(totals, unknown=unknown)
+    return {name: str(value) for name, value in standard.items()}
+
+
+def standardise_batch(blocks, get_accounting=None, infiles=None):
+    """
+    Standardise many totals blocks at once (e.g. when an archive of results
+    is standardised again), with the same compiled crosswalk. Unknown
+    quantities are reported once at the end, rather than for every block.
+
+    Params:
+        blocks: a list of 'Totals' blocks.
+        get_accounting: the accounting info for all the blocks (see
+        standardise_totals), or a list with the accounting info for each.
+        infiles: a list of the input file of each block, or None.
+    Returns:
+        A list of the standardised blocks.
+    """
+    unknown = collections.Counter()
+    standardised = []
+    for i, totals in enumerate(blocks):
+        accounting = get_accounting[i] if type(get_accounting) is list \
+            else get_accounting
+        infile = infiles[i] if infiles else None
+        standardised.append(standardise_totals(totals, accounting, infile,
+                                               unknown))
+    if unknown:
+        print("Unknown quantities, not standardised: "+", ".join(
+            name+" ("+str(count)+" blocks)" for name, count in
+            unknown.most_common()))
+    return standardised
+
+
+def get_totals(benchout, location):
+    """
+    Find the totals block in a hpcbench output file.
+
+    Params:
+        benchout: the contents of the file, a dictionary.
+        location: where the totals are, e.g. 'run' or 'loc1:loc2'. If it
+        isn't in the file, the whole file is used.
+    Returns:
+        The location as a list of keys (empty for the whole file).
+    """
+    locs = location.split(":")
+    if ":" in location or location in benchout:
+        return locs
+    return []
+
+
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
+    if args.output and len(args.input) > 1:
+        parser.error("--output can only be used with one input file")
+    outputs = []
+    locations = []
+    for path in args.input:
+        with open(path, "r") as file:
+            outputs.append(json.load(file))
+        locations.append(get_totals(outputs[-1], args.totals))
+    blocks = standardise_batch(
+        [dget(benchout, locs) for benchout, locs in zip(outputs, locations)],
+        args.accounting, args.input)
+    for path, benchout, locs, totals in zip(args.input, outputs, locations,
+                                            blocks):
+        if locs:
+            dset(benchout, locs, totals)
+        else:
+            benchout = totals
+        with open(args.output or path, "w") as outfile:
+            json.dump(benchout, outfile, indent=4)
 
 
 if __name__ == "__main__":
-    args = parser.parse_args()
-    with open(args.input, "r") as file:
-        benchout = json.load(file)
-    if ":" in args.totals:
-        locs = args.totals.split(":")
-        totals = dget(benchout, locs)
-        totals = standardise_totals(totals, get_accounting=args.accounting,
-                                    infile=args.input)
-        dset(benchout, locs, totals)
-    elif args.totals in benchout:
-        totals = benchout[args.totals]
-        totals = standardise_totals(totals, get_accounting=args.accounting,
-                                    infile=args.input)
-        benchout[args.totals] = totals
-    else:
-        benchout = standardise_totals(benchout, get_accounting=args.accounting,
-                                      infile=args.input)
-    if not args.output:
-        args.output = args.input
-    with open(args.output, "w") as outfile:
-        json.dump(benchout, outfile, indent=4)
+    cli()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+A common container for the energy time series from the GROMACS, AMBER and
+NAMD energy parsers, so they all give the same NumPy layout and output.
+"""
+
+import os
+import numpy as np
+
+# How many rows EnergySeries.add collects before converting them to NumPy.
+CHUNK_ROWS = 10000
+
+# How much of a log file read_chunks reads at a time, in characters.
+CHUNK_SIZE = 1 << 24
+
+
+def read_chunks(filename, size=CHUNK_SIZE):
+    """
+    Read a text file a chunk at a time. Each chunk ends at the end of a line,
+    so lines are never split between chunks.
+
+    Args:
+        filename: path to the file, a string.
+        size: roughly how many characters to read at a time.
+
+    Yields:
+        each chunk, a string.
+    """
+    with open(filename, "r", errors="replace") as file:
+        while True:
+            chunk = file.read(size)
+            if not chunk:
+                return
+            yield chunk + file.readline()
+
+
+def parse_floats(text, columns):
+    """
+    Parse whitespace-separated numbers into a 2-D NumPy array in one go.
+
+    Args:
+        text: the numbers, a string.
+        columns: the number of columns.
+
+    Returns:
+        a 2-D NumPy array, or None if the text isn't all numbers or doesn't
+        fill the columns exactly.
+    """
+    try:
+        values = np.array(text.split(), dtype=float)
+    except ValueError:
+        return None
+    if columns == 0 or len(values) % columns:
+        return None
+    return values.reshape(-1, columns)
+
+
+def to_floats(rows):
+    """
+    Convert rows of strings to a 2-D NumPy array of floats, in one go if
+    possible. Values which aren't numbers (e.g. AMBER prints ******** when a
+    value doesn't fit) become NaN.
+
+    Args:
+        rows: a list of lists of strings (or numbers), all the same length.
+
+    Returns:
+        a 2-D NumPy array.
+    """
+    try:
+        return np.array(rows, dtype=float)
+    except ValueError:
+        pass
+    array = np.empty((len(rows), len(rows[0])))
+    for i, row in enumerate(rows):
+        for j, value in enumerate(row):
+            try:
+                array[i, j] = float(value)
+            except ValueError:
+                array[i, j] = np.nan
+    return array
+
+
+class EnergySeries:
+    """
+    A time series of energy terms, with a column for each term and a row
+    for each frame. Rows are collected a chunk at a time and converted to
+    NumPy arrays, so a long run doesn't need a python object for every value.
+    Frames can be downsampled as they're added, with 'stride'.
+    """
+
+    def __init__(self, names, stride=1, chunk_rows=CHUNK_ROWS):
+        """
+        Args:
+            names: the name of each column, normally starting with 'Time' (in
+            ps).
+            stride: only keep every nth row passed to add (or keep).
+            chunk_rows: how many rows add collects before converting them.
+        """
+        self.names = list(names)
+        self.stride = stride
+        self.chunk_rows = chunk_rows
+        self.chunks = []
+        self.rows = []
+        self.seen = 0
+
+    def keep(self, count):
+        """
+        Work out which of the next rows to keep, for the stride.
+
+        Args:
+            count: the number of rows.
+
+        Returns:
+            a slice which picks the rows to keep out of the next count rows.
+        """
+        start = -self.seen % self.stride
+        self.seen += count
+        return slice(start, None, self.stride)
+
+    def add(self, row):
+        """
+        Add a row, unless it's skipped by the stride.
+
+        Args:
+            row: a value (or a string) for each column.
+        """
+        if self.seen % self.stride == 0:
+            self.rows.append(row)
+            if len(self.rows) >= self.chunk_rows:
+                self.flush()
+        self.seen += 1
+
+    def append(self, array):
+        """
+        Add a 2-D NumPy array of rows, which have already been downsampled
+        (e.g. with keep, so they can be skipped before they're parsed).
+
+        Args:
+            array: the rows, with a column for each name.
+        """
+        self.flush()
+        self.chunks.append(np.asarray(array, dtype=float))
+
+    def flush(self):
+        """
+        Convert the rows collected by add to a NumPy chunk.
+        """
+        if self.rows:
+            self.chunks.append(to_floats(self.rows))
+            self.rows = []
+
+    def array(self):
+        """
+        Get the whole series.
+
+        Returns:
+            a 2-D NumPy array, with a row for each frame.
+        """
+        self.flush()
+        if len(self.chunks) != 1:
+            self.chunks = [np.concatenate(
+                [np.empty((0, len(self.names)))] + self.chunks)]
+        return self.chunks[0]
+
+    def to_dict(self):
+        """
+        Get the series as a dictionary of NumPy arrays, one for each term.
+        """
+        array = self.array()
+        return {name: array[:, i] for i, name in enumerate(self.names)}
+
+    def output(self, npz=None, directory="."):
+        """
+        Get the series in the form the energy parsers return.
+
+        Args:
+            npz: if this is set, save the energies to this .npz file with
+            save_energies.
+            directory: the folder the output will be saved to. The location
+            of the .npz file is stored relative to this.
+
+        Returns:
+            a dictionary with a list of values for each energy term, or if
+            npz is set, the location of the .npz file ('File') and a 'Summary'
+            of each term from summarise_energies.
+        """
+        energies = self.to_dict()
+        if npz:
+            save_energies(energies, npz)
+            return {"File": os.path.relpath(npz, directory),
+                    "Summary": summarise_energies(energies)}
+        return {name: values.tolist() for name, values in energies.items()}
+
+
+def summarise_energies(energies):
+    """
+    Get the mean, standard deviation and drift (the slope of a straight line
+    fit against time) of each energy term. If there's no 'Time' (or it
+    doesn't change), the drift is None.
+
+    Args:
+        energies: a dictionary of NumPy arrays, normally including 'Time'.
+    Returns:
+        a dictionary with a dictionary of statistics for each energy term.
+    """
+    names = [name for name in energies if name != "Time"]
+    values = np.column_stack([energies[name] for name in names]) \
+        if names else np.empty((0, 0))
+    if "Time" not in energies or (len(values) > 1 and
+                                  np.ptp(energies["Time"]) == 0):
+        drifts = [None] * len(names)
+    elif len(values) > 1:
+        drifts = np.polyfit(energies["Time"], values, 1)[0].tolist()
+    else:
+        drifts = [0.0] * len(names)
+    summary = {}
+    for i, name in enumerate(names):
+        summary[name] = {
+            "Mean": float(values[:, i].mean()) if len(values) else None,
+            "Std": float(values[:, i].std()) if len(values) else None,
+            "Drift (/ps)": drifts[i]}
+    return summary
+
+
+def save_energies(energies, npz):
+    """
+    Save energy terms to a compressed .npz file, one array for each term.
+
+    Args:
+        energies: a dictionary of NumPy arrays.
+        npz: path of the .npz file.
+    """
+    with open(npz, "wb") as file:
+        np.savez_compressed(file, **energies)
+
+
+def load_energies(npz, terms=None, directory="."):
+    """
+    Load energy terms saved by save_energies. Only the terms that are asked
+    for are read from the file.
+
+    Args:
+        npz: path of the .npz file, e.g. 'File' from the summary written by
+        one of the energy parsers.
+        terms: a list of the names of the terms to load. By default, all of
+        them.
+        directory: if npz is a relative path, it's relative to this (e.g. the
+        folder of the json file that refers to it).
+    Returns:
+        a dictionary of NumPy arrays.
+    """
+    with np.load(os.path.join(directory, npz)) as data:
+        return {term: data[term] for term in (terms or data.files)}
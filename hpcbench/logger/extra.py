@@ -16,12 +16,34 @@ parser.add_argument("-e", "--extra", action="append", type=str,
                     "Use the format --extra \"key:value\"")
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def parse_extra(extra):
+    """
+    Convert a list of key:value strings into a dictionary.
+
+    Args:
+        extra: a list of strings formatted as key:value
+    Returns:
+        a dictionary of those keys and values
+    """
     output = {}
-    if len(args.extra) > 0:
-        for arg in args.extra:
-            argparsed = arg.split(":")
-            output[argparsed[0]] = argparsed[1]
+    for arg in extra:
+        argparsed = arg.split(":")
+        output[argparsed[0]] = argparsed[1]
+    return output
+
+
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
+    output = parse_extra(args.extra)
     with open(args.output, "w") as outfile:
         json.dump(output, outfile, indent=4)
+
+
+if __name__ == "__main__":
+    cli()
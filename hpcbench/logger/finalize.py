@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parse everything at the end of a benchmark job and write a single output file.
+This does the same as running hpcbench sacct, <program>log, slurmlog, extra,
+<program>energy and collate one after another, but in one process and without
+writing the intermediate json files.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import hpcbench
+from hpcbench.logger.slurm import parse_submission_script
+from hpcbench.logger.extra import parse_extra
+from hpcbench.logger.util import load_log, log_name, to_json
+
+# For each program detected by parse_submission_script: the default log file,
+# the module and function used to parse it, and (optionally) the same for the
+# energies. Modules are only imported if they're needed.
+programs = {
+    "GROMACS": {"log": "md.log",
+                "parser": ("hpcbench.logger.gmxlog", "parse_gmx_log"),
+                "energy": "ener.edr",
+                "energy_parser": ("hpcbench.logger.gmxenergy",
+                                  "parse_gmx_energies")},
+    "AMBER": {"log": "benchmark.mdout",
+              "parser": ("hpcbench.logger.amberlog", "parse_amber_log"),
+              "energy": "benchmark.mdout",
+              "energy_parser": ("hpcbench.logger.amberenergy",
+                                "parse_amber_energies_log")},
+    "namd2": {"log": "benchmark.log",
+              "parser": ("hpcbench.logger.namdlog", "parse_namd_log"),
+              "energy": "benchmark.log",
+              "energy_parser": ("hpcbench.logger.namdthermo",
+                                "parse_namd_energies_log")},
+    "namd3": {"log": "namdlog.txt",
+              "parser": ("hpcbench.logger.namdlog", "parse_namd_log"),
+              "energy": "namdlog.txt",
+              "energy_parser": ("hpcbench.logger.namdthermo",
+                                "parse_namd_energies_log")},
+    "LAMMPS": {"log": "log.lammps",
+               "parser": ("hpcbench.logger.lmplog", "parse_lammps_log")},
+    "OpenMM": {"log": "run.json",
+               "parser": ("hpcbench.logger.ommlog", "parse_omm_log")},
+}
+
+parser = argparse.ArgumentParser(
+    description="Parse the submission script, accounting info, simulation "
+    "log and energies at the end of a job, and write them to one hpcbench "
+    "output file.")
+parser.add_argument("script", type=str, help="Path to submission script")
+parser.add_argument("output", type=str, help="Output json file")
+parser.add_argument("-j", "--jobid", type=str,
+                    default=os.environ.get("SLURM_JOB_ID"),
+                    help="Slurm job ID to get accounting info for. Defaults "
+                    "to $SLURM_JOB_ID.")
+parser.add_argument("-a", "--accounting", type=str,
+                    help="Use power/accounting data from this file (e.g. from "
+                    "hpcbench syslog) instead of sacct.")
+parser.add_argument("-p", "--program", type=str, choices=list(programs),
+                    help="Simulation program. By default, this is detected "
+                    "from the submission script.")
+parser.add_argument("-l", "--log", type=str,
+                    help="Path to the simulation log file. By default, the "
+                    "file name used by the hpcbench job templates.")
+parser.add_argument("-n", "--energy", type=str,
+                    help="Path to the file to get energies from. By default, "
+                    "the file name used by the hpcbench job templates.")
+parser.add_argument("--noenergy", action="store_true",
+                    help="Don't extract energies.")
+parser.add_argument("-z", "--npz", type=str, nargs="?", const="",
+                    help="Save the energies to a compressed .npz file, and "
+                    "only put a summary of them in the output file. By "
+                    "default, the .npz file has the same name as the output "
+                    "file.")
+parser.add_argument("-e", "--extra", action="append", type=str, default=[],
+                    help="Add extra info to the output file. "
+                    "Use the format --extra \"key:value\"")
+parser.add_argument("-i", "--include", nargs="+", default=[],
+                    help="Other json (or .jsonl) files to include in the "
+                    "output, e.g. from hpcbench infolog, gpulog or cpulog.")
+parser.add_argument("-k", "--keep", action='store_false',
+                    help="Keep original totals formatting")
+parser.add_argument("-s", "--save", action="store_true",
+                    help="Save included json files (normally deleted)")
+
+
+def get_function(location):
+    """
+    Import a function from a module.
+
+    Args:
+        location: a tuple of the module name and function name.
+    Returns:
+        the function.
+    """
+    module, function = location
+    return getattr(importlib.import_module(module), function)
+
+
+def finalize(script, jobid=None, accounting=None, program=None, log=None,
+             energy=None, get_energy=True, extra=[], include=[],
+             standardise=True, save=False, npz=None, directory="."):
+    """
+    Collect everything hpcbench logs at the end of a benchmark job.
+
+    Args:
+        script: path to the job submission script, a string.
+        jobid: slurm job ID, used to get accounting info from sacct.
+        accounting: path to a file with power/accounting info (e.g. from
+        hpcbench syslog). If this is set, sacct isn't used.
+        program: the simulation program, a key in 'programs'. If None, this is
+        detected from the submission script.
+        log: path to the simulation log file. If None, use the default for
+        the program.
+        energy: path to the file with the energies in. If None, use the
+        default for the program.
+        get_energy: whether to extract the energies, a boolean.
+        extra: a list of key:value strings, written to 'meta'.
+        include: a list of paths to other hpcbench json files to include.
+        standardise: whether to standardise the totals using crosswalk.
+        save: if False, the files in 'include' are deleted afterwards.
+        npz: if this is set, save the energies to this .npz file, and only
+        keep a summary of them in the output.
+        directory: the folder the output will be saved to. The location of
+        the .npz file is stored relative to this.
+
+    Returns:
+        The hpcbench output, a dictionary, in the same format as hpcbench
+        collate.
+    """
+    output = {}
+    output["slurm"] = parse_submission_script(script)
+    if program is None:
+        program = output["slurm"]["program"]
+    if program not in programs:
+        raise ValueError("Can't finalize a run of "+str(program))
+    info = programs[program]
+
+    if accounting is None and jobid:
+        from hpcbench.logger.sacct import get_sacct
+        accounting = get_sacct(jobid)
+        output["accounting"] = accounting
+
+    run_parser = get_function(info["parser"])
+    output["run"] = run_parser(log or info["log"], standardise, accounting)
+
+    if get_energy and "energy_parser" in info:
+        energy_parser = get_function(info["energy_parser"])
+        output["thermo"] = energy_parser(energy or info["energy"], npz,
+                                         directory)
+
+    output["meta"] = parse_extra(extra)
+
+    for jsonfile in include:
+        output[log_name(jsonfile)] = load_log(jsonfile)
+
+    output["version"] = hpcbench.__version__
+    if not save:
+        for jsonfile in include:
+            os.remove(jsonfile)
+    return output
+
+
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
+    npz = args.npz
+    if npz == "":
+        npz = os.path.splitext(args.output)[0]+".npz"
+    output = finalize(args.script, args.jobid, args.accounting, args.program,
+                      args.log, args.energy, not args.noenergy, args.extra,
+                      args.include, args.keep, args.save, npz,
+                      os.path.dirname(os.path.abspath(args.output)))
+    with open(args.output, "w") as outfile:
+        json.dump(output, outfile, indent=4, default=to_json)
+
+
+if __name__ == "__main__":
+    cli()
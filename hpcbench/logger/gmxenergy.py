@@ -8,16 +8,140 @@ Created on Fri Apr 26 10:53:21 2024
 
 import json
 import argparse
+import os
 import hpcbench.deps.pyedr
+# load_energies is imported here as well because it used to live here
+from hpcbench.logger.energy import EnergySeries, load_energies
+from hpcbench.logger.util import (GracefulKiller, RecordWriter, is_records,
+                                  fold_record, positive_count,
+                                  positive_interval)
 
 parser = argparse.ArgumentParser("Dump gromacs edr/xdr to json.")
 parser.add_argument("edr", type=str, help="edr input file")
-parser.add_argument("json", type=str, help="json output file.")
+parser.add_argument("json", type=str, help="json output file. With --follow, "
+                    "if the name ends in .jsonl, the new frames are appended "
+                    "to the file instead of rewriting the whole file.")
+parser.add_argument("-z", "--npz", type=str, nargs="?", const="",
+                    help="Save the energies to a compressed .npz file instead,"
+                    " and only write a summary (mean, std and drift of each "
+                    "term) and the location of the .npz file to the json "
+                    "file. By default, the .npz file has the same name as "
+                    "the json file.")
+parser.add_argument("-t", "--terms", type=str, nargs="+",
+                    help="Only extract these energy terms, e.g. -t Potential "
+                    "Temperature Pressure \"Conserved En.\". By default, all "
+                    "of them.")
+parser.add_argument("-s", "--stride", type=positive_count, default=1,
+                    help="Only extract every nth frame.")
+parser.add_argument("-e", "--every", type=positive_interval,
+                    help="Only extract one frame every x ps.")
+parser.add_argument("-f", "--follow", action="store_true",
+                    help="Keep watching the edr file while the simulation is "
+                    "running, and add the new frames to the output, until "
+                    "killed.")
+parser.add_argument("-i", "--interval", type=positive_interval,
+                    default=5,
+                    help="With --follow, how often to check for new frames. "
+                    "Defaults to 5.")
+parser.add_argument("-p", "--pid", type=str, help="Write PID to a file")
 
-if __name__ == "__main__":
-    args = parser.parse_args()
-    edr = hpcbench.deps.pyedr.edr_to_dict(args.edr)
-    for key, value in edr.items():
-        edr[key] = value.tolist()
+
+def parse_gmx_energies(edr, npz=None, directory=".", terms=None, stride=1,
+                       every=None):
+    """
+    Get the energy terms from a gromacs edr file as a dictionary of lists.
+
+    Args:
+        edr: path to the edr file, normally ener.edr
+        npz: if this is set, save the energies to this .npz file instead.
+        directory: the folder the output will be saved to. The location of
+        the .npz file is stored relative to this.
+        terms: a list of the energy terms to extract. By default, all of
+        them. Other terms aren't read from the file at all.
+        stride: only extract every nth frame.
+        every: only extract one frame every x ps.
+    Returns:
+        a dictionary with a list of values for each energy term, or if npz is
+        set, the location of the .npz file ('File') and a 'Summary' of each
+        term (see EnergySeries.output).
+    """
+    energies, names = hpcbench.deps.pyedr.read_edr_array(edr, terms, stride,
+                                                         every)
+    series = EnergySeries(names)
+    series.append(energies)
+    return series.output(npz, directory)
+
+
+def follow_gmx_energies(edr, output, killer, interval=5, terms=None,
+                        stride=1, every=None):
+    """
+    Log the energy terms from a gromacs edr file while the simulation is
+    running. Only the frames written since the last check are read from the
+    file (see hpcbench.deps.pyedr.follow_edr), so it's cheap even when the
+    file is huge.
+
+    Args:
+        edr: path to the edr file, which doesn't need to exist yet.
+        output: output file. If it ends in .jsonl, the new frames are
+        appended to it with RecordWriter.
+        killer: instance of the GracefulKiller object which handles SIGINT
+        interval: check for new frames every x seconds.
+        terms: a list of the energy terms to extract. By default, all of
+        them.
+        stride: only extract every nth frame.
+        every: only extract one frame every x ps.
+    Returns:
+        a dictionary with a list of values for each energy term.
+    """
+    energies = {}
+    writer = RecordWriter(output) if is_records(output) else None
+    for frames, names in hpcbench.deps.pyedr.follow_edr(
+            edr, terms, interval, stride, every):
+        if len(frames):
+            sample = {}
+            for i, name in enumerate(names):
+                sample[name] = frames[:, i].tolist()
+            fold_record(energies, sample)
+            if writer:
+                writer.write(sample)
+            else:
+                with open(output, "w") as outfile:
+                    json.dump(energies, outfile, indent=4)
+        # the last check happens after the kill signal, so no frames are lost
+        if killer.kill_now:
+            break
+    if writer:
+        writer.close()
+    return energies
+
+
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
+    if args.pid:
+        with open(args.pid, "w") as file:
+            file.write(str(os.getpid()))
+    if args.follow:
+        if args.npz is not None:
+            parser.error("--npz can't be used with --follow")
+        killer = GracefulKiller()
+        follow_gmx_energies(args.edr, args.json, killer, args.interval,
+                            args.terms, args.stride, args.every)
+        return
+    npz = args.npz
+    if npz == "":
+        npz = os.path.splitext(args.json)[0]+".npz"
+    edr = parse_gmx_energies(args.edr, npz,
+                             os.path.dirname(os.path.abspath(args.json)),
+                             args.terms, args.stride, args.every)
     with open(args.json, "w") as outfile:
         json.dump(edr, outfile, indent=4)
+
+
+if __name__ == "__main__":
+    cli()
@@ -6,6 +6,8 @@ Parses a GROMACS log file to extract performance and system info.
 
 import argparse
 import json
+import mmap
+import os
 from hpcbench.logger.crosswalk import standardise_totals
 
 parser = argparse.ArgumentParser(
@@ -20,10 +22,214 @@ parser.add_argument("-a", "--accounting", type=str, default="accounting.json",
                     "hpcbench syslog.")
 
 
+def read_lines(data, pos):
+    """
+    Read lines from a log file, starting at some position.
+
+    Args:
+        data: the contents of the log file, bytes or an mmap.
+        pos: the position to start from, an int. This should be somewhere in
+        the first line.
+
+    Yields:
+        Tuples of the line (a string, stripped of whitespace) and the
+        position of the start of the next line.
+    """
+    start = data.rfind(b"\n", 0, pos) + 1
+    while start < len(data):
+        end = data.find(b"\n", start)
+        if end == -1:
+            end = len(data)
+        yield data[start:end].decode(errors="replace").strip(), end + 1
+        start = end + 1
+
+
+def split_row(line, cols):
+    """
+    Split a row of a table from the log file. If there are more words than
+    columns, the extra words at the start are part of the label.
+
+    Args:
+        line: a line of the table, a string.
+        cols: the column names, a list.
+
+    Returns:
+        The label of the row, and a dictionary of the values in each column.
+    """
+    rows = line.split()
+    if len(rows) > len(cols):
+        diff = len(rows) - len(cols)
+        rows[0:diff] = [' '.join(rows[0:diff])]
+    label = rows.pop(0)
+    return label, {cols[i]: rows[i] for i in range(len(rows))}
+
+
+def parse_info(lines, line, output):
+    """
+    Parse the block of GROMACS version and build info.
+    """
+    pos = None
+    while line != "":
+        linesplit = ''.join(line.split()).split(":")
+        output["Gromacs info"][linesplit[0]] = linesplit[1]
+        line, pos = next(lines, ("", None))
+    return pos
+
+
+def parse_infile(lines, line, output):
+    """
+    Parse the input parameters (from the .mdp file).
+    """
+    pos = None
+    for line, pos in lines:
+        if "------" in line:
+            continue
+        if "=" not in line:
+            break
+        parsed = ''.join(line.split()).split("=")
+        output["Infile"][parsed[0]] = parsed[1]
+    if "dt" in output["Infile"]:
+        output["Totals"]["Timestep (ns)"] = str(
+            float(output["Infile"]["dt"]) * 0.001)
+    if "nsteps" in output["Infile"]:
+        output["Totals"]["Number of steps"] = output["Infile"]["nsteps"]
+    return pos
+
+
+def parse_atoms(lines, line, output):
+    """
+    Parse the number of atoms.
+    """
+    output["Totals"]["Atoms"] = line.split(" ")[2]
+
+
+def parse_nsteps(lines, line, output):
+    """
+    Parse the number of steps, if it was set with gmx mdrun -nsteps.
+    """
+    steps = line.split(":")[-1].split()
+    if steps:
+        output["Totals"]["Number of steps"] = steps[0]
+
+
+def parse_megaflops(lines, line, output):
+    """
+    Parse the table of flops for each type of calculation.
+    """
+    if "Computing:" not in line:
+        return None
+    cols = line.split()
+    cols.remove("%")
+    cols.remove("Computing:")
+    cols[cols.index("Flops")] = "% Flops"
+    pos = None
+    for line, pos in lines:
+        if "------" in line:
+            continue
+        if line == "":
+            break
+        if "Total" in line:
+            output["Totals"]["Mflops"] = line.split()[1]
+            continue
+        if "Rest" in line:
+            line = line.replace("Rest", "Rest 0 0 0")  # lame hack
+        label, row = split_row(line, cols)
+        output["Megaflops"][label] = row
+    return pos
+
+
+def parse_cycles(lines, line, output):
+    """
+    Parse the table of the time taken by each part of the calculation.
+    """
+    if "Computing:" not in line and "Activity:" not in line:
+        return None
+    cols = None
+    pos = None
+    for line, pos in lines:
+        if "------" in line:
+            continue
+        if cols is None:
+            if "(s)" in line:
+                cols = line.split()
+                cols.remove("sum")
+                cols[cols.index("Count")] = "Calls"
+                cols[cols.index("(s)")] = "Wall time (s)"
+                cols[cols.index("total")] = "Giga-cycles (total)"
+                cols[cols.index("%")] = "% Runtime"
+            continue
+        if line == "":
+            break
+        if "Total" in line:
+            totline = line.split()
+            output["Totals"]["Wall time (s)"] = totline[1]
+            output["Totals"]["Giga-Cycles"] = totline[2]
+            break
+        label, row = split_row(line, cols)
+        output["Cycles"][label] = row
+    return pos
+
+
+def parse_performance(lines, line, output):
+    """
+    Parse the performance in ns/day and hour/ns.
+    """
+    perfline = line.split()
+    output["Totals"]["ns/day"] = perfline[1]
+    output["Totals"]["hour/ns"] = perfline[2]
+
+
+# Text that starts each section of the log file we're interested in, and the
+# function used to parse that section. Everything else (e.g. the energies,
+# which make up most of a long log file) is skipped by searching for the next
+# of these with bytes.find, without being split into lines. The functions
+# take an iterator over the lines (from read_lines), the first line of the
+# section, and the output dictionary, and return the position of the end of
+# the section (or None if it's just one line).
+section_parsers = {
+    b"GROMACS version:": parse_info,
+    b"Input Parameters": parse_infile,
+    b"There are:": parse_atoms,
+    b"Overriding nsteps": parse_nsteps,
+    b"M-Number": parse_megaflops,
+    b"Giga-Cycles": parse_cycles,
+    b"Performance:": parse_performance,
+}
+
+# The sections above are all either in the header (before the run starts) or
+# the footer (after the averages). The energies in between are the only thing
+# in a long log that grows with the number of steps, so only the header and
+# footer are searched, if they can be found. A killed run has no footer, so
+# then the whole file is searched.
+HEADER_END = b"Started mdrun"
+FOOTER_START = b"A V E R A G E S"
+
+
+def find_regions(data):
+    """
+    Find the parts of a log file that the sections can be in.
+
+    Args:
+        data: the contents of the log file, bytes or an mmap.
+
+    Returns:
+        A list of (start, end) positions.
+    """
+    header_end = data.find(HEADER_END)
+    if header_end == -1:
+        return [(0, len(data))]
+    footer_start = data.rfind(FOOTER_START, header_end)
+    if footer_start == -1:
+        return [(0, len(data))]
+    return [(0, header_end), (footer_start, len(data))]
+
+
 def parse_gmx_log(log, standardise=True, accounting="accounting.json"):
     """Parse a gmx log file into a python dictionary.
-    This function is a horrid mess, because gromacs log files are a horrid
-    mess.
+    The file is memory-mapped and searched for the start of each section that
+    we're interested in (the keys of section_parsers), which is then parsed
+    by the function for that section. Everything in between is skipped, and
+    only the header and footer are searched (see find_regions).
 
     Args:
         path: path to the log file. Normally called 'md.log'.
@@ -31,110 +237,36 @@ def parse_gmx_log(log, standardise=True, accounting="accounting.json"):
     Returns:
         The contents of the log file in dictionary format.
     """
-    parse_gmx_info = False
-    parse_megaflops = False
-    parse_cycle_time = False
-    parse_infile = False
     output = {"Gromacs info": {}, "Megaflops": {},
               "Cycles": {}, "Infile": {}, "Totals": {}}
-    with open(log) as file:
-        for line in file:
-            line = line.replace("\n", "").strip()
-            if "------" in line:
-                continue
-            if "There are:" in line:
-                output["Totals"]["Atoms"] = line.strip().split(" ")[2]
-            if "dt" in line and "=" in line:
-                output["Totals"]["Timestep (ns)"] = str(float(''.join(
-                    line.strip().split()).split("=")[1]) * 0.001)
-            if "nsteps" in line:
-                output["Totals"]["Number of steps"] = ''.join(
-                    line.strip().split()).split("=")[1]
-                if "Timestep (ns)" in output["Totals"]:
-                    output["Totals"]
-            if "Number of steps" in output["Totals"] and \
+    with open(log, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            data = b""
+        else:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        for start, stop in find_regions(data):
+            pos = start
+            found = {key: data.find(key, pos, stop) for key in section_parsers}
+            while True:
+                for key in found:
+                    if -1 < found[key] < pos:
+                        found[key] = data.find(key, pos, stop)
+                starts = [key for key in found if found[key] != -1]
+                if not starts:
+                    break
+                key = min(starts, key=found.get)
+                lines = read_lines(data, found[key])
+                line, pos = next(lines)
+                end = section_parsers[key](lines, line, output)
+                if end is not None:
+                    pos = end
+        if type(data) is mmap.mmap:
+            data.close()
+    if "Number of steps" in output["Totals"] and \
             "Timestep (ns)" in output["Totals"]:
-                output["Totals"]["Simulation time (ns)"] = str(float(
-                    output["Totals"]["Timestep (ns)"]) * \
-                    int(output["Totals"]["Number of steps"]))
-            # Parse GMX info
-            if "GROMACS version:" in line and not parse_gmx_info:
-                parse_gmx_info = True
-            if parse_gmx_info:
-                if line == "":
-                    parse_gmx_info = False
-                    continue
-                linesplit = ''.join(line.strip().split()).split(":")
-                output["Gromacs info"][linesplit[0]] = linesplit[1]
-            # Parse gromacs input file
-            if "Input Parameters" in line:
-                parse_infile = True
-                continue
-            if parse_infile:
-                if "=" in line:
-                    parsed = ''.join(line.strip().split()).split("=")
-                    output["Infile"][parsed[0]] = parsed[1]
-                else:
-                    parse_infile = False
-            # Parse megaflops info
-            if "Computing:" in line and "M-Number" in line:
-                parse_megaflops = True
-            if parse_megaflops:
-                if "Rest" in line:
-                    line = line.replace("Rest", "Rest 0 0 0")  # lame hack
-                if line == "":
-                    parse_megaflops = False
-                    continue
-                if "Computing:" in line:
-                    cols = ' '.join(line.strip().split()).split(" ")
-                    cols.remove("%")
-                    cols.remove("Computing:")
-                    cols[cols.index("Flops")] = "% Flops"
-                    continue
-                if "Total" in line:
-                    output["Totals"]["Mflops"] = ' '.join(
-                        line.strip().split()).split(" ")[1]
-                    continue
-                rows = ' '.join(line.strip().split()).split(" ")
-                if len(rows) > len(cols):
-                    diff = len(rows) - len(cols)
-                    rows[0:diff] = [' '.join(rows[0:diff])]
-                label = rows.pop(0)
-                output["Megaflops"][label] = {
-                    cols[i]: rows[i] for i in range(len(rows))}
-            # Parse time info
-            if "Computing:" in line and "Giga-Cycles" in line:
-                parse_cycle_time = True
-                continue
-            if "Activity" in line and "Giga-Cycles" in line:
-                parse_cycle_time = True
-                continue
-            if parse_cycle_time:
-                if "(s)" in line:
-                    cols = ' '.join(line.strip().split()).split(" ")
-                    cols.remove("sum")
-                    cols[cols.index("Count")] = "Calls"
-                    cols[cols.index("(s)")] = "Wall time (s)"
-                    cols[cols.index("total")] = "Giga-cycles (total)"
-                    cols[cols.index("%")] = "% Runtime"
-                    continue
-                if "Total" in line:
-                    totline = ' '.join(line.strip().split()).split(" ")
-                    output["Totals"]["Wall time (s)"] = totline[1]
-                    output["Totals"]["Giga-Cycles"] = totline[2]
-                    parse_cycle_time = False
-                    continue
-                rows = ' '.join(line.strip().split()).split(" ")
-                if len(rows) > len(cols):
-                    diff = len(rows) - len(cols)
-                    rows[0:diff] = [' '.join(rows[0:diff])]
-                label = rows.pop(0)
-                output["Cycles"][label] = {
-                    cols[i]: rows[i] for i in range(len(rows))}
-            if "Performance:" in line:
-                perfline = line.strip().split()
-                output["Totals"]["ns/day"] = perfline[1]
-                output["Totals"]["hour/ns"] = perfline[2]
+        output["Totals"]["Simulation time (ns)"] = str(float(
+            output["Totals"]["Timestep (ns)"]) *
+            int(output["Totals"]["Number of steps"]))
     output["Totals"]["step/s"] = int(output["Totals"]["Number of steps"]) / \
         float(output["Totals"]["Wall time (s)"])
     if standardise:
@@ -142,8 +274,18 @@ def parse_gmx_log(log, standardise=True, accounting="accounting.json"):
     return output
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     log = parse_gmx_log(args.log, args.keep, args.accounting)
     with open(args.output, "w") as outfile:
         json.dump(log, outfile, indent=4)
+
+
+if __name__ == "__main__":
+    cli()
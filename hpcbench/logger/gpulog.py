@@ -7,8 +7,9 @@ Logs GPU info (e.g. temperature, load) to a file.
 import argparse
 import json
 import subprocess
-import time
-from hpcbench.logger.util import GracefulKiller, exists, parse_nvidia_smi, parse_rocm_smi
+from hpcbench.logger.util import (GracefulKiller, exists, parse_nvidia_smi,
+                                  parse_rocm_smi, RecordWriter, is_records,
+                                  fold_record, Ticker, positive_interval)
 import sys
 import os
 
@@ -20,15 +21,28 @@ SMI_COMMAND = "nvidia-smi --query-gpu="+SMI_COLS+" --format=csv"
 
 ROCM_COMMAND = "rocm-smi -f -P -t -u --showmemuse -b -c -g -o --json"
 
+# Commands that keep running and print a new sample every interval. The
+# interval is appended to the end (milliseconds for nvidia-smi, seconds for
+# amd-smi, which doesn't have a json mode like rocm-smi).
+SMI_STREAM_COMMAND = SMI_COMMAND+" -lms"
+AMD_STREAM_COMMAND = "amd-smi monitor --csv -w"
+
 parser = argparse.ArgumentParser("Log the output of nvidia-smi to a json file")
-parser.add_argument("output", type=str, help="Output json file")
-parser.add_argument("-i", "--interval", type=int, default=5,
-                    help="How often to log. Defaults to 1.")
+parser.add_argument("output", type=str, help="Output json file. If the name "
+                    "ends in .jsonl, each sample is appended to the file "
+                    "instead of rewriting the whole file every interval.")
+parser.add_argument("-i", "--interval", type=positive_interval,
+                    default=5,
+                    help="How often to log. Defaults to 5.")
 parser.add_argument("-c", "--cols", type=str, default=SMI_COLS,
                     help="Which columns from nvidia-smi to run.")
 parser.add_argument("-p", "--pid", type=str, help="Write PID to a file")
 parser.add_argument("-g", "--gpu", type=str, help="Which gpu to use (can be "
                     " 'amd' or 'nvidia'.", default="nvidia")
+parser.add_argument("-s", "--stream", action="store_true",
+                    help="Start nvidia-smi (or amd-smi) once and read each "
+                    "sample from its output, instead of running it every "
+                    "interval. Much cheaper, so short intervals can be used.")
 
 
 def log_smi(killer, for_time, smi_command=SMI_COMMAND, interval=5, write=None,
@@ -41,43 +55,134 @@ def log_smi(killer, for_time, smi_command=SMI_COMMAND, interval=5, write=None,
         for_time: return after x seconds.
         smi_command: the nvidia-smi or rocm-smi command to use in its entirity
         interval: take measurements every x seconds.
-        write: string, name of file to write
+        write: string, name of file to write. If it ends in .jsonl, samples
+        are appended to it with RecordWriter.
         parser: the function with which to parse the output of the smi command,
         probably either parse_nvidia_smi or parse_rocm_smi
 
     Returns:
         a dictionary with the name and value of each column
     """
-    elapsed_time = 0
     output = {}
-    while elapsed_time < for_time and not killer.kill_now:
+    writer = RecordWriter(write) if write and is_records(write) else None
+    ticker = Ticker(interval, killer, for_time)
+    for elapsed_time in ticker:
         p = subprocess.run(smi_command.split(
             " "), capture_output=True, text=True).stdout.strip()
-        output = parser(p, output)
-        time.sleep(interval)
-        elapsed_time += interval
-        with open(args.output, "w") as outfile:
-            json.dump(output, outfile, indent=4)
+        sample = parser(p, {})
+        fold_record(output, sample)
+        if writer:
+            writer.write(sample)
+        elif write:
+            with open(write, "w") as outfile:
+                json.dump(output, outfile, indent=4)
+    if writer:
+        writer.close()
+    if ticker.missed:
+        print("Missed "+str(ticker.missed)+" samples from smi")
     if killer.kill_now:
-        print("Killed logging of smi early at "+str(elapsed_time)+"s")
+        print("Killed logging of smi early at "+str(ticker.elapsed)+"s")
+    return output
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
-    if not exists("nvidia-smi") and not exists("rocm-smi"):
-        print("nvidia-smi\rocm-smi not detected, exiting...")
+def stream_smi(killer, smi_command=SMI_STREAM_COMMAND, interval=5, write=None,
+               id_name="index"):
+    """
+    Log the output from a single, long-running smi process which prints a
+    csv row for each GPU every interval (e.g. nvidia-smi -lms).
+
+    Args:
+        killer: instance of the GracefulKiller object which handles SIGINT
+        smi_command: the smi command to use, the interval is appended to it
+        interval: take measurements every x seconds.
+        write: string, name of file to write. If it ends in .jsonl, samples
+        are appended to it with RecordWriter.
+        id_name: the name of the csv column containing the GPU number
+
+    Returns:
+        a dictionary with the name and value of each column
+    """
+    if "nvidia-smi" in smi_command:
+        smi_command += " "+str(max(1, int(interval*1000)))
+    else:
+        smi_command += " "+str(max(1, round(interval)))
+    output = {}
+    header = None
+    first_gpu = None
+    writer = RecordWriter(write) if write and is_records(write) else None
+    smi = subprocess.Popen(smi_command.split(" "), stdout=subprocess.PIPE,
+                           text=True, bufsize=1)
+    try:
+        for line in smi.stdout:
+            if killer.kill_now:
+                break
+            line = line.strip()
+            if line == "":
+                continue
+            if header is None or line == header:
+                header = line
+                id_col = list(map(str.strip, header.split(","))).index(
+                    id_name)
+                continue
+            sample = parse_nvidia_smi(header+"\n"+line, {}, id_name)
+            fold_record(output, sample)
+            if writer:
+                writer.write(sample)
+                continue
+            gpu = line.split(",")[id_col].strip()
+            if first_gpu is None:
+                first_gpu = gpu
+            # back to the first GPU, so the previous sample is complete
+            if gpu == first_gpu and write:
+                with open(write, "w") as outfile:
+                    json.dump(output, outfile, indent=4)
+    finally:
+        smi.terminate()
+        smi.wait()
+        if writer:
+            writer.close()
+    if killer.kill_now:
+        print("Killed logging of smi")
+    return output
+
+
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
+    if args.gpu == "nvidia":
+        tool = "nvidia-smi"
+    elif args.gpu == "amd":
+        # the streaming mode uses amd-smi, rocm-smi is run every interval
+        tool = "amd-smi" if args.stream else "rocm-smi"
+    else:
+        print("Please specify either nvidia or amd")
+        sys.exit(1)
+    if not exists(tool):
+        print(tool+" not detected, exiting...")
         sys.exit(1)
     if args.pid:
         with open(args.pid, "w") as file:
             file.write(str(os.getpid()))
     killer = GracefulKiller()
-    if args.gpu == "nvidia":
+    if args.stream and args.gpu == "nvidia":
+        logs = stream_smi(killer, interval=args.interval, write=args.output)
+    elif args.stream and args.gpu == "amd":
+        logs = stream_smi(killer, AMD_STREAM_COMMAND, interval=args.interval,
+                          write=args.output, id_name="gpu")
+    elif args.gpu == "nvidia":
         logs = log_smi(killer, 1e30, interval=args.interval, write=args.output)
-    elif args.gpu == "amd":
+    else:
         logs = log_smi(killer, 1e30, interval=args.interval, write=args.output,
                        parser=parse_rocm_smi, smi_command=ROCM_COMMAND)
-    else:
-        print("Please specify either nvidia or amd")
-        sys.exit(1)
-    with open(args.output, "w") as outfile:
-        json.dump(logs, outfile, indent=4)
+    if not is_records(args.output):
+        with open(args.output, "w") as outfile:
+            json.dump(logs, outfile, indent=4)
+
+
+if __name__ == "__main__":
+    cli()
@@ -6,7 +6,9 @@ Parses a LAMMPS log file to extract performance and system info.
 
 import argparse
 import json
+import numpy as np
 from hpcbench.logger.crosswalk import standardise_totals
+from hpcbench.logger.util import to_json
 
 parser = argparse.ArgumentParser(
     description="Get performance and system info from a LAMMPS log"
@@ -18,100 +20,182 @@ parser.add_argument("-k", "--keep", action='store_false',
 parser.add_argument("-a", "--accounting", type=str, default="accounting.json",
                     help="Path to accounting data from hpcbench sacct or "
                     "hpcbench syslog.")
+parser.add_argument("-r", "--run", type=int, default=-1,
+                    help="Which run in the log file is the production run, "
+                    "used for the totals. Starts from 0, and negative numbers "
+                    "count from the end. Defaults to the last run.")
 
 
-def parse_lammps_log(log, standardise=True, accounting="accounting.json"):
-    """Parse a lammps log file into a python dictionary.
+def parse_breakdown(breakdown):
+    """
+    Convert the lines of an MPI task timing breakdown table to a dictionary.
 
     Args:
-        path: path to the log file. Normally called 'log.lammps'.
+        breakdown: the lines of the table, each split at the | characters.
 
     Returns:
-        The contents of the log file in dictionary format.
+        A dictionary of the values in each column, for each section.
     """
-    output = {}
-    totals = []
-    atoms = []
-    stepss = []
-    times = []
-    breakdowns = []
-    timesteps = []
-    totalsteps = []
+    breakdown_dict = {}
+    for line_no in range(len(breakdown)):
+        line = breakdown[line_no]
+        line = list(map(str.strip, line))
+        if line_no == 0:
+            labels = line[1:]
+        else:
+            name = line.pop(0)
+            breakdown_dict[name] = {
+                labels[i]: line[i] for i in range(len(labels))}
+    return breakdown_dict
+
+
+def thermo_arrays(header, rows):
+    """
+    Convert the thermo output of a run to NumPy arrays.
+
+    Args:
+        header: the names of the thermo columns, a list of strings.
+        rows: the values in each row, a list of lists of floats.
+
+    Returns:
+        A dictionary of NumPy arrays, one for each column. Step is an int
+        array, and everything else is a float array.
+    """
+    values = np.array(rows, dtype=float).reshape(-1, len(header))
+    thermo = {}
+    for i, name in enumerate(header):
+        if name == "Step":
+            thermo[name] = values[:, i].astype(np.int64)
+        else:
+            thermo[name] = values[:, i]
+    return thermo
+
+
+def read_runs(log):
+    """
+    Read a lammps log file one line at a time, and yield the info for each
+    run (or minimize) command as it finishes.
+
+    Args:
+        log: path to the log file. Normally called 'log.lammps'.
+
+    Yields:
+        A dictionary for each run, with the 'Totals', the MPI task timing
+        'Breakdown' and the 'Thermo' output as NumPy arrays.
+    """
+    run = None
+    timestep = None
+    header = None
+    rows = []
+    thermo = {}
     in_bd = False
-    breakdowns = []
     with open(log, "r") as file:
         for line in file:
             line = " ".join(line.split())
-            if "breakdown" in line and in_bd is False:
+            if "ERROR:" in line:
+                raise IOError("Logfile contains error!")
+            if header == []:
+                if line:
+                    header = line.split(" ")
+                continue
+            if header is not None:
+                if line.startswith("Loop time of"):
+                    thermo = thermo_arrays(header, rows)
+                    header = None
+                else:
+                    try:
+                        row = [float(value) for value in line.split(" ")]
+                    except ValueError:  # warnings etc.
+                        continue
+                    if len(row) == len(header):
+                        rows.append(row)
+                    continue
+            if line.startswith("timestep "):
+                timestep = line.split()[1]
+                continue
+            if line.startswith("Per MPI rank memory"):
+                header = []
+                rows = []
+                continue
+            if "Loop time of" in line:
+                if run is not None:
+                    yield run
+                line = line.split(" ")
+                total = {}
+                total["Atoms"] = int(line[line.index("atoms")-1])
+                total["Wall Clock Time (s)"] = float(line[line.index("of")+1])
+                total["Number of steps"] = int(line[line.index("steps")-1])
+                if timestep is not None:
+                    total["Timestep (ns)"] = float(timestep) * 1e-6
+                    total["Simulation time (ns)"] = float(
+                        timestep) * 1e-6 * total["Number of steps"]
+                run = {"Totals": total, "Breakdown": {}, "Thermo": thermo}
+                thermo = {}
+                continue
+            if "Performance:" in line and run is not None:
+                line = line.split(" ")
+                perf = {}
+                perf[line[2]] = float(line[1].replace(",", ""))
+                perf[line[4]] = float(line[3].replace(",", ""))
+                perf[line[6]] = float(line[5].replace(",", ""))
+                perf.update(run["Totals"])
+                run["Totals"] = perf
+                continue
+            if "breakdown" in line and not in_bd:
                 in_bd = True
                 curr_bd = []
                 continue
             if in_bd and "|" in line:
-                split = line.strip('\n').split("|")
-                curr_bd.append(split)
+                curr_bd.append(line.split("|"))
             if in_bd and "|" not in line and "---" not in line:
                 in_bd = False
-                breakdowns.append(curr_bd)
-            if "Performance:" in line:
-                line = line.strip('\n').split(" ")
-                perf = {}
-                perf[line[2]] = float(line[1].replace(",", ""))
-                perf[line[4]] = float(line[3].replace(",", ""))
-                perf[line[6]] = float(line[5].replace(",", ""))
-                totals.append(perf)
-            if "Loop time of" in line:
-                line = line.strip('\n').split(" ")
-                natoms = line[line.index("atoms")-1]
-                atoms.append(natoms)
-                steps = line[line.index("steps")-1]
-                stepss.append(steps)
-                time = line[line.index("of")+1]
-                times.append(time)
-            if "timestep" in line and "Performance" not in line:
-                line = line.strip('\n').split()
-                timestep = line[1]
-                timesteps.append(timestep)
-            if "Run" in line and "@" not in line:
-                line = line.strip('\n').split()
-                run = line[1]
-                totalsteps.append(run)
-            if "ERROR:" in line:
-                raise IOError("Logfile contains error!")
-        for total, natoms, nsteps, time, timestep in zip(
-                totals, atoms, stepss, times, timesteps):
-            total["Atoms"] = int(natoms)
-            total["Wall Clock Time (s)"] = float(time)
-            total["Number of steps"] = int(nsteps)
-            total["Timestep (ns)"] = float(timestep) * 1e-6
-            total["Simulation time (ns)"] = float(
-                timestep) * 1e-6 * int(nsteps)
-        breakdowns_list = []
-        for breakdown in breakdowns:
-            breakdown_dict = {}
-            for line_no in range(len(breakdown)):
-                line = breakdown[line_no]
-                line = list(map(str.strip, line))
-                if line_no == 0:
-                    labels = line[1:]
-                else:
-                    name = line.pop(0)
-                    breakdown_dict[name] = {
-                        labels[i]: line[i] for i in range(len(labels))}
-            breakdowns_list.append(breakdown_dict)
-        output["Totals"] = totals
-        output["Breakdowns"] = breakdowns_list
+                if run is not None:
+                    run["Breakdown"] = parse_breakdown(curr_bd)
+    if run is not None:
+        yield run
+
+
+def parse_lammps_log(log, standardise=True, accounting="accounting.json",
+                     production=-1):
+    """Parse a lammps log file into a python dictionary.
+    The log file is read one run at a time, and each one is kept in 'Runs'.
+    The totals are from the 'production' run.
+
+    Args:
+        path: path to the log file. Normally called 'log.lammps'.
+        standardise: whether to standardise the totals using crosswalk.
+        accounting: path to the accounting file, used if the totals are
+        standardised.
+        production: the index of the run to use for the totals. By default,
+        the last one.
+
+    Returns:
+        The contents of the log file in dictionary format. The thermo output
+        in 'Runs' is in NumPy arrays, so use util.to_json to write it.
+    """
+    output = {}
+    runs = list(read_runs(log))
+    output["Totals"] = [run["Totals"] for run in runs]
+    output["Breakdowns"] = [run["Breakdown"] for run in runs]
+    output["Runs"] = runs
     if standardise:
-        if len(output["Totals"]) > 1:
-            output["Totals"] = standardise_totals(output["Totals"][-1],
-                                                  accounting)
-        else:
-            output["Totals"] = standardise_totals(output["Totals"][0],
-                                                  accounting)
+        output["Totals"] = standardise_totals(
+            dict(runs[production]["Totals"]), accounting)
     return output
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
-    log = parse_lammps_log(args.log, args.keep, args.accounting)
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
+    log = parse_lammps_log(args.log, args.keep, args.accounting, args.run)
     with open(args.output, "w") as outfile:
-        json.dump(log, outfile, indent=4)
+        json.dump(log, outfile, indent=4, default=to_json)
+
+
+if __name__ == "__main__":
+    cli()
@@ -6,6 +6,7 @@ Parse NAMD stdout output and convert it to a json file.
 
 import argparse
 import json
+import os
 from hpcbench.logger.crosswalk import standardise_totals
 from hpcbench.logger.util import find_in_line
 
@@ -19,21 +20,110 @@ parser.add_argument("-k", "--keep", action='store_false',
 parser.add_argument("-a", "--accounting", type=str, default="accounting.json",
                     help="Path to accounting data from hpcbench sacct or "
                     "hpcbench syslog.")
+parser.add_argument("-t", "--tail", action="store_true",
+                    help="Only read the start and end of the log file, which "
+                    "is enough for the totals but not the time series.")
 
+# With --tail, how much of the end of the log file to read, in bytes.
+TAIL_SIZE = 65536
 
-def parse_namd_log(filename, standardise=True, accounting="accounting.json"):
+
+def read_lines(filename, tail=False):
+    """
+    Read the lines of a NAMD log file one at a time.
+
+    Params:
+        filename - path to the log file, a string.
+        tail - if True, skip from the start of the run (the first TIMING or
+        ENERGY line) to the last TAIL_SIZE bytes of the file, where the final
+        wall clock time is.
+    Yields:
+        each line, as a string.
+    """
+    with open(filename, "rb") as file:
+        for line in file:
+            line = line.decode(errors="replace")
+            yield line
+            if tail and line.startswith(("TIMING:", "ENERGY:")):
+                break
+        else:
+            return
+        size = os.fstat(file.fileno()).st_size
+        if file.tell() < size - TAIL_SIZE:
+            file.seek(size - TAIL_SIZE)
+            file.readline()  # probably only part of a line
+        for line in file:
+            yield line.decode(errors="replace")
+
+
+def parse_benchmark_time(line, series):
+    """
+    Parse an 'Info: Benchmark time:' line, e.g.
+    Info: Benchmark time: 8 CPUs 0.0123 s/step 0.0714 days/ns 1234.56 MB memory
+
+    Params:
+        line - the line, a string.
+        series - a dictionary of lists to add the values to.
+    """
+    series["s/step"].append(float(find_in_line(line, "s/step", -1)))
+    series["days/ns"].append(float(find_in_line(line, "days/ns", -1)))
+    memory = find_in_line(line, "MB", -1)
+    series["Memory (MB)"].append(float(memory) if memory else None)
+
+
+def parse_timing(line, series):
+    """
+    Parse a 'TIMING:' line, e.g.
+    TIMING: 500  CPU: 6.12, 0.0122/step  Wall: 6.23, 0.0124/step, 0.0344 hours
+    remaining, 1234.567 MB of memory in use.
+
+    Params:
+        line - the line, a string.
+        series - a dictionary of lists to add the values to.
+    """
+    words = line.replace(",", " ").replace("/step", "").split()
+    cpu = words.index("CPU:")
+    wall = words.index("Wall:")
+    series["Step"].append(int(words[1]))
+    series["CPU time (s)"].append(float(words[cpu+1]))
+    series["CPU s/step"].append(float(words[cpu+2]))
+    series["Wall time (s)"].append(float(words[wall+1]))
+    series["Wall s/step"].append(float(words[wall+2]))
+    hours = words.index("hours") if "hours" in words else None
+    series["Hours remaining"].append(float(words[hours-1]) if hours else None)
+    memory = words.index("MB") if "MB" in words else None
+    series["Memory (MB)"].append(float(words[memory-1]) if memory else None)
+
+
+def parse_namd_log(filename, standardise=True, accounting="accounting.json",
+                   tail=False):
     """
     Parse the contents of a log file generate by NAMD. Return the
-    performance information as a dictionary.
+    performance information as a dictionary. The file is read one line at a
+    time, and the 'Benchmark time' and 'TIMING' lines are kept as time series
+    so changes in performance over the run can be seen.
 
     Params:
         filename - path to the log file, a string.
+        tail - if True, only read the start of the log (up to the start of
+        the run) and the end, which is enough for the totals. The time series
+        will only include the lines that were read.
     Returns:
         the performance inforation, as a dictionary.
     """
-    with open(filename, "r") as file:
-        lines = file.readlines()
-    for line in lines:
+    benchmark = {"s/step": [], "days/ns": [], "Memory (MB)": []}
+    timing = {"Step": [], "CPU time (s)": [], "CPU s/step": [],
+              "Wall time (s)": [], "Wall s/step": [], "Hours remaining": [],
+              "Memory (MB)": []}
+    wallclock_time = None
+    for line in read_lines(filename, tail):
+        if line.startswith("ENERGY:"):
+            continue
+        if line.startswith("TIMING:"):
+            parse_timing(line, timing)
+            continue
+        if "Benchmark time:" in line:
+            parse_benchmark_time(line, benchmark)
         if "WallClock:" in line:
             wallclock_time = find_in_line(line, "WallClock:", 1)
             cpu_time = find_in_line(line, "CPUTime:", 1)
@@ -45,6 +135,9 @@ def parse_namd_log(filename, standardise=True, accounting="accounting.json"):
             steps = find_in_line(line, "steps", -1)
         if "TIMESTEP" in line and "LDB" not in line:
             timestep = str(float(find_in_line(line, "TIMESTEP", 1))/1e6)
+    if tail and wallclock_time is None:
+        # the end of the log was bigger than TAIL_SIZE, so read all of it
+        return parse_namd_log(filename, standardise, accounting)
     simtime = str(float(timestep) * int(steps))
     walltime_nosetup = float(wallclock_time) - float(startup_time)
     nsperday = (float(simtime)/walltime_nosetup)*86400
@@ -62,14 +155,26 @@ def parse_namd_log(filename, standardise=True, accounting="accounting.json"):
         "Number of steps": steps,
         "Timestep (ns)": timestep,
         "Simulation time (ns)": simtime
-        }}
+        },
+        "Benchmark time": benchmark,
+        "Timing": timing}
     if standardise:
         output["Totals"] = standardise_totals(output["Totals"], accounting)
     return output
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
-    log = parse_namd_log(args.log, args.keep, args.accounting)
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
+    log = parse_namd_log(args.log, args.keep, args.accounting, args.tail)
     with open(args.output, "w") as outfile:
         json.dump(log, outfile, indent=4)
+
+
+if __name__ == "__main__":
+    cli()
@@ -6,38 +6,114 @@ Get thermo output from namd and output it as a json file
 
 import json
 import argparse
+import os
+import re
+import numpy as np
+from hpcbench.logger.energy import (EnergySeries, parse_floats, read_chunks,
+                                    to_floats)
+from hpcbench.logger.util import positive_count
 
 parser = argparse.ArgumentParser("Get energy info from namd log file.")
 parser.add_argument("log", type=str, help="namd log file")
 parser.add_argument("json", type=str, help="json output file.")
+parser.add_argument("-z", "--npz", type=str, nargs="?", const="",
+                    help="Save the energies to a compressed .npz file instead,"
+                    " and only write a summary (mean, std and drift of each "
+                    "term) and the location of the .npz file to the json "
+                    "file. By default, the .npz file has the same name as "
+                    "the json file.")
+parser.add_argument("-s", "--stride", type=positive_count, default=1,
+                    help="Only extract every nth frame.")
 
+ETITLE_LINE = re.compile(r"^ETITLE:(.*)$", re.M)
+ENERGY_LINE = re.compile(r"^ENERGY:(.*)$", re.M)
+TIMESTEP_LINE = re.compile(r"^Info: TIMESTEP\s+(\S+)", re.M)
 
-def parse_namd_energies_log(mdout):
+
+def parse_energy_lines(lines, columns):
+    """
+    Parse the values from ENERGY lines.
+
+    Args:
+        lines - the lines, without the 'ENERGY:', a list of strings.
+        columns - the number of names in the ETITLE line.
+    Returns:
+        a 2-D NumPy array with a row for each line. Lines with the wrong
+        number of values (e.g. the last line, if NAMD was killed while
+        writing it) are left out.
+    """
+    energies = parse_floats(" ".join(lines), columns)
+    if energies is not None and len(energies) == len(lines):
+        return energies
+    rows = [line.split() for line in lines]
+    rows = [row for row in rows if len(row) == columns]
+    return to_floats(rows) if rows else np.empty((0, columns))
+
+
+def parse_namd_energies_log(mdout, npz=None, directory=".", stride=1):
     """
-    Get the energies from the log in namd stdout file as a dictionary.
+    Get the energies from the log in namd stdout file. The log is read a
+    chunk at a time, and all the ENERGY lines in each chunk (apart from the
+    ones skipped by the stride) are converted to NumPy in one go and added
+    to an EnergySeries, with a column for each name in the ETITLE line. If
+    the timestep is in the log, a 'Time' column (in ps) is added, worked out
+    from the step (TS).
 
     Args:
         mdout - path to namd stdout file
+        npz - if this is set, save the energies to this .npz file instead.
+        directory - the folder the output will be saved to. The location of
+        the .npz file is stored relative to this.
+        stride - only extract every nth frame.
     Returns:
-        results - a dictionary of results
+        results - a dictionary with a list of values for each term, or the
+        .npz file and a summary if npz is set (see EnergySeries.output).
     """
-    results = {}
-    header = []
-    with open(mdout, "r") as infile:
-        for line in infile:
-            if "ETITLE" in line:
-                for name in line.split():
-                    if name not in results:
-                        results[name] = []
-                        header.append(name)
-            if "ENERGY" in line:
-                for item, name in zip(line.split(), header):
-                    results[name].append(item)
-    return results
+    series = None
+    timestep = None
+    for chunk in read_chunks(mdout):
+        start = 0
+        if timestep is None:
+            match = TIMESTEP_LINE.search(chunk)
+            if match:
+                timestep = float(match.group(1))
+        if series is None:
+            match = ETITLE_LINE.search(chunk)
+            if not match:
+                continue
+            series = EnergySeries(match.group(1).split(), stride)
+            start = match.end()
+        lines = ENERGY_LINE.findall(chunk, start)
+        lines = lines[series.keep(len(lines))]
+        if lines:
+            series.append(parse_energy_lines(lines, len(series.names)))
+    if series is None:
+        series = EnergySeries([])
+    if timestep is not None and "TS" in series.names:
+        energies = series.array()
+        times = energies[:, series.names.index("TS")] * timestep / 1000
+        series = EnergySeries(["Time"] + series.names)
+        series.append(np.column_stack([times, energies]))
+    return series.output(npz, directory)
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
-    results = parse_namd_energies_log(args.log)
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
+    npz = args.npz
+    if npz == "":
+        npz = os.path.splitext(args.json)[0]+".npz"
+    results = parse_namd_energies_log(
+        args.log, npz, os.path.dirname(os.path.abspath(args.json)),
+        args.stride)
     with open(args.json, "w") as outfile:
         json.dump(results, outfile, indent=4)
+
+
+if __name__ == "__main__":
+    cli()
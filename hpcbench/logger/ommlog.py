@@ -46,8 +46,18 @@ def parse_omm_log(filename, standardise=True, accounting="accounting.json"):
     return output
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     log = parse_omm_log(args.log, args.keep, args.accounting)
     with open(args.output, "w") as outfile:
         json.dump(log, outfile, indent=4)
+
+
+if __name__ == "__main__":
+    cli()
@@ -5,7 +5,13 @@ Get output from sacct for a given job.
 """
 import argparse
 import json
+import os
+import re
 import subprocess
+import time
+from datetime import datetime
+from functools import lru_cache
+from hpcbench.logger.util import cache_dir, dump_json_atomic
 
 default_format_string="ConsumedEnergyRaw,CPUTimeRAW,NodeList,ElapsedRaw,JobID"
 "AveRss"
@@ -15,38 +21,281 @@ parser = argparse.ArgumentParser(description="Get output from sacct for a"
 parser.add_argument("jobid", type=str, help="id of the job")
 parser.add_argument("-f", "--format", type=str, default=default_format_string,
                     help="sacct format string")
+parser.add_argument("-n", "--nocache", action="store_true",
+                    help="Always run sacct, even if the job has finished and "
+                    "its accounting info is cached.")
 parser.add_argument("output", type=str, help="json file to be written into")
 
+# How many jobs to ask sacct about at once
+BATCH_SIZE = 200
 
-def get_sacct(jobid, formatstring = default_format_string):
+# Jobs in these states won't change, so their accounting info can be cached
+# for good
+FINAL_STATES = {"BOOT_FAIL", "CANCELLED", "COMPLETED", "DEADLINE", "FAILED",
+                "NODE_FAIL", "OUT_OF_MEMORY", "PREEMPTED", "REVOKED",
+                "TIMEOUT"}
+
+# The energy used by a job can be added after it ends, so a record with no
+# energy is looked up again until this many seconds after the job ended. On
+# clusters without energy accounting, the energy is always 0.
+ENERGY_GRACE = 600
+
+
+@lru_cache(maxsize=None)
+def cluster_name():
+    """
+    Get the name of the Slurm cluster, so accounting info from clusters that
+    share a home directory (and so a cache) isn't mixed up. This is
+    $SLURM_CLUSTER_NAME if it's set, otherwise the ClusterName from scontrol.
+
+    Returns:
+        The name, a string, or None if it can't be found.
+    """
+    name = os.environ.get("SLURM_CLUSTER_NAME")
+    if name:
+        return name
+    try:
+        config = subprocess.run(["scontrol", "show", "config"],
+                                capture_output=True, text=True).stdout
+    except OSError:
+        return None
+    match = re.search(r"^ClusterName\s*=\s*(\S+)", config, re.M)
+    return match.group(1) if match else None
+
+
+def cache_path(jobid):
+    """
+    Get the location of the cached sacct record for a job, in the hpcbench
+    cache folder. Each job has its own file, in a folder for the cluster.
+
+    Args:
+        jobid: the job ID, a string.
+
+    Returns:
+        The path of the cache file, a string, or None if the cluster isn't
+        known or the job ID isn't a plain ID (so nothing is cached).
+    """
+    cluster = cluster_name()
+    if not cluster or not re.fullmatch(r"[\w.+-]+", jobid):
+        return None
+    return os.path.join(cache_dir(), "sacct", cluster, jobid+".json")
+
+
+def load_cache(jobids):
+    """
+    Load the cached sacct records for some jobs.
+
+    Args:
+        jobids: the job IDs, strings.
+
+    Returns:
+        A dictionary with an entry for each job ID that's cached, holding the
+        sacct fields that were asked for ('fields') and the 'record'.
+    """
+    cache = {}
+    for jobid in jobids:
+        path = cache_path(jobid)
+        if not path:
+            continue
+        try:
+            with open(path, "r") as file:
+                cache[jobid] = json.load(file)
+        except (OSError, ValueError):
+            pass
+    return cache
+
+
+def save_cache(entries):
+    """
+    Add records to the sacct cache. Each job's record is written to its own
+    file (atomically, see dump_json_atomic), so processes saving records at
+    the same time can't overwrite each other's.
+
+    Args:
+        entries: a dictionary of new cache entries, like load_cache.
+    """
+    for jobid, entry in entries.items():
+        path = cache_path(jobid)
+        if not path:
+            continue
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            dump_json_atomic(entry, path)
+        except OSError:
+            print("Couldn't write sacct cache to "+path)
+            return
+
+
+def is_final(record):
+    """
+    Check whether a job's accounting info is final, i.e. the job is in a
+    final state.
+
+    Args:
+        record: the sacct record, including 'State'.
+
+    Returns:
+        True if the record can be cached.
+    """
+    state = record.get("State", "").split(" ")[0]
+    return state in FINAL_STATES
+
+
+def is_settled(record, now=None):
+    """
+    Check whether a cached record can be used. If the job's energy is 0, it
+    might not have been added yet, so the record is only used once
+    ENERGY_GRACE seconds have passed since the job ended.
+
+    Args:
+        record: the cached sacct record, including 'End'.
+        now: the current time, in seconds since the epoch. Defaults to now.
+
+    Returns:
+        True if the record doesn't need to be looked up again.
+    """
+    if record.get("ConsumedEnergyRaw", "1") not in ["", "0"]:
+        return True
+    try:
+        end = datetime.fromisoformat(record.get("End", "")).timestamp()
+    except ValueError:
+        return True
+    return (now or time.time()) - end > ENERGY_GRACE
+
+
+def parse_sacct(output, jobids):
+    """
+    Parse the output of sacct -P for some jobs. Each job can have several
+    lines (the job and its steps, or the tasks of an array job), which are
+    merged into one record.
+
+    Args:
+        output: the output of sacct, a string.
+        jobids: the job IDs that were asked for, strings.
+
+    Returns:
+        A dictionary with a record for each job ID. If there are multiple
+        entries per job id, the first available entry for each field is used.
+    """
+    records = {jobid: {} for jobid in jobids}
+    lines = output.strip().split("\n")
+    header = lines.pop(0).split("|")
+    if "JobID" not in header:
+        return records
+    jobcol = header.index("JobID")
+    for line in lines:
+        line = line.split("|")
+        if len(line) != len(header):
+            continue
+        jobid = line[jobcol].split(".")[0]
+        if jobid not in records:
+            jobid = re.split("[_+]", jobid)[0]
+        record = records.get(jobid)
+        if record is None:
+            continue
+        for col in range(len(line)):
+            if line[col] != "" and header[col] not in record:
+                record[header[col]] = line[col]
+    return records
+
+
+def run_sacct(jobids, fields):
+    """
+    Run sacct once for some jobs.
+
+    Args:
+        jobids: a list of job IDs, strings.
+        fields: a list of sacct fields.
+
+    Returns:
+        A dictionary with a record for each job ID, from parse_sacct.
+    """
+    output = subprocess.run(
+        ['sacct', '-j', ",".join(jobids), '--format='+",".join(fields), "-P"],
+        capture_output=True, text=True).stdout
+    return parse_sacct(output, jobids)
+
+
+def get_sacct_many(jobids, formatstring=default_format_string, cache=True,
+                   batch_size=BATCH_SIZE):
+    """
+    Get results from sacct for many jobs, with one sacct call for every
+    batch_size jobs rather than one for each job. Records for jobs that have
+    finished are cached on disk, and jobs found in the cache aren't looked up
+    again (unless the energy is 0 and the job only just ended, see
+    is_settled).
+
+    Args:
+        jobids: a list of job IDs.
+        formatstring: a comma-delimited sacct format string (see sacct's help
+        for more info)
+        cache: whether to use the cache.
+        batch_size: how many jobs to ask sacct about at once.
+
+    Returns:
+        A dictionary with a record for each job ID (as a string), like
+        get_sacct. Jobs that sacct doesn't know about have an empty record.
+    """
+    fields = formatstring.split(",")
+    # State and End are needed to tell whether the job has finished, and
+    # JobID to split the output between the jobs
+    query = fields + [field for field in ["JobID", "State", "End"]
+                      if field not in fields]
+    cached = load_cache(set(map(str, jobids))) if cache else {}
+    records = {}
+    missing = []
+    for jobid in map(str, jobids):
+        entry = cached.get(jobid)
+        if entry and set(fields) <= set(entry["fields"]) and \
+                is_settled(entry["record"]):
+            records[jobid] = entry["record"]
+        elif jobid not in missing:
+            missing.append(jobid)
+
+    new_entries = {}
+    for start in range(0, len(missing), batch_size):
+        batch = run_sacct(missing[start:start+batch_size], query)
+        for jobid, record in batch.items():
+            records[jobid] = record
+            if is_final(record):
+                new_entries[jobid] = {"fields": query, "record": record}
+    if cache and new_entries:
+        save_cache(new_entries)
+
+    return {jobid: {field: value for field, value in records[jobid].items()
+                    if field in fields} for jobid in map(str, jobids)}
+
+
+def get_sacct(jobid, formatstring=default_format_string, cache=True):
     """
     Get results from sacct in a python dictionary.
-    
+
     Args:
         jobid: the id of the job.
         formatstring: a comma-delimited sacct format string (see sacct's help
         for more info)
-    
+        cache: whether to use the cache of finished jobs (see
+        get_sacct_many).
+
     Returs:
         a dictionary containing values. If there are multiple entries per
         job id, the first available entry is used.
     """
-    pwrout = subprocess.run(
-        ['sacct', '-j', str(jobid), '--format='+formatstring,"-P"],
-        capture_output=True, text=True).stdout.strip()
-    lines = pwrout.split("\n")
-    header = lines.pop(0).split("|")
-    output = {}
-    for line in lines:
-        line = line.split("|")
-        for col in range(len(line)):
-            if line[col] != "" and header[col] not in output:
-                output[header[col]] = line[col]
-    return output
+    return get_sacct_many([jobid], formatstring, cache)[str(jobid)]
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
-    output = get_sacct(args.jobid, args.format)
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
+    output = get_sacct(args.jobid, args.format, not args.nocache)
     with open(args.output, "w") as outfile:
-        json.dump(output, outfile, indent=4)
\ No newline at end of file
+        json.dump(output, outfile, indent=4)
+
+
+if __name__ == "__main__":
+    cli()
@@ -53,8 +53,18 @@ def parse_submission_script(script):
     return output
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     parsed = parse_submission_script(args.script)
     with open(args.output, "w") as outfile:
         json.dump(parsed, outfile, indent=4)
+
+
+if __name__ == "__main__":
+    cli()
@@ -6,14 +6,19 @@ Dump system info to a file.
 
 import argparse
 import json
+import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from hpcbench.logger.util import (GracefulKiller, exists, parse_nvidia_smi,
-                                  parse_rocm_smi)
+                                  parse_rocm_smi, cache_dir, dump_json_atomic)
 
 parser = argparse.ArgumentParser(
     description="Log system info (e.g. environment modules, environment "
                 "variables, cpu and memory info, gpu info...) to a json file.")
 parser.add_argument("output", type=str, help="Output json file")
+parser.add_argument("-n", "--nocache", action="store_true",
+                    help="Don't use the cached GPU inventory for this "
+                    "node, run all the probes again.")
 
 SMI_COLS = "name,pci.bus_id,driver_version,pstate,count,serial,uuid," \
     "pcie.link.gen.max,pcie.link.gen.current,memory.total," \
@@ -24,63 +29,310 @@ SMI_COMMAND = "nvidia-smi --query-gpu="+SMI_COLS+" --format=csv"
 
 ROCM_COMMAND = "rocm-smi -a --json"
 
+# The GPU info is split into the inventory, which doesn't change until the
+# node is rebooted or the driver changes (so it can be cached), and the state
+# of each GPU (clocks, power, temperature etc.), which is queried every time.
+SMI_STATIC_COLS = "name,pci.bus_id,driver_version,count,serial,uuid," \
+    "pcie.link.gen.max,memory.total,index,accounting.mode,vbios_version," \
+    "inforom.oem,inforom.img,inforom.power,gom.current,memory.total,index"
+SMI_STATIC_COMMAND = "nvidia-smi --query-gpu="+SMI_STATIC_COLS+" --format=csv"
+SMI_DYNAMIC_COLS = "index,pstate,pcie.link.gen.current,clocks.sm,clocks.mem," \
+    "clocks.gr"
+SMI_DYNAMIC_COMMAND = "nvidia-smi --query-gpu="+SMI_DYNAMIC_COLS + \
+    " --format=csv"
+
+# rocm-smi can't be asked for just the inventory, so the static query is the
+# full -a output, and everything the dynamic query also returns is removed
+# before it's cached (see strip_dynamic). Together they have the same fields
+# as -a.
+ROCM_STATIC_COMMAND = ROCM_COMMAND
+ROCM_DYNAMIC_COMMAND = "rocm-smi -t -f -P -u --showmemuse -c -g " \
+    "--showperflevel --showvoltage --showmeminfo all --showenergycounter " \
+    "--json"
+
+# The column nvidia-smi's output is split between the GPUs by, which is in
+# both queries
+ID_COLS = {"index"}
+
+# Change this if what's cached changes, so old caches aren't used
+CACHE_VERSION = "3"
 
-def get_sysinfo():
+
+def get_kernel():
     """
-    Collect and parse info from various command-line utilities.
+    Get the kernel release (like uname -r).
 
     Returns:
-        A python dictionary containing the collected output.
+        The kernel release, a string.
     """
-    sysinfo = {}
-    if exists("uname"):
-        uname = subprocess.run(
-            ['uname', '-r'],  capture_output=True, text=True).stdout.strip()
-        sysinfo["kernel-release"] = uname
+    return os.uname().release
 
-    if exists("lscpu"):
-        sysinfo["CPU"] = {}
-        cpu = subprocess.run("lscpu",  capture_output=True,
-                             text=True).stdout.strip().split("\n")
-        for line in cpu:
-            line = " ".join(line.split())
-            sysinfo["CPU"][line.split(":")[0]] = line.split(":")[1].strip()
 
-    if exists("module"):
-        modules = subprocess.run(
-            ['module', 'list'],  capture_output=True, text=True).stdout.strip()
-        modules = modules.strip().split(")")[1:]
-        modules_fixed = []
-        for module in modules:
-            modules_fixed.append(module.split(" ")[1])
-        sysinfo["modules"] = modules
+def get_cpu():
+    """
+    Get CPU info from lscpu.
+
+    Returns:
+        A dictionary of the fields in the output of lscpu.
+    """
+    cpuinfo = {}
+    cpu = subprocess.run("lscpu",  capture_output=True,
+                         text=True).stdout.strip().split("\n")
+    for line in cpu:
+        line = " ".join(line.split())
+        cpuinfo[line.split(":")[0]] = line.split(":")[1].strip()
+    return cpuinfo
 
+
+def get_modules():
+    """
+    Get the environment modules that are loaded.
+
+    Returns:
+        A list of modules.
+    """
+    modules = subprocess.run(
+        ['module', 'list'],  capture_output=True, text=True).stdout.strip()
+    modules = modules.strip().split(")")[1:]
+    modules_fixed = []
+    for module in modules:
+        modules_fixed.append(module.split(" ")[1])
+    return modules
+
+
+def get_gpu(smi_command=SMI_COMMAND, rocm_command=ROCM_COMMAND):
+    """
+    Get GPU info from nvidia-smi or rocm-smi.
+
+    Args:
+        smi_command: the nvidia-smi command to run.
+        rocm_command: the rocm-smi command to run.
+
+    Returns:
+        A dictionary of info for each GPU.
+    """
+    results = {}
     if exists("nvidia-smi"):
-        nvout = subprocess.run(SMI_COMMAND.split(
+        nvout = subprocess.run(smi_command.split(
             " "), capture_output=True, text=True).stdout.strip()
-        results = {}
         results = parse_nvidia_smi(nvout, results)
-        sysinfo["GPU"] = results
     if exists("rocm-smi"):
-        rocmout = subprocess.run(ROCM_COMMAND.split(
+        rocmout = subprocess.run(rocm_command.split(
             " "), capture_output=True, text=True).stdout.strip()
-        results = {}
-        results = parse_rocm_smi(rocmout, results)
-        sysinfo["GPU"] = results
+        results = parse_rocm_smi(rocmout, {})
+    return results
+
+
+def get_gpu_static():
+    """
+    Get the GPU inventory (name, serial number, driver version, memory etc.),
+    which can be cached.
+
+    Returns:
+        A dictionary of info for each GPU.
+    """
+    return get_gpu(SMI_STATIC_COMMAND, ROCM_STATIC_COMMAND)
+
+
+def get_gpu_dynamic():
+    """
+    Get the current state of the GPUs (performance state, clocks, power,
+    temperature, utilisation etc.), which can't be cached.
+
+    Returns:
+        A dictionary of info for each GPU.
+    """
+    return get_gpu(SMI_DYNAMIC_COMMAND, ROCM_DYNAMIC_COMMAND)
+
+
+def merge_gpu(static, dynamic):
+    """
+    Combine the GPU inventory and state into one dictionary for each GPU.
+    The nvidia-smi fields are put in the same order as SMI_COLS.
+
+    Args:
+        static: the output of get_gpu_static.
+        dynamic: the output of get_gpu_dynamic.
+
+    Returns:
+        A dictionary of info for each GPU.
+    """
+    order = {col: i for i, col in reversed(list(
+        enumerate(SMI_COLS.split(","))))}
+    results = {}
+    for gpu in list(static) + [gpu for gpu in dynamic if gpu not in static]:
+        info = dict(static.get(gpu, {}))
+        for name, value in dynamic.get(gpu, {}).items():
+            if name not in info:
+                info[name] = value
+        results[gpu] = {name: info[name] for name in sorted(
+            info, key=lambda name: order.get(name, len(order)))}
+    return results
+
+
+def strip_dynamic(static, dynamic):
+    """
+    Remove the fields that are in the GPU state from the GPU inventory, so
+    they aren't cached.
+
+    Args:
+        static: the output of get_gpu_static.
+        dynamic: the output of get_gpu_dynamic.
+
+    Returns:
+        The inventory without the state, a dictionary of info for each GPU.
+    """
+    return {gpu: {name: value for name, value in info.items()
+                  if name in ID_COLS or name not in dynamic.get(gpu, {})}
+            for gpu, info in static.items()}
+
+
+def get_env():
+    """
+    Get the environment variables (like printenv).
+
+    Returns:
+        A list of 'name=value' strings.
+    """
+    return [name+"="+value for name, value in os.environ.items()]
+
+
+def cache_key():
+    """
+    Get a key for the cached system info. The GPU inventory shouldn't change
+    unless the node is rebooted or the GPU driver changes, so the key is the
+    hostname, the boot ID and the driver versions. These are all read from
+    files, so it's much faster than running the probes.
+
+    Returns:
+        The key, a string.
+    """
+    key = [CACHE_VERSION, os.uname().nodename]
+    for path in ["/proc/sys/kernel/random/boot_id",
+                 "/proc/driver/nvidia/version",
+                 "/sys/module/amdgpu/version"]:
+        try:
+            with open(path, "r") as file:
+                key.append(file.read().strip())
+        except OSError:
+            key.append("")
+    return "\n".join(key)
+
+
+def cache_path():
+    """
+    Get the location of the system info cache for this node. This is in
+    $HPCBENCH_CACHE if it's set, otherwise ~/.cache/hpcbench.
+
+    Returns:
+        The path of the cache file, a string.
+    """
+    return os.path.join(cache_dir(), "sysinfo-"+os.uname().nodename+".json")
+
+
+def load_cache(key):
+    """
+    Load the cached static system info, if there is any for this key.
+
+    Args:
+        key: the cache key, from cache_key().
+
+    Returns:
+        The cached info, a dictionary, or None if it isn't cached.
+    """
+    try:
+        with open(cache_path(), "r") as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if cache.get("key") != key:
+        return None
+    return cache["info"]
+
+
+def save_cache(key, info):
+    """
+    Save static system info to the cache. The file is written to a temporary
+    file and renamed, so jobs on the same node can't see a half-written file.
+
+    Args:
+        key: the cache key, from cache_key().
+        info: the static system info, a dictionary.
+    """
+    path = cache_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        dump_json_atomic({"key": key, "info": info}, path)
+    except OSError:
+        print("Couldn't write system info cache to "+path)
+
+
+def get_sysinfo(cache=True):
+    """
+    Collect and parse info from various command-line utilities. The probes
+    are run at the same time, and the GPU inventory, which is slow to get and
+    doesn't change, is cached for each node. Anything that can change between
+    jobs (clocks, power, temperature, CPU frequency etc.) is always queried.
+
+    Args:
+        cache: whether to use the cache for the static info, a boolean.
+
+    Returns:
+        A python dictionary containing the collected output.
+    """
+    probes = {"kernel-release": get_kernel, "env": get_env}
+    static = {}
+    if exists("lscpu"):
+        probes["CPU"] = get_cpu
+    if exists("nvidia-smi") or exists("rocm-smi"):
+        static["GPU"] = get_gpu_static
+        probes["GPU state"] = get_gpu_dynamic
     else:
-        print("nvidia-smi\rocm-smi not found, skpipping...")
+        print("nvidia-smi\\rocm-smi not found, skpipping...")
+    if exists("module"):
+        probes["modules"] = get_modules
+
+    key = cache_key() if cache else None
+    cached = load_cache(key) if cache else None
+    if cached is None:
+        probes.update(static)
+
+    with ThreadPoolExecutor(max_workers=len(probes)) as executor:
+        futures = {name: executor.submit(probe)
+                   for name, probe in probes.items()}
+    results = {name: future.result() for name, future in futures.items()}
 
-    if exists("printenv"):
-        env = subprocess.run(['printenv'],  capture_output=True,
-                             text=True).stdout.strip().split("\n")
-        sysinfo["env"] = env
+    if cached is not None:
+        results.update(cached)
+    else:
+        if "GPU" in results:
+            results["GPU"] = strip_dynamic(results["GPU"],
+                                           results["GPU state"])
+        if cache:
+            save_cache(key, {name: results[name] for name in static})
+    if "GPU" in results:
+        results["GPU"] = merge_gpu(results["GPU"], results.pop("GPU state"))
 
+    sysinfo = {}
+    for name in ["kernel-release", "CPU", "modules", "GPU", "env"]:
+        if name in results:
+            sysinfo[name] = results[name]
     return sysinfo
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     killer = GracefulKiller()
-    info = get_sysinfo()
+    info = get_sysinfo(not args.nocache)
     with open(args.output, "w") as outfile:
         json.dump(info, outfile, indent=4)
+
+
+if __name__ == "__main__":
+    cli()
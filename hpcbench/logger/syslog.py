@@ -5,16 +5,16 @@ Logs info from /sys/ to a file.
 """
 
 import argparse
-import asyncio
 import json
-from hpcbench.logger.util import GracefulKiller, cat
+from hpcbench.logger.util import GracefulKiller, Ticker, positive_interval
 import os
 
 parser = argparse.ArgumentParser(
     description="Log info from a specified location in /sys/ to a json file.")
 parser.add_argument("-o", "--output", type=str, help="Output json file")
-parser.add_argument("-i", "--interval", type=int, default=5,
-                    help="How often to log. Defaults to 1.")
+parser.add_argument("-i", "--interval", type=positive_interval,
+                    default=5,
+                    help="How often to log. Defaults to 5.")
 parser.add_argument("-t", "--total", type=str, action="append",
                     help="Integrate value and store the total (argument is the"
                     " label). E.g. if you're logging the power in W you can "
@@ -27,85 +27,211 @@ parser.add_argument("-s", "--sys", type=str, action="append",
                     multiplication factor (e.g. for converting units). Can use
                     multiple arguments for multiple logs e.g.
                     -s /sys/log1:label1:1 -s /sys/log2:label2:1""")
+parser.add_argument("-c", "--counter", type=str, action="append",
+                    default=[],
+                    help="""Log an energy counter from /sys, e.g.
+                    /sys/class/powercap/intel-rapl:0/energy_uj or a hwmon
+                    energy*_input. Same format as --sys, with a factor that
+                    converts the counter to J. The counter is logged as the
+                    energy used since the start, corrected for the counter
+                    wrapping around, and the total energy and average power
+                    are added to the totals. The energy of all counters is
+                    added up into 'Consumed Energy (J)', so don't log a
+                    domain and its subdomains at the same time.""")
 parser.add_argument("-p", "--pid", type=str, help="Write PID to a file")
 
 
-async def log_sys(path, factor, killer, for_time=1e30, interval=5):
+def read_sys(fd):
     """
-    Log the contents of some file (normally from /sys/), at some interval.
+    Read a number from an open file (normally from /sys/). The file is
+    re-read from the start with pread, so it doesn't need to be reopened.
 
     Args:
-        path: path to the file. (or 'file')
-        factor: value from the file is multiplied by this.
-        for_time: return after x seconds.
-        interval: take measurements every x seconds.
+        fd: a file descriptor from os.open
 
     Returns:
-        A list of floats containing the value of the 'file' at the specified
-        inverval.
+        The value in the file, a float.
     """
-    elapsed_time = 0
-    output = []
-    while elapsed_time < for_time and not killer.kill_now:
-        output.append(float(cat(path))*factor)
-        await asyncio.sleep(interval)
-        elapsed_time += interval
-    if killer.kill_now:
-        print("Killed logging of "+path+" early at "+str(elapsed_time)+"s")
-    return output
+    return float(os.pread(fd, 4096, 0).decode().strip())
+
+
+def read_counter(fd):
+    """
+    Read a counter from an open file (normally from /sys/), like read_sys but
+    as an integer, so large counters don't lose precision.
+
+    Args:
+        fd: a file descriptor from os.open
+
+    Returns:
+        The value in the file, an int.
+    """
+    return int(os.pread(fd, 4096, 0).decode().strip())
 
 
-async def make_logs(sys, interval, killer):
+def counter_range(path):
     """
-    Log the contents of multiple files simultaneously.
+    Get the value at which an energy counter wraps around. For RAPL, this is
+    in max_energy_range_uj, in the same folder as the counter. Other counters
+    (e.g. hwmon energy*_input) are assumed to be 64-bit.
 
     Args:
-        sys: the CLI argument 'sys', formatted as 'path:name:factor'
-        interval; interval (in seconds) with which to take measurements, int
+        path: path to the counter, a string.
+
+    Returns:
+        The range of the counter, an int.
+    """
+    max_path = os.path.join(os.path.dirname(path), "max_energy_range_uj")
+    if os.path.exists(max_path):
+        with open(max_path, "r") as file:
+            return int(file.read().strip())
+    return 2**64
+
+
+def log_sys(sys, killer, for_time=1e30, interval=5, counters=[]):
+    """
+    Log the contents of multiple files (normally from /sys/) at some interval.
+    Each file is opened once, and all of them are read in the same loop. The
+    time of each sample (in seconds from the start) is stored in 'Time (s)'.
+
+    Energy counters are logged as the energy used since the first sample. The
+    difference between samples is corrected for the counter wrapping around,
+    which is fine as long as it doesn't wrap more than once per interval.
+
+    Args:
+        sys: the CLI argument 'sys', a list of strings formatted as
+        'path:name:factor'
+        killer: instance of the GracefulKiller object which handles SIGINT
+        for_time: return after x seconds.
+        interval: take measurements every x seconds.
+        counters: the CLI argument 'counter', a list of strings in the same
+        format as 'sys'.
 
     Returns:
         A dictionary of lists containing values for the length of the run at
         the specified interval.
     """
-    logs = {}
-    for log in args.sys:
-        path, label, factor = log.split(":")
-        logs[label] = asyncio.create_task(
-            log_sys(path, float(factor), killer, interval=interval))
-    for label, log in logs.items():
-        await log
-        logs[label] = log.result()
+    files = []
+    energies = []
+    logs = {"Time (s)": []}
+    try:
+        for log in sys:
+            path, label, factor = log.rsplit(":", 2)
+            files.append((label, os.open(path, os.O_RDONLY), float(factor)))
+            logs[label] = []
+        for log in counters:
+            path, label, factor = log.rsplit(":", 2)
+            energies.append([label, os.open(path, os.O_RDONLY), float(factor),
+                             counter_range(path), None, 0])
+            logs[label] = []
+        ticker = Ticker(interval, killer, for_time)
+        for elapsed in ticker:
+            logs["Time (s)"].append(elapsed)
+            for label, fd, factor in files:
+                logs[label].append(read_sys(fd)*factor)
+            for counter in energies:
+                label, fd, factor, wrap, last, total = counter
+                value = read_counter(fd)
+                if last is not None:
+                    delta = value - last
+                    if delta < 0:
+                        delta += wrap
+                    total += delta
+                counter[4] = value
+                counter[5] = total
+                logs[label].append(total*factor)
+    finally:
+        for log in files + energies:
+            os.close(log[1])
+    if ticker.missed:
+        print("Missed "+str(ticker.missed)+" samples of /sys/")
+    if killer.kill_now:
+        print("Killed logging of /sys/ early at "+str(ticker.elapsed)+"s")
     return logs
 
 
-def integrate(values, interval):
+def integrate(values, interval, times=None):
     """
-    Very very dumb numerical integral.
+    Very very dumb numerical integral. Each value is assumed to hold until the
+    next one.
 
     Args:
         values: a list of values for y
         interval: the x interval beween values
+        times: optionally, the actual x value of each value, a list. If this
+        is given, the interval is only used for the last value.
 
     Returns:
         The integral
     """
     integral = 0
-    for value in values:
-        integral += value * interval
+    if times is None:
+        for value in values:
+            integral += value * interval
+        return integral
+    for i in range(len(values)):
+        if i+1 < len(times):
+            integral += values[i] * (times[i+1] - times[i])
+        else:
+            integral += values[i] * interval
     return integral
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def counter_totals(logs, counters):
+    """
+    Get the total energy and average power from logged energy counters.
+
+    Args:
+        logs: the output of log_sys, a dictionary.
+        counters: the CLI argument 'counter', a list of strings formatted as
+        'path:name:factor'.
+
+    Returns:
+        A dictionary with the energy in J and the average power in W for each
+        counter, and the sum of the energies as 'Consumed Energy (J)'.
+    """
+    totals = {}
+    times = logs["Time (s)"]
+    consumed = 0
+    for log in counters:
+        label = log.rsplit(":", 2)[1]
+        energy = logs[label][-1] if logs[label] else 0
+        totals[label+" (J)"] = energy
+        if len(times) > 1:
+            totals[label+" (W)"] = energy / (times[-1] - times[0])
+        consumed += energy
+    totals["Consumed Energy (J)"] = consumed
+    return totals
+
+
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
+    # check this now, rather than after the whole run has been logged
+    if len(args.total or []) > len(args.sys or []):
+        parser.error("each -t/--total needs a -s/--sys log to integrate")
     if args.pid:
         with open(args.pid, "w") as file:
             file.write(str(os.getpid()))
     killer = GracefulKiller()
-    logs = asyncio.run(make_logs(args.sys, args.interval, killer))
-    if args.total:
+    logs = log_sys(args.sys or [], killer, interval=args.interval,
+                   counters=args.counter)
+    if args.total or args.counter:
         logs["Totals"] = {}
+    if args.total:
         for log, label in zip(args.sys, args.total):
-            logs["Totals"][label] = integrate(logs[log.split(":")[1]],
-                                              args.interval)
+            logs["Totals"][label] = integrate(logs[log.rsplit(":", 2)[1]],
+                                              args.interval, logs["Time (s)"])
+    if args.counter:
+        logs["Totals"].update(counter_totals(logs, args.counter))
     with open(args.output, "w") as outfile:
         json.dump(logs, outfile, indent=4)
+
+
+if __name__ == "__main__":
+    cli()
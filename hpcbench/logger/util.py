@@ -4,9 +4,12 @@
 Utility functions for hpcbench data loggers
 """
 
+import argparse
 import signal
 from shutil import which
 import json
+import os
+import time
 
 
 def find_in_line(line, word, offset):
@@ -26,7 +29,7 @@ def find_in_line(line, word, offset):
             return line_fmt[c_word+offset]
 
 
-def parse_nvidia_smi(smi, results):
+def parse_nvidia_smi(smi, results, id_name="index"):
     """
     Parse the output of nvidia-smi and reformat it into a dictionary.
 
@@ -34,21 +37,20 @@ def parse_nvidia_smi(smi, results):
         smi: the string output by nvidia-smi in csv mode
         results: a dictionary with results from this function. If there is no
         dictionary yet, pass an empty dictionary.
+        id_name: the column containing the GPU number. Defaults to 'index'.
 
     Returns:
         results: a dictionary containing the results, indexed by GPU number.
     """
     cols, values = smi.split("\n")[0].split(","), smi.split("\n")[1:]
     cols = list(map(str.strip, cols))
-    id_col = cols.index("index")
-    if results == {}:
-        for value in values:
-            value = list(map(str.strip, value.split(",")))
-            results[value[id_col]] = {}
-            for col in cols:
-                results[value[id_col]][col] = []
+    id_col = cols.index(id_name)
     for row in values:
         row = list(map(str.strip, row.split(",")))
+        if row[id_col] not in results:
+            results[row[id_col]] = {}
+            for col in cols:
+                results[row[id_col]][col] = []
         for name, value in zip(cols, row):
             results[row[id_col]][name].append(value)
     return results
@@ -105,6 +107,277 @@ def exists(command):
     return which(command) is not None
 
 
+class RecordWriter:
+    """
+    Write samples from a logger to a JSON Lines file, one line per sample.
+    Each sample is appended to the end of the file, so the cost of writing a
+    sample doesn't depend on how long the logger has been running, and if the
+    logger is killed, every complete line in the file is still valid. Use
+    fold_records to convert the file back to the usual hpcbench layout.
+    """
+
+    def __init__(self, path, fsync_every=10):
+        """
+        Args:
+            path: path to the output file, normally ending in .jsonl
+            fsync_every: fsync the file after this many samples.
+        """
+        self.file = open(path, "w")
+        self.fsync_every = fsync_every
+        self.unsynced = 0
+
+    def write(self, record):
+        """
+        Append a sample to the file.
+
+        Args:
+            record: the sample, a dictionary.
+        """
+        self.file.write(json.dumps(record)+"\n")
+        self.file.flush()
+        self.unsynced += 1
+        if self.unsynced >= self.fsync_every:
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+
+    def close(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+def is_records(path):
+    """
+    Check whether a logger output file should be (or is) in the JSON Lines
+    format written by RecordWriter.
+
+    Args:
+        path: path to the file, a string.
+
+    Returns:
+        True if the file name ends in .jsonl, otherwise False.
+    """
+    return str(path).endswith(".jsonl")
+
+
+def fold_record(output, record):
+    """
+    Add one sample from a RecordWriter file to the usual nested-dict layout,
+    where each quantity is a list with one value per sample.
+
+    Args:
+        output: the dictionary to add the sample to
+        record: the sample, a dictionary. Values which are lists are
+        appended one after the other.
+
+    Returns:
+        output, with the sample added.
+    """
+    for key, value in record.items():
+        if type(value) is dict:
+            fold_record(output.setdefault(key, {}), value)
+        elif type(value) is list:
+            output.setdefault(key, []).extend(value)
+        else:
+            output.setdefault(key, []).append(value)
+    return output
+
+
+def fold_records(path):
+    """
+    Read a JSON Lines file written by RecordWriter and convert it to the same
+    layout the loggers use for json files. An incomplete last line (e.g. if
+    the logger was killed while writing) is ignored.
+
+    Args:
+        path: path to the file, a string.
+
+    Returns:
+        a dictionary.
+    """
+    output = {}
+    with open(path, "r") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            fold_record(output, record)
+    return output
+
+
+def to_json(obj):
+    """
+    Convert NumPy arrays (and numbers) to something json can write. Use this
+    as the default argument of json.dump, e.g.
+    json.dump(output, outfile, default=to_json).
+
+    Args:
+        obj: an object json doesn't know how to write.
+
+    Returns:
+        The object as a list (or a python number).
+    """
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError("Object of type "+type(obj).__name__ +
+                    " is not JSON serializable")
+
+
+def load_log(path):
+    """
+    Load a logger output file, which can be either a json file or a JSON
+    Lines file from RecordWriter.
+
+    Args:
+        path: path to the file, a string.
+
+    Returns:
+        the contents of the file, as a dictionary.
+    """
+    if is_records(path):
+        return fold_records(path)
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def log_name(path):
+    """
+    Get the name a logger output file is stored under when it's collated,
+    i.e. the path without the .json (or .jsonl) extension.
+
+    Args:
+        path: path to the file, a string.
+
+    Returns:
+        the name, a string.
+    """
+    if is_records(path):
+        return path.replace(".jsonl", "")
+    return path.replace(".json", "")
+
+
+def cache_dir():
+    """
+    Get the folder hpcbench keeps its caches in. This is $HPCBENCH_CACHE if
+    it's set, otherwise ~/.cache/hpcbench.
+
+    Returns:
+        The path of the folder, a string. It might not exist yet.
+    """
+    return os.environ.get("HPCBENCH_CACHE", os.path.join(
+        os.path.expanduser("~"), ".cache", "hpcbench"))
+
+
+def dump_json_atomic(obj, path, indent=None):
+    """
+    Write a json file atomically: it's written to a temporary file in the
+    same folder and renamed, so other processes never see a half-written
+    file, and the old file is left alone if writing fails.
+
+    Args:
+        obj: the object to write.
+        path: path of the json file, a string.
+        indent: passed to json.dump.
+    """
+    tmp = path+"."+str(os.getpid())+".tmp"
+    try:
+        with open(tmp, "w") as file:
+            json.dump(obj, file, indent=indent, default=to_json)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def positive_interval(value):
+    """
+    Parse a sampling interval from the command line (use as an argparse
+    type). It has to be more than 0, or the loggers would never sleep.
+
+    Args:
+        value: the interval, a string.
+
+    Returns:
+        the interval in seconds, a float.
+    """
+    try:
+        interval = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid interval: "+value)
+    if not interval > 0:
+        raise argparse.ArgumentTypeError("the interval has to be more than 0")
+    return interval
+
+
+def positive_count(value):
+    """
+    Parse a whole number that has to be at least 1 from the command line
+    (use as an argparse type), e.g. the stride of the energy parsers.
+
+    Args:
+        value: the number, a string.
+
+    Returns:
+        the number, an int.
+    """
+    try:
+        count = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid number: "+value)
+    if count < 1:
+        raise argparse.ArgumentTypeError("the number has to be at least 1")
+    return count
+
+
+class Ticker:
+    """
+    Iterate at regular intervals for the loggers. Ticks are on a fixed grid of
+    time.monotonic() values from when iteration started, so the time taken to
+    collect each sample doesn't make the sampling period drift. Each tick
+    yields the actual time of the sample, in seconds since the start. If a
+    sample takes longer than the interval, the ticks that were missed are
+    skipped and counted in 'missed'.
+    """
+
+    def __init__(self, interval, killer=None, for_time=1e30):
+        """
+        Args:
+            interval: time between ticks, in seconds.
+            killer: a GracefulKiller. Iteration stops when it's triggered.
+            for_time: stop after this many seconds.
+
+        Raises:
+            ValueError: if the interval isn't more than 0.
+        """
+        if not interval > 0:
+            raise ValueError("The interval has to be more than 0, not "
+                             + str(interval))
+        self.interval = interval
+        self.killer = killer
+        self.for_time = for_time
+        self.missed = 0
+        self.elapsed = 0
+
+    def __iter__(self):
+        start = time.monotonic()
+        tick = 0
+        while not (self.killer and self.killer.kill_now):
+            self.elapsed = time.monotonic() - start
+            if self.elapsed >= self.for_time:
+                break
+            yield self.elapsed
+            tick += 1
+            late = time.monotonic() - (start + tick*self.interval)
+            if late >= self.interval:
+                skipped = int(late / self.interval)
+                tick += skipped
+                self.missed += skipped
+            time.sleep(max(0, start + tick*self.interval - time.monotonic()))
+        self.elapsed = time.monotonic() - start
+
+
 class GracefulKiller:
     """
     Handle sigterm/sigint gracefully, still saving the contents of the file.
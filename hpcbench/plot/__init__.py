@@ -1,4 +1,14 @@
-from . import plot_style
-from . import logs
-from . import scaling
-from . import util
\ No newline at end of file
+import importlib
+
+_submodules = [
+    "plot_style",
+    "logs",
+    "scaling",
+    "util",
+]
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module("."+name, __name__)
+    raise AttributeError("module "+__name__+" has no attribute "+name)
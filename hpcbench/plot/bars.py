@@ -8,7 +8,7 @@ import numpy as np
 from hpcbench.plot.table import get_tabular
 import hpcbench.plot.plot_style as style
 import argparse
-from util import bodge_numeric
+from hpcbench.plot.util import bodge_numeric, job_count
 from collections import OrderedDict
 
 parser = argparse.ArgumentParser(
@@ -42,6 +42,8 @@ parser.add_argument("-s", "--sort", action="store_true",
                     help="Sort by x label")
 parser.add_argument("-o", "--output", type=str,
                     help="Output file.")
+parser.add_argument("-j", "--jobs", type=job_count, default=1,
+                    help="Number of files to read at once. Defaults to 1.")
 
 
 def plot_bars(tabular, outfile, xlabel, label_index=1, value_index=0,
@@ -189,8 +191,8 @@ def sort_tabular(tabular, group_idx=1, sort_idx=0):
 
 
 def main(x, y, label, filter_list, directory, outfile, annotation, xal, yal,
-         yscale=1., sort=False):
-    tabular = get_tabular(filter_list, [y], [x, label], directory)
+         yscale=1., sort=False, jobs=1):
+    tabular = get_tabular(filter_list, [y], [x, label], directory, jobs=jobs)
     if sort:
         tabular = sort_tabular(tabular)
     plot_bars(tabular, outfile, x, label_index=1, value_index=0,
@@ -209,8 +211,18 @@ def test():
     plot_bars(tabular, outfile, x, label_index=1, value_index=0)
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     main(args.xlabel, args.yvalue, args.legend, args.matching, args.directory,
          args.output, args.annotation, args.xaxislabel, args.yaxislabel,
-         args.yscalefactor, args.sort)
+         args.yscalefactor, args.sort, args.jobs)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+An SQLite index of the hpcbench json files in a results folder, so the plot,
+table and best tools don't have to read every file each time they're run.
+The index stores each file's path (relative to the folder), mtime and size,
+and the value of every field in the file (apart from lists, like the gpulog
+and cpulog series). It's updated by checking each file's mtime and size, and
+only the files that have changed are read again.
+"""
+
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+# The index file, in the results folder
+INDEX_NAME = ".hpcbench-index.sqlite"
+
+# Change this if the layout of the index changes, so old indexes are rebuilt
+INDEX_VERSION = 2
+
+# How many changed files are read before they're added to the index
+BATCH_SIZE = 1000
+
+# Stands in for a list in the fields from the index. Lists aren't indexed, so
+# anything that needs one has to come from the json file itself.
+UNINDEXED = object()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY, path TEXT UNIQUE, mtime INTEGER, size INTEGER);
+CREATE TABLE IF NOT EXISTS fields (file INTEGER, key TEXT, value TEXT);
+CREATE INDEX IF NOT EXISTS fields_key ON fields (key, value);
+CREATE INDEX IF NOT EXISTS fields_file ON fields (file);
+"""
+
+
+def flatten(d, prefix=()):
+    """
+    Flatten a json object into a list of fields. Each field is the path to
+    a value (as a list of keys) and the value, encoded as json. Lists aren't
+    stored, so their value is None, and empty dictionaries are stored as {}
+    so they're still there when the fields are put back together.
+
+    Args:
+        d: the json object.
+        prefix: the path to d, a tuple of keys.
+
+    Returns:
+        a list of (key, value) tuples, where key is the json-encoded path.
+    """
+    if isinstance(d, dict) and d:
+        fields = []
+        for key, value in d.items():
+            fields += flatten(value, prefix + (key,))
+        return fields
+    if isinstance(d, list):
+        return [(json.dumps(prefix), None)]
+    return [(json.dumps(prefix), json.dumps(d))]
+
+
+def unflatten(fields):
+    """
+    Put fields from flatten back together into a json object. Lists are
+    replaced by UNINDEXED.
+
+    Args:
+        fields: a list of (key, value) tuples, in the order flatten gave them.
+
+    Returns:
+        the json object, usually a dictionary.
+    """
+    root = {}
+    for key, value in fields:
+        path = json.loads(key)
+        value = UNINDEXED if value is None else json.loads(value)
+        if not path:
+            return value
+        d = root
+        for element in path[:-1]:
+            d = d.setdefault(element, {})
+        d[path[-1]] = value
+    return root
+
+
+def read_fields(path):
+    """
+    Read a json file and flatten it.
+
+    Args:
+        path: path to the file, a string.
+
+    Returns:
+        a list of fields, from flatten.
+
+    Raises:
+        IOError: if the file can't be read.
+    """
+    try:
+        with open(path, "r") as file:
+            return flatten(json.load(file))
+    except Exception as e:
+        raise IOError("Couldn't read "+str(path)+" ("+str(e)+")")
+
+
+def key_range(path):
+    """
+    Get the range of keys in the index that are inside a path.
+
+    Args:
+        path: a list of keys.
+
+    Returns:
+        the lowest key (inclusive) and highest key (exclusive), strings.
+    """
+    if not path:
+        return "", "\x7f"
+    low = json.dumps(path)[:-1] + ", "
+    return low, low[:-1] + "!"
+
+
+def touches_unindexed(d, path):
+    """
+    Check whether looking up a path (with ? wildcards, as in
+    hpcbench.plot.util.path_with_wildcard) in fields from the index would
+    need something that isn't indexed.
+
+    Args:
+        d: the fields, from unflatten.
+        path: a list of keys.
+
+    Returns:
+        True if the json file has to be read to look the path up.
+    """
+    for i, element in enumerate(path):
+        if d is UNINDEXED:
+            return True
+        if element == "?" and isinstance(d, dict):
+            return any(touches_unindexed(value, path[i+1:])
+                       for value in d.values())
+        if not isinstance(d, dict) or element not in d:
+            return False
+        d = d[element]
+    return contains_unindexed(d)
+
+
+def contains_unindexed(d):
+    """
+    Check whether some fields from the index include anything that isn't
+    indexed.
+
+    Args:
+        d: the fields, from unflatten.
+
+    Returns:
+        True if d is or contains UNINDEXED.
+    """
+    if isinstance(d, dict):
+        return any(map(contains_unindexed, d.values()))
+    return d is UNINDEXED
+
+
+class ResultsIndex:
+    """
+    The index of a results folder. If it can't be opened (e.g. the folder
+    is read-only), sqlite3.Error is raised.
+    """
+
+    def __init__(self, directory):
+        """
+        Args:
+            directory: the results folder.
+        """
+        self.directory = directory
+        self.path = os.path.join(directory, INDEX_NAME)
+        self.db = sqlite3.connect(self.path, timeout=60)
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version != INDEX_VERSION:
+            self.db.executescript("DROP TABLE IF EXISTS files; "
+                                  "DROP TABLE IF EXISTS fields; "
+                                  "PRAGMA user_version = "
+                                  + str(INDEX_VERSION)+";")
+        self.db.executescript(SCHEMA)
+        self.ids = {}
+
+    def close(self):
+        """
+        Close the index.
+        """
+        self.db.close()
+
+    def relative(self, path):
+        """
+        Get the path of a file relative to the results folder, which is how
+        it's stored in the index, so the folder can be given as a relative or
+        absolute path (or moved) without the whole index being rebuilt.
+
+        Args:
+            path: the path to the file, a string.
+
+        Returns:
+            the relative path, a string.
+        """
+        return os.path.relpath(path, self.directory)
+
+    def update(self, paths, jobs=1):
+        """
+        Bring the index up to date with the files in the folder. Files whose
+        mtime or size has changed are read again, and files which are no
+        longer there are removed.
+
+        Args:
+            paths: the json files in the folder, a list of strings.
+            jobs: how many files to check and read at once. Anything below 1
+            is treated as 1.
+
+        Raises:
+            IOError: if a file can't be read.
+        """
+        known = {path: (file_id, mtime, size) for file_id, path, mtime, size
+                 in self.db.execute("SELECT id, path, mtime, size FROM files")}
+        self.ids = {}
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor, \
+                self.db:
+            changed = []
+            for path, stat in zip(paths, executor.map(os.stat, paths)):
+                old = known.pop(self.relative(path), None)
+                if old and old[1:] == (stat.st_mtime_ns, stat.st_size):
+                    self.ids[path] = old[0]
+                else:
+                    changed.append((path, stat, old))
+            # read the changed files a batch at a time, so they aren't all
+            # in memory at once
+            for start in range(0, len(changed), BATCH_SIZE):
+                batch = changed[start:start+BATCH_SIZE]
+                for (path, stat, old), fields in zip(batch, executor.map(
+                        read_fields, [path for path, stat, old in batch])):
+                    if old:
+                        self.db.execute("DELETE FROM fields WHERE file = ?",
+                                        (old[0],))
+                    file_id = self.db.execute(
+                        "INSERT OR REPLACE INTO files (id, path, mtime, size) "
+                        "VALUES (?, ?, ?, ?)", (old[0] if old else None,
+                                                self.relative(path),
+                                                stat.st_mtime_ns, stat.st_size)
+                    ).lastrowid
+                    self.db.executemany(
+                        "INSERT INTO fields (file, key, value) "
+                        "VALUES (?, ?, ?)",
+                        [(file_id, key, value) for key, value in fields])
+                    self.ids[path] = file_id
+            for file_id, mtime, size in known.values():
+                self.db.execute("DELETE FROM fields WHERE file = ?",
+                                (file_id,))
+                self.db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def candidates(self, conditions):
+        """
+        Find the files which might match some conditions, without reading
+        them. Files where a condition goes through a list can't be checked
+        with the index, so they're included too.
+
+        Args:
+            conditions: a list of (path, value) tuples, where path is a list
+            of keys and value is the string it has to be equal to.
+
+        Returns:
+            a set of paths to the files, from the ones passed to update.
+        """
+        ids = set(self.ids.values())
+        for path, equal in conditions:
+            prefixes = [json.dumps(path[:i]) for i in range(len(path))]
+            ids &= {row[0] for row in self.db.execute(
+                "SELECT file FROM fields WHERE (key = ? AND value = ?) OR "
+                "(value IS NULL AND key IN ("+",".join("?"*len(prefixes))+"))",
+                [json.dumps(path), json.dumps(equal)] + prefixes)}
+        return {path for path, file_id in self.ids.items() if file_id in ids}
+
+    def fields(self, paths, locations):
+        """
+        Get the fields needed to look up some locations in some files.
+
+        Args:
+            paths: the files, a list of paths passed to update.
+            locations: the locations in the files, lists of keys which can
+            include ? wildcards.
+
+        Returns:
+            a dictionary of the fields for each file, from unflatten. Lists
+            are UNINDEXED (see touches_unindexed).
+        """
+        keys = set()
+        ranges = set()
+        for location in locations:
+            if "?" in location:
+                location = location[:location.index("?")]
+            keys.update(json.dumps(location[:i])
+                        for i in range(len(location)+1))
+            ranges.add(key_range(location))
+        query = "SELECT file, key, value FROM fields WHERE key IN (" \
+            + ",".join("?"*len(keys))+")" \
+            + " OR (key >= ? AND key < ?)" * len(ranges) \
+            + " ORDER BY file, rowid"
+        args = list(keys) + [key for pair in ranges for key in pair]
+        wanted = {self.ids[path]: path for path in paths}
+        fields = {file_id: [] for file_id in wanted}
+        for file_id, key, value in self.db.execute(query, args):
+            if file_id in fields:
+                fields[file_id].append((key, value))
+        return {path: unflatten(fields[file_id])
+                for file_id, path in wanted.items()}
@@ -6,7 +6,7 @@ Plot log files created with hpcbench.
 
 import argparse
 import matplotlib.pyplot as plt
-from hpcbench.plot.util import get_data
+from hpcbench.plot.util import get_data, job_count
 import hpcbench.plot.plot_style as style
 import numpy as np
 
@@ -48,6 +48,8 @@ parser.add_argument("-t", "--time", action="store_true",
 parser.add_argument("--xaxislabel", type=str, help="x axis label")
 parser.add_argument("--yaxislabel", type=str, help="y axis label")
 parser.add_argument("--small", action="store_true", help="Small plot")
+parser.add_argument("-j", "--jobs", type=job_count, default=1,
+                    help="Number of files to read at once. Defaults to 1.")
 
 def rescale_time(x):
     """
@@ -186,7 +188,7 @@ def plot(dicts, x, y, y2, label, outfile, x_time=True, legend_outside=False,
 
 def main(directory, matches, x, y, label, outfile, y2=None, outside=False,
          avg_y=False, avg_y2=False, xtime=False, xaxislabel=False,
-         yaxislabel=False, small=False):
+         yaxislabel=False, small=False, jobs=1):
     """
     Extract logged values (e.g. temperature, gpu and cpu load) from hpcbench
     log files and plot the results.
@@ -210,6 +212,7 @@ def main(directory, matches, x, y, label, outfile, y2=None, outside=False,
         plot area.
         avg_y: if this is true, the y2 values on the plot will be averaged.
         avg_y2: if this is True, the y2 values on the plot will be averaged.
+        jobs: how many files to read at once.
 
     Returns:
         None.
@@ -217,7 +220,8 @@ def main(directory, matches, x, y, label, outfile, y2=None, outside=False,
     if xtime:
         x = y
         y2 = "run:Totals:Simulation time (ns)"
-    dicts = get_data(matches, x, y, label, directory, wildcard=True, y2=y2)
+    dicts = get_data(matches, x, y, label, directory, wildcard=True, y2=y2,
+                     jobs=jobs)
     if xtime:
         y2 = None
     if outfile:
@@ -261,9 +265,19 @@ def test2():
     plot(dicts, x, y, y2, label, outfile)
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     dicts = main(args.directory, args.matching, args.x,
                  args.y, args.label, args.outfile, args.y2, args.outside,
                  args.avgy, args.avgy2, args.time, args.xaxislabel,
-                 args.yaxislabel, args.small)
+                 args.yaxislabel, args.small, args.jobs)
+
+
+if __name__ == "__main__":
+    cli()
@@ -8,7 +8,7 @@ import argparse
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 from more_itertools import sort_together
-from hpcbench.plot.util import get_data, path_with_wildcard
+from hpcbench.plot.util import get_data, job_count, path_with_wildcard
 import hpcbench.plot.plot_style as style
 import numpy as np
 from collections import OrderedDict
@@ -55,6 +55,8 @@ parser.add_argument("--noxsci", action="store_true",
                     help="Disable scientific notation on the x axis")
 parser.add_argument("--yscalefactor", type=float, default=1,
                     help="y axis scale factor")
+parser.add_argument("-j", "--jobs", type=job_count, default=1,
+                    help="Number of files to read at once. Defaults to 1.")
 
 def plot(data, xlabel, ylabel, outfile, xscale="linear", yscale="linear",
          legend_outside=False, sort=True, dash=None, x_axis_label=None,
@@ -206,7 +208,7 @@ def stackplot(data, xlabel, ylabel, outfile, xscale="linear", yscale="linear",
 def main(directory, matches, x, y, label, outfile, xscale, yscale,
          legend_outside=False, stack=False, dash=None, xaxlabel=None,
          yaxlabel=None, noxsci=False, noysci=False, small=False,
-         yscalefactor=1):
+         yscalefactor=1, jobs=1):
     """
     Look through all the hpcbench json files in a directory, check that they
     match the criterion specified, and extract the data that will be used,
@@ -227,11 +229,13 @@ def main(directory, matches, x, y, label, outfile, xscale, yscale,
         legend_outside: whether to put the legend outside the main plot
         area. A boolean.
         dash: lines with this string in the label will appear dashed,=
+        jobs: how many files to read at once.
     Returns:
         A dictionary containing the results indexed by label, with each result
         having a set of x and y values.
     """
-    dicts = get_data(matches, x, y, label, directory, wildcard=True)
+    dicts = get_data(matches, x, y, label, directory, wildcard=True,
+                     jobs=jobs)
     if outfile and type(y) is str:
         plot(dicts, x.split(":")[-1], y.split(":")[-1], outfile, xscale,
              yscale, legend_outside=legend_outside, dash=dash,
@@ -274,8 +278,14 @@ def test2():
               outfile, xscale, yscale, legend_outside=True)
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     if args.y and len(args.y) == 1:
         args.y = args.y[0]
     dicts = main(args.directory, args.matching, args.x, args.y,
@@ -283,4 +293,8 @@ if __name__ == "__main__":
                  args.outside, dash=args.dash, xaxlabel=args.xaxislabel,
                  yaxlabel=args.yaxislabel, noxsci=args.noxsci,
                  noysci=args.noysci, small=args.small,
-                 yscalefactor=args.yscalefactor)
+                 yscalefactor=args.yscalefactor, jobs=args.jobs)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Read just the parts of a json file that are needed, without parsing the rest.
+The file is read a chunk at a time, values that aren't needed (like the
+gpulog and cpulog series) are skipped over without being parsed, and reading
+stops as soon as everything needed has been found, or a --matching condition
+has failed.
+"""
+
+import json
+import re
+
+# How much of the file to read at a time, in characters
+CHUNK_SIZE = 1 << 16
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# The rest of a string, after the opening quote
+STRING_END = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+# The next thing that could change the nesting depth
+BRACKETS = re.compile(r'["\[\]{}]')
+SCALAR_END = re.compile(r"[,\]}\s]")
+
+DECODER = json.JSONDecoder()
+
+
+class NoMatch(Exception):
+    """
+    Raised when a condition fails, to stop reading the file.
+    """
+
+
+class Done(Exception):
+    """
+    Raised when everything needed has been read, to stop reading the file.
+    """
+
+
+def make_tree(paths):
+    """
+    Combine paths into a tree of the keys that are needed. Everything after
+    a ? wildcard is needed, so the path stops there.
+
+    Args:
+        paths: a list of paths, each a list of keys.
+
+    Returns:
+        a dictionary with an entry for each key needed. The entry is another
+        tree if only some of the value is needed, or None if all of it is.
+        If all of the file is needed, None.
+    """
+    tree = {}
+    for path in paths:
+        if "?" in path:
+            path = path[:path.index("?")]
+        if not path:
+            return None
+        node = tree
+        for key in path[:-1]:
+            if key in node and node[key] is None:
+                break
+            node = node.setdefault(key, {})
+        else:
+            node[path[-1]] = None
+    return tree
+
+
+def count_leaves(tree):
+    """
+    Count the values needed in a tree from make_tree.
+    """
+    if tree is None:
+        return 1
+    return sum(map(count_leaves, tree.values()))
+
+
+class JSONScanner:
+    """
+    Reads the parts of a json file in a tree from make_tree.
+    """
+
+    def __init__(self, file, conditions=None, chunk_size=CHUNK_SIZE):
+        """
+        Args:
+            file: the json file, open for reading.
+            conditions: a dictionary of values that have to be at certain
+            locations (tuples of keys) in the file. As soon as one doesn't
+            match, NoMatch is raised.
+            chunk_size: how many characters to read at a time.
+        """
+        self.file = file
+        self.conditions = conditions or {}
+        self.chunk_size = chunk_size
+        self.text = ""
+        self.pos = 0
+        self.pending = 0
+
+    def more(self, size=None):
+        """
+        Read the next chunk of the file. Anything before the current position
+        is dropped.
+
+        Args:
+            size: how many characters to read, by default chunk_size.
+
+        Returns:
+            False if the end of the file has been reached.
+        """
+        chunk = self.file.read(max(size or 0, self.chunk_size))
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return bool(chunk)
+
+    def peek(self):
+        """
+        Skip whitespace and get the next character.
+        """
+        while True:
+            self.pos = WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.more():
+                raise ValueError("Unexpected end of file")
+
+    def expect(self, char):
+        """
+        Skip the next character, which has to be char.
+        """
+        if self.peek() != char:
+            raise ValueError("Expected "+char+" at '"
+                             + self.text[self.pos:self.pos+20]+"'")
+        self.pos += 1
+
+    def string_end(self):
+        """
+        Find the end of the string starting at the current position.
+        """
+        while True:
+            match = STRING_END.match(self.text, self.pos+1)
+            if match:
+                return match.end()
+            if not self.more():
+                raise ValueError("Unterminated string")
+
+    def read_string(self):
+        """
+        Read the string starting at the current position.
+        """
+        if self.peek() != '"':
+            raise ValueError("Expected a string at '"
+                             + self.text[self.pos:self.pos+20]+"'")
+        end = self.string_end()
+        value = json.loads(self.text[self.pos:end])
+        self.pos = end
+        return value
+
+    def read_value(self):
+        """
+        Read and parse the value starting at the current position.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                # it might carry on in the next chunk
+                if not self.more(len(self.text)):
+                    raise
+                continue
+            # a number at the end of the chunk might carry on too (e.g. '1.'
+            # is read as 1)
+            if isinstance(value, (int, float)) and \
+                    not SCALAR_END.match(self.text, end):
+                start = self.pos
+                if self.more():
+                    continue
+                end -= start
+            self.pos = end
+            return value
+
+    def skip_value(self):
+        """
+        Skip over the value starting at the current position without
+        parsing it.
+        """
+        char = self.peek()
+        if char == '"':
+            self.pos = self.string_end()
+        elif char in "[{":
+            depth = 0
+            while True:
+                match = BRACKETS.search(self.text, self.pos)
+                if not match:
+                    self.pos = len(self.text)
+                    if not self.more():
+                        raise ValueError("Unexpected end of file")
+                    continue
+                char = match.group()
+                if char == '"':
+                    self.pos = match.start()
+                    self.pos = self.string_end()
+                    continue
+                self.pos = match.end()
+                depth += 1 if char in "[{" else -1
+                if depth == 0:
+                    return
+        else:
+            while True:
+                match = SCALAR_END.search(self.text, self.pos)
+                if match:
+                    self.pos = match.start()
+                    return
+                if not self.more():
+                    self.pos = len(self.text)
+                    return
+
+    def found(self, location, tree, value):
+        """
+        Record that a value in the tree has been read (or is missing, if
+        value is missing), and check it against the conditions.
+        """
+        if location in self.conditions and value != self.conditions[location]:
+            raise NoMatch()
+        self.pending -= count_leaves(tree)
+        if self.pending == 0:
+            raise Done()
+
+    def read_object(self, tree, result, location=()):
+        """
+        Read the parts of the object starting at the current position that
+        are in the tree into result.
+
+        Args:
+            tree: a tree from make_tree.
+            result: a dictionary to put the values in.
+            location: the keys leading to this object, a tuple.
+        """
+        self.expect("{")
+        remaining = dict(tree)
+        if self.peek() == "}":
+            self.pos += 1
+        else:
+            while True:
+                key = self.read_string()
+                self.expect(":")
+                if key in remaining:
+                    subtree = remaining.pop(key)
+                    if subtree is not None and self.peek() == "{":
+                        result[key] = {}
+                        self.read_object(subtree, result[key],
+                                         location + (key,))
+                    else:
+                        result[key] = self.read_value()
+                        self.found(location + (key,), subtree, result[key])
+                else:
+                    self.skip_value()
+                char = self.peek()
+                self.pos += 1
+                if char == "}":
+                    break
+                if char != ",":
+                    raise ValueError("Expected , or } at '"
+                                     + self.text[self.pos-1:self.pos+20]+"'")
+        for key, subtree in remaining.items():
+            self.missing(location + (key,), subtree)
+
+    def missing(self, location, tree):
+        """
+        Record that the values in a tree aren't in the file.
+        """
+        if tree is None:
+            self.found(location, tree, False)
+        else:
+            for key, subtree in tree.items():
+                self.missing(location + (key,), subtree)
+
+    def read(self, tree):
+        """
+        Read the parts of the file in a tree from make_tree.
+
+        Args:
+            tree: the tree, or None to read everything.
+
+        Returns:
+            the json object, with only the parts in the tree, or None if one
+            of the conditions failed.
+        """
+        if tree is None or not tree or self.peek() != "{":
+            return self.read_value()
+        result = {}
+        self.pending = count_leaves(tree)
+        try:
+            self.read_object(tree, result)
+        except Done:
+            pass
+        except NoMatch:
+            return None
+        return result
+
+
+def scan_json(filename, locations, conditions=None):
+    """
+    Read the parts of a json file at some locations.
+
+    Args:
+        filename: path to the json file, a string.
+        locations: a list of locations, each a list of keys (which can
+        include ? wildcards).
+        conditions: a dictionary of values that have to be at certain
+        locations (tuples of keys). These should be in locations too.
+
+    Returns:
+        the json object, but with only the values at the locations, or None
+        if one of the conditions failed. Values which aren't in the file are
+        left out.
+
+    Raises:
+        ValueError: if the file isn't valid json.
+    """
+    with open(filename, "r") as file:
+        return JSONScanner(file, conditions).read(make_tree(locations))
@@ -5,7 +5,7 @@ hpcbench table generator
 """
 
 import argparse
-from hpcbench.plot.util import get_paths, path_with_wildcard, does_match
+from hpcbench.plot.util import PathExpression, job_count, load_benchmarks
 from hpcbench.deps import tabulate
 
 parser = argparse.ArgumentParser(
@@ -31,6 +31,8 @@ parser.add_argument("-f", "--format", type=str,
                     " latex, csv,")
 parser.add_argument("-o", "--output", type=str,
                     help="Output file, otherwise output is printed.")
+parser.add_argument("-j", "--jobs", type=job_count, default=1,
+                    help="Number of files to read at once. Defaults to 1.")
 
 
 def test():
@@ -42,7 +44,7 @@ def test():
     return get_tabular(matches, rows, cols, directory)
 
 
-def get_tabular(matches, rows, cols, directory):
+def get_tabular(matches, rows, cols, directory, index=True, jobs=1):
     """
     Look through all the hpcbench json files in a directory, check that they
     match the criterion specified, extract the data that will be used,
@@ -58,32 +60,31 @@ def get_tabular(matches, rows, cols, directory):
         the columns, e.g. ['foo:bar:baz']. There will be as many columns as
         there are entries in this list.
         directory: the directory to look for the hpcbench json files in.
+        index: whether to use the results index (see
+        hpcbench.plot.util.load_benchmarks).
+        jobs: how many files to read at once.
 
     Returns:
         the tablular data, paradoxically in json format.
     """
-    path_func = path_with_wildcard
-    paths = get_paths(directory)
-    dicts = []
-    for path in paths:
-        match = does_match(path, matches)
-        if match:
-            dicts.append(match)
+    dicts = load_benchmarks(directory, matches, rows + cols, index, jobs)
+    row_paths = [PathExpression(row) for row in rows]
+    col_paths = [PathExpression(element) for element in cols]
     data = {}
-    for curr_dict in dicts:
+    for path, curr_dict in dicts:
         dict_contents = {}
-        for row in rows:
+        for row, row_path in zip(rows, row_paths):
             name = row.split(":")[-1]
-            contents = path_func(curr_dict, row.split(":"))
+            contents = row_path.get(curr_dict)
             if type(contents) is dict:
                 for key, value in contents.items():
                     dict_contents[key] = value
             else:
                 dict_contents[name] = contents
         name = ""
-        for element in cols:
+        for element, col_path in zip(cols, col_paths):
             try:
-                name += path_func(curr_dict, element.split(":"))+", "
+                name += col_path.get(curr_dict)+", "
             except TypeError as e:
                 print("element "+str(element)+" not in "+str(curr_dict))
                 print("Typeerror while parsing for "+str(element))
@@ -119,7 +120,7 @@ def convert_to_table(tabular, table_format):
     return tabulate.tabulate(table, tablefmt=table_format, headers="firstrow")
 
 
-def main(directory, matches, rows, cols, table_format, output=None):
+def main(directory, matches, rows, cols, table_format, output=None, jobs=1):
     """
     Look through all the hpcbench json files in a directory, check that they
     match the criterion specified, extract the data that will be used,
@@ -135,11 +136,12 @@ def main(directory, matches, rows, cols, table_format, output=None):
         columns, e.g. ['foo:bar:baz']. There will be as many columns as there
         are entries in this list.
         directory: the directory to look for the hpcbench json files in.
+        jobs: how many files to read at once.
     Returns:
         A dictionary containing the results indexed by label, with each result
         having a set of x and y values.
     """
-    tabular = get_tabular(matches, rows, cols, directory)
+    tabular = get_tabular(matches, rows, cols, directory, jobs=jobs)
     table = convert_to_table(tabular, table_format)
     if output:
         with open(output, "w") as file:
@@ -147,9 +149,19 @@ def main(directory, matches, rows, cols, table_format, output=None):
     return table
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     table = main(args.directory, args.matching, args.rows, args.cols,
-                 args.format, args.output)
+                 args.format, args.output, args.jobs)
     if not args.output:
         print(table)
+
+
+if __name__ == "__main__":
+    cli()
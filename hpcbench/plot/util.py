@@ -4,12 +4,18 @@
 Utility functions for hpcbench plotting tools.
 """
 
+import argparse
 import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from glob2 import glob
 import re
 from ast import literal_eval
-import copy
 import datetime
+from functools import lru_cache
+from hpcbench.plot.index import ResultsIndex, touches_unindexed
+from hpcbench.plot.scan import scan_json
 
 
 def bodge_timestamp(str_date):
@@ -131,56 +137,202 @@ def parse_match_arg(match_arg):
     return path, equal
 
 
+# Marks a key that isn't in a dictionary, for PathExpression
+MISSING = object()
+
+
+class PathExpression:
+    """
+    A location in a json file, e.g. 'run:Cycles:?:Wall time (s)', parsed once
+    so it can be looked up quickly in many benchmarks. A ? is a wildcard,
+    which matches every key of a dictionary (or every item of a list), and
+    there can be any number of them. Integer keys index into lists, e.g.
+    'list:0:a'.
+    """
+
+    def __init__(self, path, wildcard=True):
+        """
+        Args:
+            path: the location, a string formatted foo:bar:baz, or a list of
+            keys.
+            wildcard: whether ? is a wildcard. If not, it's a normal key.
+        """
+        if isinstance(path, str):
+            path = parse_path_arg(path)
+        self.keys = tuple(path)
+        self.wildcard = wildcard
+        self._get = self.compile(0)
+
+    def compile(self, start):
+        """
+        Make a function which looks up the keys from start onwards. Each run
+        of keys without a wildcard is looked up in one loop, and a wildcard
+        calls the function for the rest of the keys on every item.
+
+        Args:
+            start: the index of the first key.
+
+        Returns:
+            the function, which takes a dictionary and returns the value at
+            the location (see get).
+        """
+        if start == len(self.keys) or (
+                self.wildcard and start == len(self.keys) - 1 and
+                self.keys[start] == "?"):
+            return lambda d: d
+        if self.wildcard and self.keys[start] == "?":
+            rest = self.compile(start+1)
+
+            def get_each(d):
+                if isinstance(d, dict):
+                    return {key: rest(value) for key, value in d.items()}
+                if isinstance(d, list):
+                    return [rest(item) for item in d]
+                raise TypeError("Can't use a wildcard on "+str(type(d)))
+            return get_each
+
+        end = start
+        while end < len(self.keys) and not (self.wildcard and
+                                            self.keys[end] == "?"):
+            end += 1
+        keys = [(key, int(key) if key.lstrip("-").isdigit() else None)
+                for key in self.keys[start:end]]
+        rest = self.compile(end) if end < len(self.keys) else None
+
+        def get_keys(d):
+            for key, index in keys:
+                if isinstance(d, dict):
+                    d = d.get(key, MISSING)
+                    if d is MISSING:
+                        return False
+                elif isinstance(d, list) and index is not None:
+                    if not -len(d) <= index < len(d):
+                        return False
+                    d = d[index]
+                else:
+                    raise TypeError("Can't look up "+str(key)+" in "
+                                    + str(type(d)))
+            return rest(d) if rest else d
+        return get_keys
+
+    def get(self, d):
+        """
+        Look the location up in a benchmark, with the function compiled when
+        the PathExpression was made.
+
+        Args:
+            d: the benchmark, a dict.
+
+        Returns:
+            The thing in the dictionary at that location (if it exists), or
+            False (if it doesn't). If the location has a wildcard, a
+            dictionary (or list) with the value for each key is returned
+            instead, and if it ends with one, the whole dictionary is
+            returned.
+
+        Raises:
+            TypeError: if the location goes through something that isn't a
+            dictionary or list.
+        """
+        return self._get(d)
+
+
+@lru_cache(maxsize=None)
+def compile_path(path, wildcard=True):
+    """
+    Get the PathExpression for a location, re-using it if it's been compiled
+    before.
+
+    Args:
+        path: the location, a string formatted foo:bar:baz, or a tuple of
+        keys.
+        wildcard: whether ? is a wildcard.
+
+    Returns:
+        a PathExpression.
+    """
+    return PathExpression(path, wildcard)
+
+
 def path_in_dict(d, path):
     """
     Check whether a given path (specified by a string) exists in a dictionary.
 
     Args:
         d: the dictionary.
-        path: the path to check, a string, e.g.foo:bar:baz
+        path: the path to check, a list of keys, e.g. [foo, bar, baz], or a
+        string, e.g. foo:bar:baz
 
     Returns:
         The thing in the dictionary at that location (if it exists), or False
-        (if it doesn't)
+        (if it doesn't). The path is compiled into a PathExpression the first
+        time it's used, so looking it up in many benchmarks is quick.
     """
-    try:
-        element = path.pop(0)
-        if len(path) == 0:
-            return d[element]
-        d[element]
-        return path_in_dict(d[element], path)
-    except KeyError:
-        return False
+    if not isinstance(path, str):
+        # keys can contain ':', so they aren't joined into a string
+        path = tuple(path)
+    return compile_path(path, False).get(d)
 
 
-def does_match(path, matches):
+def does_match(path, matches, locations=None):
     """
     For a given json file (presumably representing a hpcbench benchmark), check
     if it matches with all the criteria supplied in matches (a list of
-    locations within the json file formatted as foo:bar:baz=quux).
+    locations within the json file formatted as foo:bar:baz=quux). The
+    conditions are checked as the file is read (see hpcbench.plot.scan), so
+    reading stops as soon as one fails, and the parts of the file that aren't
+    needed are skipped without being parsed.
 
     Args:
         path: path to the json file
         matches: a list of strings
+        locations: if this is set, only parse the values at these locations
+        (strings formatted foo:bar:baz, where ? is a wildcard) and the ones in
+        matches.
 
     Returns:
-        The benchmark parsed as a dict, if it matches, None if it doesn't.
+        The benchmark parsed as a dict, if it matches, None if it doesn't. If
+        locations is set, it only contains the values at those locations and
+        the ones in matches.
     """
+    conditions = [parse_match_arg(match) for match in matches or []]
+    needed = [location for location, equal in conditions]
+    if locations is not None:
+        needed += [parse_path_arg(location) for location in locations
+                   if location]
     try:
-        with open(path, "r") as file:
-            bench = json.load(file)
+        if needed:
+            required = {tuple(location): equal
+                        for location, equal in conditions}
+            bench = scan_json(path, needed, required)
+            if bench is None or not matches_all(bench, matches):
+                return None
+        if locations is None or not needed:
+            with open(path, "r") as file:
+                bench = json.load(file)
     except Exception as e:
         raise IOError("Couldn't read "+str(path)+" ("+str(e)+")")
-    if not matches:
-        return bench
-    for match in matches:
-        path, equal = parse_match_arg(match)
-        destination = path_in_dict(bench, path)
-        if destination != equal:
-            return None
     return bench
 
 
+def matches_all(bench, matches):
+    """
+    Check whether a benchmark matches all the criteria supplied in matches.
+
+    Args:
+        bench: the benchmark, a dict.
+        matches: a list of strings formatted as foo:bar:baz=quux.
+
+    Returns:
+        True if it matches.
+    """
+    for match in matches or []:
+        pathstr, equal = match.split("=")
+        if compile_path(pathstr, False).get(bench) != equal:
+            return False
+    return True
+
+
 def path_with_wildcard(d, path):
     """
     Check whether a given path (specified by a string) exists in a dictionary.
@@ -189,41 +341,157 @@ def path_with_wildcard(d, path):
 
     Args:
         d: the dictionary.
-        path: the path to check, a string, e.g.foo:bar:baz
+        path: the path to check, a list of keys, e.g. [foo, ?, baz], or a
+        string, e.g. foo:?:baz
 
     Returns:
         The thing in the dictionary at that location (if it exists), or False
         (if it doesn't)
     """
+    if not isinstance(path, str):
+        # keys can contain ':', so they aren't joined into a string
+        path = tuple(path)
+    return compile_path(path).get(d)
+
+
+def job_count(value):
+    """
+    Parse the number of files to read at once from the command line (use as
+    an argparse type for -j/--jobs).
+
+    Args:
+        value: the number, a string.
+
+    Returns:
+        the number, an int of at least 1.
+    """
     try:
-        element = path.pop(0)
-        if len(path) == 0 and element != "?":
-            return d[element]
-        if len(path) == 0 and element == "?":
-            return d
-        if element != '?':
-            d[element]
-            return path_with_wildcard(d[element], path)
-        else:
-            if type(d) == dict:
-                retval = {}
-                for key, value in d.items():
-                    # keep the path for the next iteration
-                    oldpath = copy.copy(path)
-                    retval[key] = path_with_wildcard(value, path)
-                    path = copy.copy(oldpath)
-            if type(d) == list:
-                retval = []
-                for item in d: 
-                    oldpath = copy.copy(path)
-                    retval.append(path_with_wildcard(item, path))
-                    path = copy.copy(oldpath)
-            return retval
-    except KeyError:
-        return False
-
-
-def get_data(matches, x, y, label, directory, wildcard=False, y2=None):
+        jobs = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid number of jobs: "+value)
+    if jobs < 1:
+        raise argparse.ArgumentTypeError("the number of jobs has to be at "
+                                         "least 1")
+    return jobs
+
+
+def parallel_map(func, items, jobs=1):
+    """
+    Apply a function to a list of items using a pool of threads, so the
+    time spent waiting for the filesystem overlaps.
+
+    Args:
+        func: the function.
+        items: a list of items.
+        jobs: the number of threads. If this is 1, no threads are used.
+
+    Returns:
+        a list of the results, in the same order as items.
+    """
+    if jobs <= 1:
+        return list(map(func, items))
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(func, items))
+
+
+def load_benchmarks(directory, matches, locations, index=True, jobs=1):
+    """
+    Get all the hpcbench json files in a directory which match the criteria
+    in matches. The results index (see hpcbench.plot.index) is used to find
+    the files that match and the values at the locations needed, so most
+    files aren't read at all. Files which need something the index doesn't
+    have (e.g. anything inside a list) are read as normal. The index isn't
+    used if index is False, the HPCBENCH_NOINDEX environment variable is
+    set, or it can't be opened.
+
+    Args:
+        directory: the directory to look for the json files in.
+        matches: a list of strings, each one specifying some criteria that the
+        json file has to match eg. ['foo:bar:baz=quux']
+        locations: the locations that will be looked up in each benchmark, as
+        strings formatted foo:bar:baz, where ? is a wildcard.
+        index: whether to use the results index.
+        jobs: how many files to read at once (see parallel_map).
+
+    Returns:
+        A list of (path, benchmark) tuples, in the same order as get_paths.
+        Each benchmark is a dict, which might only contain the values at the
+        locations needed and in matches.
+    """
+    paths = get_paths(directory)
+    if index and not os.environ.get("HPCBENCH_NOINDEX"):
+        try:
+            return load_indexed(directory, paths, matches, locations, jobs)
+        except sqlite3.Error as e:
+            print("Couldn't use the results index in "+str(directory)+" ("
+                  + str(e)+"), reading every file")
+    return read_benchmarks(paths, matches, locations, jobs)
+
+
+def read_benchmarks(paths, matches, locations, jobs=1):
+    """
+    Read the json files which match the criteria in matches, without the
+    results index. See load_benchmarks.
+
+    Args:
+        paths: the json files, a list of strings.
+        matches: a list of strings formatted as foo:bar:baz=quux.
+        locations: the locations that will be looked up in each benchmark.
+        jobs: how many files to read at once.
+
+    Returns:
+        A list of (path, benchmark) tuples, like load_benchmarks.
+    """
+    benches = parallel_map(lambda path: does_match(path, matches, locations),
+                           paths, jobs)
+    return [(path, bench) for path, bench in zip(paths, benches)
+            if bench is not None]
+
+
+def load_indexed(directory, paths, matches, locations, jobs=1):
+    """
+    Get the benchmarks which match the criteria in matches using the results
+    index. See load_benchmarks.
+
+    Args:
+        directory: the directory the json files are in.
+        paths: the json files, from get_paths.
+        matches: a list of strings formatted as foo:bar:baz=quux.
+        locations: the locations that will be looked up in each benchmark.
+        jobs: how many files to read at once.
+
+    Returns:
+        A list of (path, benchmark) tuples, like load_benchmarks.
+    """
+    conditions = [parse_match_arg(match) for match in matches or []]
+    needed = [parse_path_arg(location) for location in locations
+              if location] + [path for path, equal in conditions]
+    results_index = ResultsIndex(directory)
+    try:
+        results_index.update(paths, jobs)
+        candidates = results_index.candidates(conditions)
+        paths = [path for path in paths if path in candidates]
+        fields = results_index.fields(paths, needed)
+    finally:
+        results_index.close()
+    # the index doesn't have everything for these, so read the files
+    unindexed = [path for path in paths if any(
+        touches_unindexed(fields[path], location) for location in needed)]
+    read = dict(read_benchmarks(unindexed, matches, locations, jobs))
+    unindexed = set(unindexed)
+    benches = []
+    for path in paths:
+        if path in unindexed:
+            # files that didn't match aren't in read
+            if path in read:
+                benches.append((path, read[path]))
+        elif matches_all(fields[path], matches):
+            benches.append((path, fields[path]))
+    return benches
+
+
+def get_data(matches, x, y, label, directory, wildcard=False, y2=None,
+             index=True, jobs=1):
     """
     Look through all the hpcbench json files in a directory, check that they
     match the criterion specified, and extract the data that will be used.
@@ -236,41 +504,42 @@ def get_data(matches, x, y, label, directory, wildcard=False, y2=None):
         y: the same, for the y values
         label: the same, for the plot label
         directory: the directory to look for the json files in.
+        index: whether to use the results index (see load_benchmarks).
+        jobs: how many files to read at once.
     Returns:
         A dictionary containing the results indexed by label, with each result
         having a set of x and y values.
     """
     if wildcard:
-        path_func = path_with_wildcard
         bodge_numeric_func = bodge_numeric_dict_wrapper
     else:
-        path_func = path_in_dict
         bodge_numeric_func = bodge_numeric
-    paths = get_paths(directory)
-    dicts = []
-    for path in paths:
-        match = does_match(path, matches)
-        if match:
-            dicts.append(match)
+    ys = y if type(y) is list else [y]
+    dicts = load_benchmarks(directory, matches, [x, label, y2] + ys, index,
+                            jobs)
+    # the locations are compiled once and used for every benchmark
+    x_path = PathExpression(x, wildcard)
+    y_paths = {element: PathExpression(element, wildcard) for element in ys}
+    label_path = PathExpression(label, wildcard)
+    y2_path = PathExpression(y2, wildcard) if y2 else None
     data = {}
-    for hdict in dicts:
-        xval = bodge_numeric_func(path_func(hdict, parse_path_arg(x)))
+    for path, hdict in dicts:
+        xval = bodge_numeric_func(x_path.get(hdict))
         if not xval:
             continue
         if type(y) is list:
             yval = {}
             for element in y:
-                yval[element] = bodge_numeric_func(
-                    path_func(hdict, parse_path_arg(element)))
+                yval[element] = bodge_numeric_func(y_paths[element].get(hdict))
         else:
-            yval = bodge_numeric_func(path_func(hdict, parse_path_arg(y)))
-        labelval = path_func(hdict, parse_path_arg(label))
+            yval = bodge_numeric_func(y_paths[y].get(hdict))
+        labelval = label_path.get(hdict)
         if labelval not in data.keys():
             data[labelval] = {"x": [], "y": []}
         data[labelval]["x"].append(xval)
         data[labelval]["y"].append(yval)
         if y2:
-            y2val = bodge_numeric_func(path_func(hdict, parse_path_arg(y2)))
+            y2val = bodge_numeric_func(y2_path.get(hdict))
             if 'y2' not in data[labelval].keys():
                 data[labelval]["y2"] = []
             data[labelval]["y2"].append(y2val)
@@ -0,0 +1,12 @@
+import importlib
+
+_submodules = [
+    "best",
+    "fits",
+]
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module("."+name, __name__)
+    raise AttributeError("module "+__name__+" has no attribute "+name)
@@ -9,7 +9,8 @@ Mark hpcbench output files when they fulfil certain criteria.
 # best: run:Totals:ns/day
 
 
-from hpcbench.plot.util import get_paths, path_with_wildcard, does_match
+from hpcbench.plot.util import (job_count, load_benchmarks,
+                                 path_with_wildcard)
 from hpcbench.util.updatejson import get_dict_element
 import json
 import argparse
@@ -35,6 +36,8 @@ parser.add_argument("-d", "--directory", type=str,
                     help="Directory to look in.")
 parser.add_argument("-f", "--format", type=str, default="simple_grid",
                     help="Output table format")
+parser.add_argument("-j", "--jobs", type=job_count, default=1,
+                    help="Number of files to read at once. Defaults to 1.")
 
 
 def add_dict_element(d, element, set_to=None):
@@ -60,7 +63,7 @@ def add_dict_element(d, element, set_to=None):
 
 
 def get_best(best, variables, directory, path_func=path_with_wildcard,
-             matches=None):
+             matches=None, index=True, jobs=1):
     """
     For a directory containing hpcbench log files, get the log file with the
     highest value of the variable 'best'. For the variables listed in
@@ -84,6 +87,9 @@ def get_best(best, variables, directory, path_func=path_with_wildcard,
         output file. e.g. ["loc1:loc2=value", "loc3:loc4=value"]. all of these
         conditions have to be met for the output file to be included in the
         comparison (a list of strings)
+        index: whether to use the results index (see
+        hpcbench.plot.util.load_benchmarks).
+        jobs: how many files to read at once.
 
     Returns:
         table, a table of values stored as a list of lists, with the first list
@@ -92,12 +98,8 @@ def get_best(best, variables, directory, path_func=path_with_wildcard,
         mark=yes.
     """
     # values, best, path to json file
-    paths = get_paths(directory)
-    dicts = {}
-    for path in paths:
-        match = does_match(path, matches)
-        if match:
-            dicts[path] = match
+    dicts = dict(load_benchmarks(directory, matches, [best] + variables,
+                                 index, jobs))
     dict_table = {}
     header = []
     for var in variables:
@@ -106,9 +108,10 @@ def get_best(best, variables, directory, path_func=path_with_wildcard,
     header.append("Path")
     for path, curr_dict in dicts.items():
         row = []
-        best_value = path_func(curr_dict, best.split(":"))
+        # the locations are passed as strings, so they're only compiled once
+        best_value = path_func(curr_dict, best)
         for var in variables:
-            row.append(path_func(curr_dict, var.split(":")))
+            row.append(path_func(curr_dict, var))
         name = "¬".join(list(map(str, row)))
         if name in dict_table:
             if float(best_value) > float(dict_table[name][-2]):
@@ -148,7 +151,7 @@ def update_best(table, mark):
     return
 
 
-def main(best, variables, directory, mark, matches=None):
+def main(best, variables, directory, mark, matches=None, jobs=1):
     """
     Find (and potentially mark) the hpcbench log file with a certain value
     at its maximum. Optionally, provide a maximum value for every combination
@@ -169,6 +172,7 @@ def main(best, variables, directory, mark, matches=None):
         output file. e.g. ["loc1:loc2=value", "loc3:loc4=value"]. all of these
         conditions have to be met for the output file to be included in the
         comparison (a list of strings)
+        jobs: how many files to read at once.
 
     Returns:
         best, a table of values stored as a list of lists, with the first list
@@ -176,7 +180,7 @@ def main(best, variables, directory, mark, matches=None):
         if 'mark' is some value then the json files will also be updated
         in accordance with the contents of 'mark'
     """
-    best = get_best(best, variables, directory, matches=matches)
+    best = get_best(best, variables, directory, matches=matches, jobs=jobs)
     if mark:
         update_best(best, mark)
     return best
@@ -192,10 +196,21 @@ def test():
                             tablefmt="simple_grid", headers="firstrow", ))
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     best = main(
-        args.best, args.variables, args.directory, args.mark, args.match)
+        args.best, args.variables, args.directory, args.mark, args.match,
+        args.jobs)
     if not args.mark:
         print(tabulate.tabulate(best,
                                 tablefmt=args.format, headers="firstrow", ))
+
+
+if __name__ == "__main__":
+    cli()
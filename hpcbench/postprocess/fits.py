@@ -5,7 +5,7 @@ Fit curves to results from hpcbench
 """
 
 import argparse
-from hpcbench.plot.util import get_data
+from hpcbench.plot.util import get_data, job_count
 import numpy as np
 import copy
 from scipy.optimize import curve_fit
@@ -41,6 +41,8 @@ parser.add_argument("-b", "--debug", action="store_true",
                     help="Print debug info showing the quality of the fits")
 parser.add_argument("-n", "--nodummy", action="store_true",
                     help="Don't add dummy data for missing benchmarks")
+parser.add_argument("-j", "--jobs", type=job_count, default=1,
+                    help="Number of files to read at once. Defaults to 1.")
 
 def fit_poly(x, a, b, c, d):
     """
@@ -278,7 +280,7 @@ def test():
     results = main(directory, label, matches, x, y)
 
 
-def main(directory, label, matches, x, y, hardcode=False):
+def main(directory, label, matches, x, y, hardcode=False, jobs=1):
     """
     Get the parameters of fits for a range of hpcbench outputs.
     Params:
@@ -290,6 +292,7 @@ def main(directory, label, matches, x, y, hardcode=False):
         ["meta:Machine=JADE2"]
         x: the location of the x data within the json files (a string)
         y: the location of the y data within the json files (a list of strings)
+        jobs: how many files to read at once.
     Returns:
         a list of dictionaries, with each dictionary containg the fit
         parameters, fit functions, and meta info.
@@ -297,7 +300,8 @@ def main(directory, label, matches, x, y, hardcode=False):
     if label == None:
         label = matches[0]
     results = []
-    dicts = get_data(matches, x, y, label, directory, wildcard=True)
+    dicts = get_data(matches, x, y, label, directory, wildcard=True,
+                     jobs=jobs)
     for key, value in dicts.items():
         for item in range(len(value["y"])):
             new_dict = {}
@@ -398,10 +402,16 @@ def test2(directory="/home/rob/benchout/jade2",
 
 #test2()
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     results = main(args.directory, args.label, args.match, args.x, args.y,
-                   hardcode=args.hardcode)
+                   hardcode=args.hardcode, jobs=args.jobs)
     if args.nodummy:
         dummy_data = []
     if os.path.exists(args.out):
@@ -416,3 +426,7 @@ if __name__ == "__main__":
                                      indent=4)
     if args.debug:
         test2(args.directory, args.match, args.label, args.x, args.y)
+
+
+if __name__ == "__main__":
+    cli()
@@ -1 +1,11 @@
-from . import slurm
+import importlib
+
+_submodules = [
+    "slurm",
+]
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module("."+name, __name__)
+    raise AttributeError("module "+__name__+" has no attribute "+name)
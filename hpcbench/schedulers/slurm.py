@@ -10,6 +10,7 @@ import os
 import glob
 import argparse
 import sys
+from hpcbench.logger.sacct import get_sacct, get_sacct_many
 
 parser = argparse.ArgumentParser(
     description="Submit a list of slurm scripts and report the results.")
@@ -122,19 +123,9 @@ def get_job_status(script_id=None, script_path=None):
         for job in queue:
             if job["JOBID"] == script_id:
                 return job["STATUS"]
-        acct = subprocess.run(['sacct', '--jobs='+str(script_id), '-p'],
-                              capture_output=True, text=True)
-        acct = acct.stdout.split("\n")
-        header = acct.pop(0).strip().split("|")
-        accts = []
-        for line in acct:
-            curr_line = line.strip().split("|")
-            accts.append(
-                {header[i]: curr_line[i] for i in range(len(curr_line))})
-        for acct in accts:
-            if acct != {}:
-                if acct["JobID"] == str(script_id):
-                    return acct["State"]
+        state = get_sacct(script_id, "JobID,State").get("State")
+        if state:
+            return state
         if not script_path:
             raise IndexError("No job with ID "+str(script_id))
     if script_path:
@@ -204,6 +195,9 @@ def process_queue(jobs, submit_freq=1):
             break
         time.sleep(1)
     print(str(num_jobs)+" jobs to run, "+str(len(submitted_jobs))+" submitted")
+    # look all the jobs up in sacct at once, so get_job_status can use the
+    # cache rather than running sacct for each job
+    get_sacct_many(submitted_ids, "JobID,State")
     statuses = {}
     for job_id, job_path in submitted_jobs:
         status = get_job_status(job_id, job_path)
@@ -212,6 +206,16 @@ def process_queue(jobs, submit_freq=1):
     return statuses
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     process_queue(args.scripts)
+
+
+if __name__ == "__main__":
+    cli()
@@ -1 +1,11 @@
-from . import make_job
\ No newline at end of file
+import importlib
+
+_submodules = [
+    "make_job",
+]
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module("."+name, __name__)
+    raise AttributeError("module "+__name__+" has no attribute "+name)
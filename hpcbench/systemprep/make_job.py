@@ -165,7 +165,17 @@ def make_job(template, output, substitutions, prefix=None, postfix=None):
         file.write(template_filled)
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     make_job(args.template, args.output, args.substitute, args.prefix,
              args.postfix)
+
+
+if __name__ == "__main__":
+    cli()
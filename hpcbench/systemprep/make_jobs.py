@@ -191,8 +191,14 @@ def test():
     make_jobs(jobparms, template, outdir, extrafiles=extrafiles)
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     if args.cat:
         with open(str(templates_dir)+p.sep+args.cat, "r") as file:
             print("#Contents of "+str(str(templates_dir)+p.sep+args.cat))
@@ -215,3 +221,7 @@ if __name__ == "__main__":
         scheduler.process_queue(jobs)
     else:
         print("Jobs created: "+", ".join(jobs))
+
+
+if __name__ == "__main__":
+    cli()
@@ -1 +1,11 @@
-from . import updatejson
\ No newline at end of file
+import importlib
+
+_submodules = [
+    "updatejson",
+]
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module("."+name, __name__)
+    raise AttributeError("module "+__name__+" has no attribute "+name)
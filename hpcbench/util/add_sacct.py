@@ -1,45 +1,227 @@
-import hpcbench
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Add slurm accounting info to hpcbench output files that lack it. Files can be
+given one at a time, or as folders, which are searched for hpcbench json
+files.
+"""
+
 import json
-import os
-import glob
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from hpcbench.logger.sacct import get_sacct_many
+from hpcbench.logger.util import dump_json_atomic, positive_count
 
 FMT = "ConsumedEnergyRaw,CPUTimeRAW,ElapsedRaw," \
       "JobID,AveRSS,MaxRSS,State,ExitCode"
 
-parser = argparse.ArgumentParser(description="Add accounting info to a file that lacks it.")
-parser.add_argument('file', help='hpcbench json file')
+parser = argparse.ArgumentParser(description="Add accounting info to files "
+                                 "that lack it.")
+parser.add_argument('file', nargs="+", help='hpcbench json files, or folders '
+                    'to search for hpcbench json files')
 parser.add_argument('-j', '--jobid', help="jobid (only used if the jobid is not found in the file)", default=None)
 parser.add_argument('-f', '--format', help="formatstr for sacct", default=FMT)
+parser.add_argument('-w', '--workers', type=positive_count, default=8,
+                    help="Number of files to read and write at once. "
+                    "Defaults to 8.")
 
-def add_accounting(filename, jobid=None, formatstring=FMT):
+
+def find_files(paths):
+    """
+    Get the json files to look at. Folders are searched recursively.
+
+    Args:
+        paths: a list of paths to files or folders, strings.
+
+    Returns:
+        a list of paths to json files, strings.
+    """
+    files = []
+    for path in paths:
+        if Path(path).is_dir():
+            files += sorted(map(str, Path(path).rglob("*.json")))
+        else:
+            files.append(path)
+    return files
+
+
+def has_accounting(file_json):
+    """
+    Check whether an hpcbench output already has accounting info, either
+    from add_accounting ('Accounting') or from collate and finalize
+    ('accounting').
+
+    Args:
+        file_json: the hpcbench output, a dictionary.
+
+    Returns:
+        True if there's accounting info.
+    """
+    return bool(file_json.get("Accounting") or file_json.get("accounting"))
+
+
+def check_file(filename, jobid=None):
+    """
+    Find out whether a file needs accounting info, and which job it's from.
+
+    Args:
+        filename: path to the file, a string.
+        jobid: the job ID to use if there isn't one in the file.
+
+    Returns:
+        the job ID, None if the file already has accounting info, or False
+        if it isn't an hpcbench output.
+
+    Raises:
+        IOError: if there's no job ID.
+    """
     with open(filename, "r") as cfile:
         file_json = json.load(cfile)
+    if not isinstance(file_json, dict) or "version" not in file_json:
+        return False
+    if has_accounting(file_json):
+        return None
     try:
-        file_json["version"]
-    except KeyError:
-        print(filename+" is not hpcbench file")
-        raise IOError
-    try:
-        file_json["Accounting"]
-    except KeyError:
-        print("File "+str(filename)+" has no accounting info?")
-        file_json["Accounting"] = {}
-    try:
-        file_json["meta"]["jobid"]
-    except KeyError:
-        job = jobid
-        if job is None:
+        return str(file_json["meta"]["jobid"])
+    except (KeyError, TypeError):
+        if jobid is None:
             raise IOError("No jobid in file, none given!")
-    if file_json["Accounting"] == {}:
-        sacct = hpcbench.logger.sacct.get_sacct(job, formatstring=formatstring)
-        file_json["Accounting"] = sacct
-        with open(filename, "w") as cfile:
-            json.dump(file_json, cfile, indent=4)
-        print("Wrote "+str(sacct)+ " to "+str(filename))
+        return str(jobid)
+
+
+def write_accounting(filename, accounting):
+    """
+    Write accounting info into a file. The file is read again and replaced
+    atomically, so it's never left half-written.
+
+    Args:
+        filename: path to the file, a string.
+        accounting: the accounting info, a dictionary.
+    """
+    with open(filename, "r") as cfile:
+        file_json = json.load(cfile)
+    file_json["Accounting"] = accounting
+    dump_json_atomic(file_json, filename, indent=4)
+
+
+def add_accounting_many(paths, jobid=None, formatstring=FMT, workers=8):
+    """
+    Add accounting info to many hpcbench files at once. The files are read
+    in parallel to find the ones without accounting info and their job IDs,
+    the jobs are looked up with a few batched sacct calls (see
+    get_sacct_many), then the files are rewritten in parallel.
+
+    Args:
+        paths: a list of paths to hpcbench json files, or folders to search
+        for them.
+        jobid: the job ID for files that don't have one in 'meta'. Only
+        makes sense for a single file.
+        formatstring: a comma-delimited sacct format string.
+        workers: the number of files to read and write at once. Anything
+        below 1 is treated as 1.
+
+    Returns:
+        a dictionary with lists of the files which were 'Updated', the ones
+        which already had accounting info ('Skipped') and the ones which
+        aren't hpcbench outputs ('Ignored'), and a dictionary of the files
+        which 'Failed', with the reason for each.
+    """
+    files = find_files(paths)
+    report = {"Updated": [], "Skipped": [], "Ignored": [], "Failed": {}}
+
+    def check(filename):
+        try:
+            return check_file(filename, jobid)
+        except (OSError, ValueError) as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        checked = list(executor.map(check, files))
+    jobs = {}
+    for filename, job in zip(files, checked):
+        if isinstance(job, Exception):
+            report["Failed"][filename] = str(job)
+        elif job is None:
+            report["Skipped"].append(filename)
+        elif job is False:
+            report["Ignored"].append(filename)
+        else:
+            jobs[filename] = job
+
+    accounting = get_sacct_many(list(dict.fromkeys(jobs.values())),
+                                formatstring) if jobs else {}
+
+    def write(filename):
+        if not accounting[jobs[filename]]:
+            return "sacct has no record of job "+jobs[filename]
+        try:
+            write_accounting(filename, accounting[jobs[filename]])
+        except (OSError, ValueError) as e:
+            return str(e)
+        return None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        written = list(executor.map(write, jobs))
+    for filename, error in zip(jobs, written):
+        if error is None:
+            report["Updated"].append(filename)
+        else:
+            report["Failed"][filename] = error
+    return report
+
+
+def add_accounting(filename, jobid=None, formatstring=FMT):
+    """
+    Add accounting info to a single hpcbench file, if it doesn't have any.
+
+    Args:
+        filename: path to the file, a string.
+        jobid: the job ID to use if there isn't one in the file.
+        formatstring: a comma-delimited sacct format string.
+
+    Raises:
+        IOError: if the file isn't an hpcbench output, there's no job ID, or
+        there's no accounting info for the job.
+    """
+    report = add_accounting_many([filename], jobid, formatstring, workers=1)
+    if filename in report["Failed"]:
+        raise IOError(filename+": "+report["Failed"][filename])
+    if report["Ignored"]:
+        raise IOError(filename+" is not hpcbench file")
+    if report["Skipped"]:
+        print("nothing to do with "+str(filename))
     else:
-        print("nothing to do with "+str(file))
+        print("Wrote accounting info to "+str(filename))
+
+
+def print_report(report):
+    """
+    Print a summary of what add_accounting_many did.
+
+    Args:
+        report: the dictionary returned by add_accounting_many.
+    """
+    for filename, error in report["Failed"].items():
+        print("Failed: "+filename+" ("+error+")")
+    print(str(len(report["Updated"]))+" updated, "
+          + str(len(report["Skipped"]))+" already had accounting info, "
+          + str(len(report["Failed"]))+" failed, "
+          + str(len(report["Ignored"]))+" not hpcbench files")
+
+
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
+    report = add_accounting_many(args.file, args.jobid, args.format,
+                                 args.workers)
+    print_report(report)
+
 
 if __name__ == "__main__":
-    args = parser.parse_args()
-    add_accounting(args.file, args.jobid, args.format)
+    cli()
@@ -79,7 +79,17 @@ def recrun(command, file, folder, noconfirm=False, quiet=False, retry=None):
     return results
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     recrun(args.command, args.file, args.folder, args.noconfirmation,
            args.quiet, args.retry)
+
+
+if __name__ == "__main__":
+    cli()
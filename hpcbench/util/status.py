@@ -45,6 +45,16 @@ def check_status(folder, file):
             print(str(key)+" contains no valid benchmarks")
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     check_status(args.folder, args.filename)
+
+
+if __name__ == "__main__":
+    cli()
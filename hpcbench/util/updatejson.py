@@ -83,7 +83,17 @@ def update(source, target, sourceloc=None, targetloc=None, delete=False):
         os.remove(source)
 
 
-if __name__ == "__main__":
-    args = parser.parse_args()
+def cli(argv=None):
+    """
+    Run this tool from the command line (or from the hpcbench launcher).
+
+    Args:
+        argv: a list of command-line arguments. Defaults to sys.argv[1:].
+    """
+    args = parser.parse_args(argv)
     update(args.source, args.target, args.sourceloc, args.targetloc,
            args.delete)
+
+
+if __name__ == "__main__":
+    cli()
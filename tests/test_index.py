@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Check that the results index gives the same benchmarks as reading every file.
+"""
+
+import json
+import os
+import pytest
+from hpcbench.plot import index
+from hpcbench.plot.util import get_data, load_benchmarks
+
+BENCHMARKS = {
+    "a.json": {"tags": ["x"], "meta": {"Machine": "A", "nodes": "1"},
+               "run": {"Totals": {"ns/day": "10", "Atoms": "100"},
+                       "Cycles": {"Force": {"Wall time (s)": "1"},
+                                  "PME": {"Wall time (s)": "2"}}}},
+    "b.json": {"tags": ["y"], "meta": {"Machine": "A", "nodes": "2"},
+               "run": {"Totals": {"ns/day": "20", "Atoms": "100"},
+                       "Cycles": {"Force": {"Wall time (s)": "3"}}}},
+    "sub/c.json": {"tags": ["x", "y"], "meta": {"Machine": "B", "nodes": "1"},
+                   "run": {"Totals": {"ns/day": "5", "Atoms": "200"}}},
+    "sub/d.json": {"meta": {"Machine": "B", "nodes": "4"},
+                   "run": {"Totals": {"ns/day": "15"}, "log": [1, 2, 3]}},
+}
+
+LOCATIONS = ["meta:nodes", "run:Totals:ns/day", "run:Cycles:?:Wall time (s)",
+             "run:log"]
+
+MATCHES = [
+    [],
+    ["meta:Machine=A"],
+    ["meta:Machine=C"],
+    ["tags:0=x"],
+    ["tags:1=y"],
+    ["tags:0=y", "meta:Machine=A"],
+    ["run:Totals:Atoms=100"],
+]
+
+
+@pytest.fixture
+def results(tmp_path):
+    for name, benchmark in BENCHMARKS.items():
+        path = tmp_path / name
+        os.makedirs(path.parent, exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(benchmark, file)
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize("matches", MATCHES)
+def test_load_benchmarks(results, matches):
+    expected = load_benchmarks(results, matches, LOCATIONS, index=False)
+    # the first time builds the index, the second uses it
+    for i in range(2):
+        indexed = load_benchmarks(results, matches, LOCATIONS, index=True)
+        assert [path for path, bench in indexed] == \
+            [path for path, bench in expected]
+
+
+@pytest.mark.parametrize("matches", MATCHES)
+def test_get_data(results, matches):
+    expected = get_data(matches, "meta:nodes", "run:Totals:ns/day",
+                        "meta:Machine", results, index=False)
+    for i in range(2):
+        assert get_data(matches, "meta:nodes", "run:Totals:ns/day",
+                        "meta:Machine", results, index=True) == expected
+
+
+def test_list_condition(results):
+    data = get_data(["tags:0=x"], "meta:nodes", "run:Totals:ns/day",
+                    "meta:Machine", results)
+    assert sorted(data) == ["A", "B"]
+    assert data["A"]["x"] == [1]
+
+
+def test_relative_directory(results, monkeypatch):
+    load_benchmarks(results, [], LOCATIONS)
+    read = []
+    read_fields = index.read_fields
+    monkeypatch.setattr(index, "read_fields",
+                        lambda path: read.append(path) or read_fields(path))
+    monkeypatch.chdir(os.path.dirname(results))
+    for directory in [os.path.basename(results),
+                      os.path.join(".", os.path.basename(results))]:
+        expected = load_benchmarks(directory, [], LOCATIONS, index=False)
+        assert load_benchmarks(directory, [], LOCATIONS) == expected
+    assert read == []
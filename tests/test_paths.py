@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Check looking up locations in benchmarks with path_in_dict and
+path_with_wildcard.
+"""
+
+from hpcbench.plot.util import PathExpression, path_in_dict, path_with_wildcard
+
+BENCH = {"run": {"Cycles": {"Force": {"Wall time (s)": "1"},
+                            "PME": {"Wall time (s)": "2"}},
+                 "Totals": {"ns/day": "10"}},
+         "tags": ["x", {"name": "y"}],
+         "k:1": 5,
+         "a": {"y": {"t (h:m)": 1}}}
+
+
+def test_path_in_dict():
+    assert path_in_dict(BENCH, "run:Totals:ns/day") == "10"
+    assert path_in_dict(BENCH, ["run", "Totals", "ns/day"]) == "10"
+    assert path_in_dict(BENCH, "run:Totals:missing") is False
+    assert path_in_dict(BENCH, "tags:0") == "x"
+    assert path_in_dict(BENCH, "tags:1:name") == "y"
+    assert path_in_dict(BENCH, "tags:2") is False
+
+
+def test_keys_with_colons():
+    assert path_in_dict(BENCH, ["k:1"]) == 5
+    assert path_with_wildcard({"a": {"y": {"t (h:m)": 1}}},
+                              ["?", "y", "t (h:m)"]) == {"a": 1}
+
+
+def test_wildcards():
+    assert path_with_wildcard(BENCH, "run:Cycles:?:Wall time (s)") == \
+        {"Force": "1", "PME": "2"}
+    assert path_with_wildcard(BENCH, "run:?:?") == BENCH["run"]
+    assert path_with_wildcard(BENCH, "run:Cycles:?") == BENCH["run"]["Cycles"]
+    assert PathExpression("run:?:Force", True).get(BENCH) == \
+        {"Cycles": BENCH["run"]["Cycles"]["Force"], "Totals": False}